@@ -21,12 +21,90 @@ load_dotenv(Path(__file__).parent / ".env")
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
+# Отзыв access-токенов при выходе: как часто процесс подгружает новые отзывы (секунды)
+# и как часто перечитывает список целиком, отбрасывая истёкшие токены
+TOKEN_REVOCATION_REFRESH_SECONDS = float(os.getenv("TOKEN_REVOCATION_REFRESH_SECONDS", "2"))
+TOKEN_REVOCATION_REBUILD_SECONDS = int(os.getenv("TOKEN_REVOCATION_REBUILD_SECONDS", "3600"))
+# Срок жизни refresh-токена (дни); access-токен обновляется через /auth/refresh
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+# Повтор обменянного refresh-токена в течение этого времени не считается утечкой
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_TOKEN_REUSE_GRACE_SECONDS", "10"))
 
 
 # Bitrix24 настройки
 BITRIX_DOMAIN = os.getenv("BITRIX_DOMAIN")
 BITRIX_TOKEN = os.getenv("BITRIX_TOKEN")
 
+# Размер пула HTTP-соединений к Bitrix24 на один процесс
+BITRIX_POOL_SIZE = int(os.getenv("BITRIX_POOL_SIZE", "10"))
+
+# Хеджирование идемпотентных чтений Bitrix24: если ответ не пришёл за
+# BITRIX_HEDGE_PERCENTILE-й перцентиль задержек метода, отправляется вторая попытка.
+# Доля дополнительных попыток ограничена BITRIX_HEDGE_BUDGET_RATIO от всех вызовов.
+BITRIX_HEDGING_ENABLED = os.getenv("BITRIX_HEDGING_ENABLED", "false").lower() == "true"
+BITRIX_HEDGED_METHODS = set(
+    os.getenv("BITRIX_HEDGED_METHODS", "crm.deal.list,crm.activity.list,crm.category.list").split(",")
+)
+BITRIX_HEDGE_PERCENTILE = float(os.getenv("BITRIX_HEDGE_PERCENTILE", "95"))
+BITRIX_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("BITRIX_HEDGE_MIN_DELAY_SECONDS", "0.05"))
+BITRIX_HEDGE_BUDGET_RATIO = float(os.getenv("BITRIX_HEDGE_BUDGET_RATIO", "0.05"))
+BITRIX_HEDGE_BUDGET_BURST = float(os.getenv("BITRIX_HEDGE_BUDGET_BURST", "10"))
+
+# Время жизни кэша справочника воронок и стадий (секунды)
+DEALS_CATALOG_TTL_SECONDS = int(os.getenv("DEALS_CATALOG_TTL_SECONDS", "300"))
+# Время жизни кэша метаданных файлов Bitrix24 (disk.file.get)
+FILE_METADATA_TTL_SECONDS = int(os.getenv("FILE_METADATA_TTL_SECONDS", "600"))
+# Время жизни кэша последней активности сделки в списках сделок
+DEAL_LAST_ACTIVITY_TTL_SECONDS = int(os.getenv("DEAL_LAST_ACTIVITY_TTL_SECONDS", "60"))
+# Дисковый кэш вложений, отдаваемых через /files (LRU по общему размеру, байты);
+# файлы больше FILES_CACHE_MAX_FILE_BYTES передаются из Bitrix24 без кэширования
+FILES_CACHE_DIR = os.getenv("FILES_CACHE_DIR", os.path.join("/var/tmp", "bip_files"))
+FILES_CACHE_MAX_BYTES = int(os.getenv("FILES_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+FILES_CACHE_MAX_FILE_BYTES = int(os.getenv("FILES_CACHE_MAX_FILE_BYTES", str(100 * 1024 ** 2)))
+# Время жизни отрицательного кэша поиска контактов Bitrix24 (контакт не найден)
+CONTACT_MISS_TTL_SECONDS = int(os.getenv("CONTACT_MISS_TTL_SECONDS", "60"))
+
+
+# Фоновая обработка обращений: число потоков-обработчиков на процесс
+# и максимальное число попыток задачи
+APPEAL_WORKER_THREADS = int(os.getenv("APPEAL_WORKER_THREADS", "2"))
+APPEAL_MAX_ATTEMPTS = int(os.getenv("APPEAL_MAX_ATTEMPTS", "6"))
+# Отправка сообщений чата в Bitrix24 (chat_messages): потоков на процесс и попыток
+CHAT_SYNC_THREADS = int(os.getenv("CHAT_SYNC_THREADS", "1"))
+CHAT_SYNC_MAX_ATTEMPTS = int(os.getenv("CHAT_SYNC_MAX_ATTEMPTS", "8"))
+# Сколько дней неотправленное (failed) сообщение показывается в чате
+CHAT_FAILED_RETENTION_DAYS = int(os.getenv("CHAT_FAILED_RETENTION_DAYS", "7"))
+# Массовый импорт сотрудников: потоков-обработчиков на процесс
+EMPLOYEE_IMPORT_THREADS = int(os.getenv("EMPLOYEE_IMPORT_THREADS", "1"))
+
+
+# Ограничение попыток входа (скользящее окно, общее для процессов хоста):
+# неудачные попытки с одного IP (сверх лимита — 429) и на одну учётную запись
+# (только задержка ответа, без блокировки)
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", "900"))
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "50"))
+# После этого числа неудач ответ задерживается: 1, 2, 4... секунд, но не более LOGIN_MAX_DELAY_SECONDS
+LOGIN_DELAY_AFTER_FAILURES = int(os.getenv("LOGIN_DELAY_AFTER_FAILURES", "3"))
+LOGIN_MAX_DELAY_SECONDS = float(os.getenv("LOGIN_MAX_DELAY_SECONDS", "8"))
+# Доверять X-Forwarded-For от любого адреса (приложение доступно только через прокси)
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+# Адреса и подсети обратных прокси: для запросов от них IP клиента берётся
+# из X-Forwarded-For (первый адрес справа, не принадлежащий прокси)
+TRUSTED_PROXIES = [
+    proxy.strip() for proxy in os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if proxy.strip()
+]
+
+
+# Общий кэш между рабочими процессами на хосте (по умолчанию в оперативной памяти)
+SHARED_CACHE_DIR = os.getenv(
+    "SHARED_CACHE_DIR",
+    "/dev/shm/bip_cache" if os.path.isdir("/dev/shm") else os.path.join("/tmp", "bip_cache"),
+)
+# Истёкшие записи хранятся ещё столько секунд (отдаются как устаревшие), затем удаляются
+SHARED_CACHE_STALE_GRACE_SECONDS = int(os.getenv("SHARED_CACHE_STALE_GRACE_SECONDS", "3600"))
+# Интервал очистки каталога общего кэша (секунды)
+SHARED_CACHE_SWEEP_INTERVAL_SECONDS = int(os.getenv("SHARED_CACHE_SWEEP_INTERVAL_SECONDS", "300"))
+
 
 # MySQL настройки
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -34,6 +112,12 @@ DB_PORT = os.getenv("DB_PORT", "3306")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_NAME = os.getenv("DB_NAME")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+# Реплики для чтения: "host[:port],host[:port]" (учётные данные и CA — как у основного сервера;
+# пользователю нужна привилегия REPLICATION CLIENT для проверки отставания)
+DB_REPLICA_HOSTS = [host for host in os.getenv("DB_REPLICA_HOSTS", "").split(",") if host.strip()]
+# Реплика с большим отставанием (секунды) исключается из чтения до следующей проверки
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
 
 
 # Проверка обязательных переменных
@@ -51,6 +135,93 @@ if missing_vars:
     raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
 
 
+# Бюджет времени на обработку запроса (секунды). Для маршрута берётся значение
+# по самому длинному совпавшему префиксу пути, иначе — значение по умолчанию.
+# Все вызовы Bitrix24 и SQL-запросы получают таймаут из оставшегося бюджета.
+REQUEST_DEADLINE_DEFAULT_SECONDS = float(os.getenv("REQUEST_DEADLINE_DEFAULT_SECONDS", "10"))
+REQUEST_DEADLINES = {
+    "/auth/login": 5.0,
+    "/auth/register": 20.0,
+    "/deals": 15.0,
+    "/personal_account/company/employees/import": 30.0,
+    "/health": 2.0,
+    # Потоковая выгрузка может длиться минуты на больших историях
+    "/transactions/export": 900.0,
+    "/files": 300.0,
+}
+# Таймаут вызова Bitrix24 вне запроса (фоновые задачи, прогрев)
+BITRIX_TIMEOUT_SECONDS = float(os.getenv("BITRIX_TIMEOUT_SECONDS", "10"))
+
+
+# Ограничение одновременных запросов на процесс по группам маршрутов:
+# группа -> (запросов в обработке, длина очереди ожидания). Группа маршрута
+# определяется по самому длинному совпавшему префиксу пути; маршруты без группы
+# (/health) не ограничиваются. Не дождавшийся слота запрос получает 503.
+CONCURRENCY_LIMITS = {
+    "bitrix": (
+        int(os.getenv("CONCURRENCY_BITRIX_LIMIT", "16")),
+        int(os.getenv("CONCURRENCY_BITRIX_QUEUE", "16")),
+    ),
+    "db": (
+        int(os.getenv("CONCURRENCY_DB_LIMIT", "32")),
+        int(os.getenv("CONCURRENCY_DB_QUEUE", "64")),
+    ),
+    # Потоковые выгрузки занимают соединение с БД на всё время передачи
+    "export": (
+        int(os.getenv("CONCURRENCY_EXPORT_LIMIT", "2")),
+        int(os.getenv("CONCURRENCY_EXPORT_QUEUE", "0")),
+    ),
+    # Передача вложений занимает слот на всё время загрузки файла
+    "files": (
+        int(os.getenv("CONCURRENCY_FILES_LIMIT", "16")),
+        int(os.getenv("CONCURRENCY_FILES_QUEUE", "16")),
+    ),
+}
+CONCURRENCY_ROUTE_GROUPS = {
+    "/deals": "bitrix",
+    "/auth/register": "bitrix",
+    "/personal_account/company/employees/import": "bitrix",
+    "/auth": "db",
+    "/user": "db",
+    "/personal_account": "db",
+    "/transactions": "db",
+    "/transactions/export": "export",
+    "/files": "files",
+}
+CONCURRENCY_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CONCURRENCY_QUEUE_TIMEOUT_SECONDS", "1"))
+
+# Пулы потоков для блокирующей работы обработчиков: пул -> (потоков, длина очереди).
+# При заполненной очереди задача отклоняется ответом 503.
+EXECUTOR_LIMITS = {
+    "db": (
+        int(os.getenv("EXECUTOR_DB_WORKERS", str(DB_POOL_SIZE))),
+        int(os.getenv("EXECUTOR_DB_QUEUE", "50")),
+    ),
+    "bitrix": (
+        int(os.getenv("EXECUTOR_BITRIX_WORKERS", str(BITRIX_POOL_SIZE))),
+        int(os.getenv("EXECUTOR_BITRIX_QUEUE", "20")),
+    ),
+    "cpu": (
+        int(os.getenv("EXECUTOR_CPU_WORKERS", str(os.cpu_count() or 1))),
+        int(os.getenv("EXECUTOR_CPU_QUEUE", "32")),
+    ),
+    "files": (
+        int(os.getenv("EXECUTOR_FILES_WORKERS", "4")),
+        int(os.getenv("EXECUTOR_FILES_QUEUE", "8")),
+    ),
+}
+
+
+# Проверки готовности (/health): интервал фоновых проверок зависимостей (секунды)
+HEALTH_PROBE_INTERVAL_SECONDS = int(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "15"))
+
+
+# Логирование: уровень корневого логгера и доля записей уровня DEBUG,
+# попадающих в лог (частые события вроде отдельных вызовов Bitrix24)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
+
 # CORS настройки
 CORS_ORIGINS = [
     "http://localhost:5173",
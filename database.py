@@ -4,82 +4,340 @@
 
 Этот модуль предоставляет функцию для подключения к базе данных MySQL с SSL.
 
+Соединения берутся из пула процесса: пул создаётся при старте приложения
+(см. init_pool) и сразу открывает DB_POOL_SIZE соединений, поэтому первые
+запросы после деплоя не платят за установку TCP/TLS-сессии.
+
+Пул не сбрасывает сессию при возврате соединения, чтобы сохранить подготовленные
+запросы (utils.prepared). Вместо сброса при выдаче соединения откатывается
+незавершённая транзакция и восстанавливается max_execution_time.
+
+Внутри запроса с бюджетом времени (utils.deadline) для соединения выставляется
+max_execution_time по оставшемуся бюджету.
+
+Чтение с реплик (DB_REPLICA_HOSTS): connect_to_db(read_only=True) выдаёт
+соединение с исправной репликой (по кругу), отставание которой не превышает
+DB_REPLICA_MAX_LAG_SECONDS. Отставание проверяется фоновыми проверками
+(check_replicas); если подходящих реплик нет, используется основной сервер.
+Запись и чтение сразу после записи всегда идут на основной сервер.
+
 Зависимости:
 - mysql.connector
 - fastapi
 - os (для работы с путями)
 """
 
+import itertools
+import logging
 import os
+import threading
+import time
+from dataclasses import dataclass
 import mysql.connector
+from mysql.connector import pooling
 from fastapi import HTTPException
-from config import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+from config import (
+    DB_HOST,
+    DB_PORT,
+    DB_USER,
+    DB_PASSWORD,
+    DB_NAME,
+    DB_POOL_SIZE,
+    DB_REPLICA_HOSTS,
+    DB_REPLICA_MAX_LAG_SECONDS,
+    HEALTH_PROBE_INTERVAL_SECONDS,
+)
+from src.utils import deadline
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _connection_config(host: str = DB_HOST, port: str = DB_PORT) -> dict:
+    """Параметры подключения к MySQL с обязательной проверкой SSL сертификата"""
+    # Получаем путь к корневой директории проекта
+    root_dir = os.path.dirname(os.path.abspath(__file__))
+    ca_cert_path = os.path.join(root_dir, 'ca.crt')
+
+    # Проверяем существование сертификата
+    if not os.path.exists(ca_cert_path):
+        raise FileNotFoundError(f"SSL сертификат не найден: {ca_cert_path}")
+
+    return {
+        "host": host,
+        "port": port,
+        "user": DB_USER,
+        "password": DB_PASSWORD,
+        "database": DB_NAME,
+        "ssl_disabled": False,
+        "ssl_ca": ca_cert_path,
+        "ssl_verify_cert": True,
+        "ssl_verify_identity": True,
+    }
+
+
+def _verify_ssl(conn) -> None:
+    """Проверяем, что соединение действительно использует SSL"""
+    if conn.is_connected():
+        cursor = conn.cursor()
+        cursor.execute("SHOW STATUS LIKE 'Ssl_cipher'")
+        ssl_status = cursor.fetchone()
+        cursor.close()
+
+        if ssl_status and ssl_status[1]:
+            logger.debug("SSL подключение установлено", extra={"fields": {"cipher": ssl_status[1]}})
+        else:
+            raise mysql.connector.Error("SSL соединение не установлено")
+
+
+def _apply_time_limit(conn, seconds: float | None) -> None:
+    """
+    Ограничивает время выполнения запросов соединения оставшимся бюджетом.
+    Без бюджета возвращает значение по умолчанию, если оно было изменено
+    при предыдущей выдаче соединения.
+    """
+    raw = getattr(conn, "_cnx", conn)
+    if seconds is None and not getattr(raw, "_bip_time_limited", False):
+        return
+    cursor = conn.cursor()
+    if seconds is None:
+        cursor.execute("SET SESSION max_execution_time = DEFAULT")
+    else:
+        cursor.execute("SET SESSION max_execution_time = %s", (max(1, int(seconds * 1000)),))
+    cursor.close()
+    raw._bip_time_limited = seconds is not None
+
+
+def _rollback_on_release(conn) -> None:
+    """
+    Лёгкий сброс вместо COM_RESET_CONNECTION: close() соединения из пула
+    откатывает незавершённую транзакцию до возврата соединения в пул,
+    поэтому её блокировки не удерживаются, пока соединение простаивает.
+    """
+    release = conn.close
+
+    def close() -> None:
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except mysql.connector.Error:
+            # Разорванное соединение пул переподключит при следующей выдаче
+            pass
+        release()
+
+    conn.close = close
+
+
+def init_pool() -> pooling.MySQLConnectionPool:
+    """
+    Создаёт пул соединений процесса (идемпотентно).
+
+    Пул открывает все DB_POOL_SIZE соединений сразу, поэтому вызов при старте
+    приложения прогревает подключения к БД.
+    """
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            pool = pooling.MySQLConnectionPool(
+                pool_name="bip",
+                pool_size=DB_POOL_SIZE,
+                pool_reset_session=False,
+                **_connection_config(),
+            )
+            # SSL проверяем один раз на пул, а не при каждой выдаче соединения
+            conn = pool.get_connection()
+            try:
+                _verify_ssl(conn)
+            finally:
+                conn.close()
+            _pool = pool
+    return _pool
+
 
+@dataclass
+class _Replica:
+    """Реплика для чтения и результат её последней проверки"""
 
-def connect_to_db():
+    name: str
+    host: str
+    port: str
+    pool: pooling.MySQLConnectionPool | None = None
+    healthy: bool = False
+    lag: float | None = None
+    error: str | None = None
+    checked_at: float | None = None
+
+    @property
+    def usable(self) -> bool:
+        # Результат проверки считается актуальным в пределах трёх интервалов проверок
+        return (
+            self.healthy
+            and self.checked_at is not None
+            and time.time() - self.checked_at <= 3 * HEALTH_PROBE_INTERVAL_SECONDS
+        )
+
+
+def _parse_replica(index: int, address: str) -> _Replica:
+    host, _, port = address.strip().partition(":")
+    return _Replica(name=f"replica{index}", host=host, port=port or DB_PORT)
+
+
+_replicas = [_parse_replica(index, address) for index, address in enumerate(DB_REPLICA_HOSTS)]
+_replica_cursor = itertools.count()
+
+
+def _replica_pool(replica: _Replica) -> pooling.MySQLConnectionPool:
+    if replica.pool is None:
+        with _pool_lock:
+            if replica.pool is None:
+                pool = pooling.MySQLConnectionPool(
+                    pool_name=f"bip-{replica.name}",
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=False,
+                    **_connection_config(replica.host, replica.port),
+                )
+                conn = pool.get_connection()
+                try:
+                    _verify_ssl(conn)
+                finally:
+                    conn.close()
+                replica.pool = pool
+    return replica.pool
+
+
+def _replication_lag(conn) -> float | None:
+    """Отставание реплики в секундах; None, если репликация остановлена"""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except mysql.connector.errors.ProgrammingError:
+            # MySQL до 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+        status = cursor.fetchone()
+    finally:
+        cursor.close()
+    if not status:
+        return None
+    lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+    return None if lag is None else float(lag)
+
+
+def check_replicas() -> list[dict]:
+    """Проверка доступности и отставания реплик (вызывается фоновыми проверками)"""
+    for replica in _replicas:
+        try:
+            try:
+                conn = _replica_pool(replica).get_connection()
+            except mysql.connector.errors.PoolError:
+                # Все соединения заняты запросами — реплика доступна,
+                # сохраняем результат предыдущей проверки
+                continue
+            try:
+                replica.lag = _replication_lag(conn)
+            finally:
+                conn.close()
+            if replica.lag is None:
+                replica.healthy, replica.error = False, "Репликация остановлена"
+            elif replica.lag > DB_REPLICA_MAX_LAG_SECONDS:
+                replica.healthy, replica.error = False, f"Отставание {replica.lag:.0f} с"
+            else:
+                replica.healthy, replica.error = True, None
+        except Exception as e:
+            replica.healthy, replica.error = False, str(e)
+        replica.checked_at = time.time()
+    return replica_status()
+
+
+def replica_status() -> list[dict]:
+    return [
+        {
+            "name": replica.name,
+            "ok": replica.healthy,
+            "lag": replica.lag,
+            "checked_at": replica.checked_at,
+            "error": replica.error,
+        }
+        for replica in _replicas
+    ]
+
+
+def _replica_connection(pooled: bool):
+    """Соединение с исправной репликой (по кругу) или None"""
+    candidates = [replica for replica in _replicas if replica.usable]
+    if not candidates:
+        return None
+    start = next(_replica_cursor)
+    for offset in range(len(candidates)):
+        replica = candidates[(start + offset) % len(candidates)]
+        try:
+            if pooled:
+                return _replica_pool(replica).get_connection()
+            conn = mysql.connector.connect(**_connection_config(replica.host, replica.port))
+            _verify_ssl(conn)
+            return conn
+        except mysql.connector.errors.PoolError:
+            continue
+        except mysql.connector.Error as e:
+            # До следующей проверки реплика исключается из ротации
+            replica.healthy, replica.error = False, str(e)
+    return None
+
+
+def connect_to_db(pooled: bool = True, read_only: bool = False):
     """
     Подключение к базе данных MySQL с SSL сертификатом.
-    
+
+    Соединение выдаётся из пула; conn.close() возвращает его обратно в пул.
+    Если все соединения пула заняты, открывается отдельное соединение.
+
+    Args:
+        pooled: False — всегда отдельное соединение (долгие потоковые выгрузки,
+            чтобы не занимать пул и иметь возможность закрыть соединение
+            с непрочитанным результатом)
+        read_only: True — только чтение, допускающее отставание реплики;
+            соединение выдаётся с реплики, если есть подходящая
+
     Returns:
         mysql.connector.connection.MySQLConnection: Объект подключения к БД
-        
+
     Raises:
         HTTPException: При ошибке подключения к базе данных
     """
     try:
-        # Получаем путь к корневой директории проекта
-        root_dir = os.path.dirname(os.path.abspath(__file__))
-        ca_cert_path = os.path.join(root_dir, 'ca.crt')
-        
-        # Проверяем существование сертификата
-        if not os.path.exists(ca_cert_path):
-            raise FileNotFoundError(f"SSL сертификат не найден: {ca_cert_path}")
-        
-        # SSL конфигурация
-        ssl_config = {
-            'ca': ca_cert_path,
-            'verify_cert': True,
-            'verify_identity': True,
-        }
-        
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            ssl_disabled=False,
-            ssl_ca=ca_cert_path, 
-            ssl_verify_cert=True,  
-            ssl_verify_identity=True,  
-        )
-        
-        # Проверяем, что соединение действительно использует SSL
-        if conn.is_connected():
-            cursor = conn.cursor()
-            cursor.execute("SHOW STATUS LIKE 'Ssl_cipher'")
-            ssl_status = cursor.fetchone()
-            cursor.close()
-            
-            if ssl_status and ssl_status[1]:
-                print(f"SSL подключение установлено. Cipher: {ssl_status[1]}")
-            else:
-                raise mysql.connector.Error("SSL соединение не установлено")
-        
+        # Проверяем бюджет до получения соединения
+        time_left = deadline.remaining()
+        conn = _replica_connection(pooled) if read_only and _replicas else None
+        if conn is None and pooled:
+            try:
+                conn = init_pool().get_connection()
+            except mysql.connector.errors.PoolError:
+                # Пул исчерпан — не блокируем запрос, открываем прямое соединение
+                pass
+        if conn is None:
+            conn = mysql.connector.connect(**_connection_config())
+            _verify_ssl(conn)
+        if isinstance(conn, pooling.PooledMySQLConnection):
+            _rollback_on_release(conn)
+        _apply_time_limit(conn, time_left)
         return conn
-        
+
     except FileNotFoundError as e:
         raise HTTPException(
-            status_code=500, 
+            status_code=500,
             detail=f"SSL certificate error: {str(e)}"
         )
     except mysql.connector.Error as e:
         raise HTTPException(
-            status_code=500, 
+            status_code=500,
             detail=f"Database connection error: {str(e)}"
         )
     except Exception as e:
         raise HTTPException(
-            status_code=500, 
+            status_code=500,
             detail=f"Unexpected error: {str(e)}"
         )
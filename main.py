@@ -6,27 +6,133 @@
     - Это основной исполняемый файл для запуска API.
     - Определяет основные маршруты и настройки API.
     - Обрабатывает CORS запросы.
+    - Запускает фоновую обработку обращений и отправку сообщений чата в Bitrix24.
+    - Ограничивает время обработки запроса бюджетом маршрута (ответ 504).
+    - Ограничивает число одновременных запросов по группам маршрутов (ответ 503).
+    - Пишет структурированный access-лог (request_id, маршрут, задержка,
+      сводка вызовов Bitrix24).
+    - Прогревает процесс при старте (БД, Bitrix24, справочники) и
+      предоставляет эндпоинты /health/live и /health/ready.
     - Запускает приложение через uvicorn.
 
 """
 
-from fastapi import FastAPI
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from src.auth.authentication import router as auth_router
 from src.personal_account.personal_account import router as personal_account_router
 from src.transactions.routes.transactions import router as transactions_router
 from src.user.routes.user import router as user_router
 from src.deals.routes.deals import router as deals_router
+from src.health.routes.health import router as health_router
+from src.files.routes.files import router as files_router
+from src.health.utils.probes import probe_loop
+from src.deals.utils import appeal_worker, chat_sync
+from src.personal_account.legal.utils import employee_import
+from src.utils import token_revocation
+from src.utils import deadline, logs
+from src.utils.load_shedding import LoadSheddingMiddleware
 
 from config import CORS_ORIGINS
 
+logs.setup()
+access_logger = logging.getLogger("bip.access")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Прогрев и проверки зависимостей идут в фоне: /health/live отвечает сразу,
+    # а /health/ready — только после завершения прогрева
+    probe_task = asyncio.create_task(probe_loop())
+    # Обработчик обращений забирает и незавершённые задачи прошлых запусков
+    await asyncio.to_thread(appeal_worker.start)
+    await asyncio.to_thread(chat_sync.start)
+    employee_import.start()
+    # Список отозванных токенов загружается до приёма запросов
+    await asyncio.to_thread(token_revocation.start)
+    yield
+    token_revocation.stop()
+    employee_import.stop()
+    chat_sync.stop()
+    appeal_worker.stop()
+    probe_task.cancel()
+    logs.stop()
+
 
 app = FastAPI(
     title="BIP API",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
-# CORS
+@app.middleware("http")
+async def request_deadline(request: Request, call_next):
+    """
+    Открывает бюджет времени запроса. Обработчики превращают любые ошибки в 500,
+    поэтому ответ 5xx, полученный после исчерпания бюджета, заменяется на 504.
+    """
+    token = deadline.start(deadline.deadline_for_path(request.url.path))
+    try:
+        try:
+            response = await call_next(request)
+        except deadline.DeadlineExceeded:
+            return _deadline_response()
+        current = deadline.current()
+        if current.exceeded or (current.expired and response.status_code >= 500):
+            return _deadline_response()
+        return response
+    finally:
+        deadline.reset(token)
+
+
+def _deadline_response() -> JSONResponse:
+    return JSONResponse(status_code=504, content={"detail": "Превышено время обработки запроса"})
+
+
+# Лишние запросы отклоняются до начала обработки
+app.add_middleware(LoadSheddingMiddleware)
+
+
+@app.middleware("http")
+async def access_log(request: Request, call_next):
+    """
+    Внешний слой после CORS: присваивает запросу request_id (или берёт X-Request-ID)
+    и после ответа пишет запись access-лога, включая отклонённые запросы.
+    """
+    request_id = request.headers.get("x-request-id", "")[:64] or uuid.uuid4().hex
+    token = logs.bind_request(request_id, request.url.path)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        context = logs.current_request()
+        route = request.scope.get("route")
+        access_logger.info(
+            "request",
+            extra={"fields": {
+                "method": request.method,
+                "path": request.url.path,
+                "route_template": getattr(route, "path", None),
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "upstream": context.upstream,
+            }},
+        )
+        logs.reset_request(token)
+
+
+# CORS добавляется последним и становится внешним слоем: заголовки CORS
+# получают все ответы, включая 503 при сбросе нагрузки и 504 по бюджету
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ORIGINS,
@@ -35,12 +141,15 @@ app.add_middleware(
     allow_headers=["Authorization", "Content-Type", "Accept", "X-Admin-Request"],
 )
 
+
 # Маршруты
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(personal_account_router, prefix="/personal_account", tags=["Personal Account"])
 app.include_router(transactions_router, prefix="/transactions", tags=["Transactions"])
 app.include_router(user_router, prefix="/user", tags=["User"])
 app.include_router(deals_router, prefix="/deals", tags=["Deals"])
+app.include_router(health_router, prefix="/health", tags=["Health"])
+app.include_router(files_router, prefix="/files", tags=["Files"])
 
 
 
@@ -0,0 +1,16 @@
+-- Фоновые задачи (массовый импорт сотрудников и т.п.) со статусом и отчётом
+CREATE TABLE IF NOT EXISTS jobs (
+    id CHAR(32) NOT NULL,
+    kind VARCHAR(64) NOT NULL,
+    status ENUM('queued', 'running', 'done', 'failed') NOT NULL DEFAULT 'queued',
+    user_id INT NULL,
+    company_id INT NULL,
+    payload LONGTEXT NULL,
+    result JSON NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    error TEXT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (id),
+    KEY idx_jobs_kind_status (kind, status, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,21 @@
+-- Справочник сотрудников компании: хранимый ранг роли и индексы для
+-- постраничной выдачи и поиска по префиксу без filesort.
+-- created_at входит в курсор страницы, поэтому NULL заменяется на начало эпохи
+-- (такие записи идут в конце списка) и колонка становится NOT NULL
+UPDATE users SET created_at = '1970-01-01 00:00:00' WHERE created_at IS NULL;
+
+ALTER TABLE users
+    MODIFY COLUMN created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ADD COLUMN role_rank TINYINT AS (
+        CASE role
+            WHEN 'Руководитель' THEN 1
+            WHEN 'Сотрудник' THEN 2
+            ELSE 3
+        END
+    ) STORED,
+    ADD INDEX idx_users_company_rank (company_id, role_rank, created_at DESC, id DESC),
+    ADD INDEX idx_users_company_last_name (company_id, last_name),
+    ADD INDEX idx_users_company_first_name (company_id, first_name),
+    ADD INDEX idx_users_company_phone (company_id, phone),
+    ADD INDEX idx_users_company_email (company_id, email),
+    ADD INDEX idx_users_company_position (company_id, position);
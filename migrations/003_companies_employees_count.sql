@@ -0,0 +1,7 @@
+-- Счётчик сотрудников компании, поддерживаемый путями регистрации и удаления
+ALTER TABLE companies
+    ADD COLUMN employees_count INT NOT NULL DEFAULT 0;
+
+-- Начальное заполнение (далее — python -m src.personal_account.legal.utils.company_counters)
+UPDATE companies c
+SET c.employees_count = (SELECT COUNT(*) FROM users u WHERE u.company_id = c.id);
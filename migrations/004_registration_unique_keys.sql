@@ -0,0 +1,29 @@
+-- Уникальные ключи, на которые опирается регистрация: дубликаты отклоняются
+-- самой БД (ER_DUP_ENTRY -> 400), без предварительного SELECT и без гонок.
+--
+-- Перед добавлением ключей миграция выводит уже существующие дубликаты.
+-- Если список не пуст, ALTER TABLE завершится ошибкой Duplicate entry:
+-- объедините или исправьте перечисленные записи (телефон и email — у
+-- пользователей, ИНН и токен приглашения — у компаний) и запустите миграцию
+-- повторно. Автоматически записи не удаляются: на них ссылаются сделки
+-- и контакты Bitrix24.
+SELECT 'users.phone' AS duplicate_key, phone AS value, COUNT(*) AS records,
+       GROUP_CONCAT(id ORDER BY id) AS ids
+FROM users WHERE phone IS NOT NULL GROUP BY phone HAVING COUNT(*) > 1
+UNION ALL
+SELECT 'users.email', email, COUNT(*), GROUP_CONCAT(id ORDER BY id)
+FROM users WHERE email IS NOT NULL GROUP BY email HAVING COUNT(*) > 1
+UNION ALL
+SELECT 'companies.inn', inn, COUNT(*), GROUP_CONCAT(id ORDER BY id)
+FROM companies WHERE inn IS NOT NULL GROUP BY inn HAVING COUNT(*) > 1
+UNION ALL
+SELECT 'companies.invite_token', invite_token, COUNT(*), GROUP_CONCAT(id ORDER BY id)
+FROM companies WHERE invite_token IS NOT NULL GROUP BY invite_token HAVING COUNT(*) > 1;
+
+ALTER TABLE users
+    ADD UNIQUE KEY uq_users_phone (phone),
+    ADD UNIQUE KEY uq_users_email (email);
+
+ALTER TABLE companies
+    ADD UNIQUE KEY uq_companies_inn (inn),
+    ADD UNIQUE KEY uq_companies_invite_token (invite_token);
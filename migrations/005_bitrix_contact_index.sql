@@ -0,0 +1,11 @@
+-- Локальный индекс контактов Bitrix24: нормализованный телефон/email -> contact_id.
+-- Заполняется командой python -m src.auth.utils.contact_index и нашими
+-- собственными созданиями контактов
+CREATE TABLE IF NOT EXISTS bitrix_contact_index (
+    kind ENUM('phone', 'email') NOT NULL,
+    value VARCHAR(255) NOT NULL,
+    contact_id INT NOT NULL,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (kind, value),
+    KEY idx_contact_index_contact (contact_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,3 @@
+-- Выгрузка истории транзакций: фильтр по пользователю и периоду в порядке created_at
+ALTER TABLE transactions
+    ADD INDEX idx_transactions_user_created (user_id, created_at, id);
@@ -0,0 +1,17 @@
+-- Ротируемые refresh-токены: хранится только SHA-256 токена.
+-- Все токены одной цепочки ротаций имеют общий family_id; повторное
+-- использование уже обменянного токена отзывает всё семейство.
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    token_hash CHAR(64) NOT NULL,
+    family_id CHAR(32) NOT NULL,
+    user_id INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    used_at DATETIME NULL,
+    revoked_at DATETIME NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id),
+    UNIQUE KEY uq_refresh_tokens_hash (token_hash),
+    KEY idx_refresh_tokens_family (family_id),
+    KEY idx_refresh_tokens_user (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,11 @@
+-- Отозванные access-токены (по jti). Рабочие процессы подгружают новые
+-- записи по возрастанию id, поэтому проверка токена не обращается к БД.
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    jti CHAR(32) NOT NULL,
+    expires_at DATETIME NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id),
+    UNIQUE KEY uq_revoked_tokens_jti (jti),
+    KEY idx_revoked_tokens_expires (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
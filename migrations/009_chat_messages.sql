@@ -0,0 +1,23 @@
+-- Сообщения чата по сделке, принятые до отправки в Bitrix24.
+-- Сообщение сохраняется в статусе queued и подтверждается клиенту сразу;
+-- фоновая синхронизация создаёт активность в Bitrix24 и сохраняет её ID
+-- (activity_id). Вложения хранятся до успешной отправки.
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    deal_id VARCHAR(32) NOT NULL,
+    user_id INT NULL,
+    author_id VARCHAR(32) NULL,
+    subject VARCHAR(255) NOT NULL,
+    comment TEXT NOT NULL,
+    files LONGTEXT NULL,
+    file_names JSON NULL,
+    status ENUM('queued', 'sending', 'sent', 'failed') NOT NULL DEFAULT 'queued',
+    activity_id VARCHAR(32) NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    error TEXT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (id),
+    KEY idx_chat_messages_deal (deal_id, status),
+    KEY idx_chat_messages_status (status, updated_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -3,14 +3,24 @@
 ========================
 
 Модуль для аутентификации пользователей (вход/выход).
+
+Вход выдаёт короткоживущий access-токен и ротируемый refresh-токен;
+/refresh обновляет access-токен без проверки пароля.
+
+Запросы к БД выполняются в пуле "db", проверка пароля — в пуле "cpu"
+(utils.executors), чтобы не блокировать event loop.
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import JSONResponse
-from src.utils.jwt_handler import create_access_token
+from src.utils.jwt_handler import create_access_token, user_token_claims
+from src.utils import token_revocation
+import jwt
 from ..utils.password_handler import verify_password
-from config import ACCESS_TOKEN_EXPIRE_MINUTES
+from ..utils import login_throttle, refresh_tokens
+from config import ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY, ALGORITHM
 from database import connect_to_db
+from src.utils import executors, prepared
 import mysql.connector
 from ..models import LoginData
 import os
@@ -18,30 +28,31 @@ import os
 router = APIRouter()
 
 
-@router.post("/login")
-async def login(data: LoginData):
-    """Вход пользователя по логину/телефону и паролю"""
-    try:
-        conn = connect_to_db()
-        cursor = conn.cursor(dictionary=True)
+def set_access_cookie(response: JSONResponse, access_token: str) -> None:
+    response.set_cookie(
+        key="access_token",
+        value=access_token,
+        httponly=True,
+        secure=True if os.getenv("ENV") == "production" else False, 
+        samesite="none" if os.getenv("ENV") == "production" else "lax", 
+        max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    )
 
+
+def _find_user(login: str) -> dict | None:
+    conn = connect_to_db()
+    try:
         # Ищем пользователя по почте или телефону
-        cursor.execute(
-            "SELECT * FROM users WHERE email = %s OR phone = %s",
-            (data.email_or_phone, data.email_or_phone),
-        )
-        user = cursor.fetchone()
+        return prepared.fetchone(conn, "user_by_login", (login, login))
+    finally:
+        conn.close()
 
-        if not user:
-            cursor.close()
-            conn.close()
-            raise HTTPException(status_code=401, detail="Неверный номер телефона/почта или пароль")
 
-        # Проверяем пароль
-        if not verify_password(data.password, user["password"]):
-            cursor.close()
-            conn.close()
-            raise HTTPException(status_code=401, detail="Неверный логин или пароль")
+def _start_session(user: dict) -> tuple[dict | None, str]:
+    """Данные компании пользователя и новый refresh-токен"""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
 
         # Получаем информацию о компании (если юр. лицо)
         company_info = None
@@ -51,20 +62,42 @@ async def login(data: LoginData):
             )
             company_info = cursor.fetchone()
 
-        # Создаем токен
-        token_data = { 
-            "sub": user["email"],
-            "user_id": user["id"],
-            "user_type": user["user_type"],
-            "role": user["role"],
-            "first_name": user["first_name"],
-            "second_name": user["second_name"],
-            "last_name": user["last_name"],
-            "contact_id": user["contact_id"],
-            "company_id": user.get("company_id"),
-            "department_id": user.get("department_id"),
-        }
-        access_token = create_access_token(token_data, ACCESS_TOKEN_EXPIRE_MINUTES)
+        refresh_token = refresh_tokens.issue(cursor, user["id"])
+        conn.commit()
+        cursor.close()
+        return company_info, refresh_token
+    finally:
+        conn.close()
+
+
+def _user_for_token(user_id: int) -> dict | None:
+    conn = connect_to_db()
+    try:
+        return prepared.fetchone(conn, "user_for_token", (user_id,))
+    finally:
+        conn.close()
+
+
+@router.post("/login")
+async def login(data: LoginData, request: Request):
+    """Вход пользователя по логину/телефону и паролю"""
+    # Лимиты попыток проверяются до запроса к БД и проверки пароля
+    attempt = await login_throttle.check(login_throttle.client_ip(request), data.email_or_phone)
+    try:
+        user = await executors.run("db", _find_user, data.email_or_phone)
+
+        if not user:
+            await login_throttle.record_failure(attempt)
+            raise HTTPException(status_code=401, detail="Неверный номер телефона/почта или пароль")
+
+        # Проверяем пароль
+        if not await executors.run("cpu", verify_password, data.password, user["password"]):
+            await login_throttle.record_failure(attempt)
+            raise HTTPException(status_code=401, detail="Неверный логин или пароль")
+
+        # Создаем токены
+        company_info, refresh_token = await executors.run("db", _start_session, user)
+        access_token = create_access_token(user_token_claims(user), ACCESS_TOKEN_EXPIRE_MINUTES)
 
         response_data = {
             "message": "Вход выполнен успешно",
@@ -84,19 +117,46 @@ async def login(data: LoginData):
             }
 
         response = JSONResponse(content=response_data)
-        response.set_cookie(
-            key="access_token",
-            value=access_token,
-            httponly=True,
-            secure=True if os.getenv("ENV") == "production" else False, 
-            samesite="none" if os.getenv("ENV") == "production" else "lax", 
-            max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        )
+        set_access_cookie(response, access_token)
+        refresh_tokens.set_cookie(response, refresh_token)
 
-        cursor.close()
-        conn.close()
+        await login_throttle.record_success(attempt)
+        return response
+
+    except HTTPException:
+        raise
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Непредвиденная ошибка: {str(e)}")
+
+
+@router.post("/refresh")
+async def refresh(request: Request):
+    """Обновление access-токена по refresh-токену (с ротацией refresh-токена)"""
+    token = request.cookies.get(refresh_tokens.COOKIE_NAME)
+    if not token:
+        raise HTTPException(status_code=401, detail="Сессия не найдена")
+    try:
+        try:
+            user_id, new_refresh_token = await executors.run("db", refresh_tokens.rotate, token)
+        except refresh_tokens.RefreshTokenError as e:
+            response = JSONResponse(status_code=401, content={"detail": str(e)})
+            refresh_tokens.delete_cookie(response)
+            return response
+
+        user = await executors.run("db", _user_for_token, user_id)
+        if not user:
+            raise HTTPException(status_code=401, detail="Пользователь не найден")
+
+        access_token = create_access_token(user_token_claims(user), ACCESS_TOKEN_EXPIRE_MINUTES)
+        response = JSONResponse(content={"message": "Сессия обновлена"})
+        set_access_cookie(response, access_token)
+        refresh_tokens.set_cookie(response, new_refresh_token)
         return response
 
+    except HTTPException:
+        raise
     except mysql.connector.Error as e:
         raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
     except Exception as e:
@@ -104,9 +164,28 @@ async def login(data: LoginData):
 
 
 @router.post("/logout")
-async def logout():
+async def logout(request: Request):
     """Выход из системы"""
     response = JSONResponse(content={"message": "Выход выполнен успешно"})
+
+    # Отзываем сессию, чтобы refresh-токен нельзя было использовать повторно
+    token = request.cookies.get(refresh_tokens.COOKIE_NAME)
+    if token:
+        try:
+            await executors.run("db", refresh_tokens.revoke, token)
+        except (HTTPException, mysql.connector.Error):
+            pass
+    refresh_tokens.delete_cookie(response)
+
+    # Отзываем текущий access-токен до истечения его срока действия
+    access_token = request.cookies.get("access_token")
+    if access_token:
+        try:
+            claims = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
+            if claims.get("jti"):
+                await executors.run("db", token_revocation.revoke, claims["jti"], claims.get("exp"))
+        except (jwt.InvalidTokenError, HTTPException, mysql.connector.Error):
+            pass
     
     # Удаляем cookie с теми же параметрами, что и при создании
     response.delete_cookie(
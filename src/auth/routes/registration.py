@@ -3,9 +3,14 @@ from fastapi.responses import JSONResponse
 from src.utils.jwt_handler import create_access_token
 from ..utils.password_handler import hash_password
 from ..utils.token_utils import generate_company_token
+from ..utils import refresh_tokens
 from config import ACCESS_TOKEN_EXPIRE_MINUTES
 from database import connect_to_db
+from src.utils import executors, prepared
+from src.utils.executors import ExecutorSaturated
 import mysql.connector
+from mysql.connector import errorcode
+from src.personal_account.legal.utils.company_counters import adjust_employees_count
 from ..models import RegisterPhysicalPersonData, RegisterLegalEntityData, RegisterEmployeeData
 from ..utils.auth_utils import (
     create_bitrix_contact,
@@ -18,56 +23,94 @@ from ..utils.auth_utils import (
 router = APIRouter()
 
 
+# Уникальность телефона, email, ИНН и токена приглашения обеспечивают
+# уникальные индексы (migrations/004_registration_unique_keys.sql): отдельная
+# проверка перед INSERT не нужна, а одновременные регистрации не проходят обе.
+def _raise_if_duplicate(error: mysql.connector.Error, detail: str) -> None:
+    """Преобразует ошибку дублирования уникального ключа в ответ 400"""
+    if error.errno == errorcode.ER_DUP_ENTRY:
+        raise HTTPException(status_code=400, detail=detail)
+
+
+def _cleanup(conn, cursor, rollback: bool = True) -> None:
+    """Откат транзакции и освобождение соединения"""
+    if conn is None:
+        return
+    if rollback:
+        conn.rollback()
+    if cursor is not None:
+        cursor.close()
+    conn.close()
+
+
+async def _release(conn, cursor, rollback: bool = True) -> None:
+    """_cleanup в пуле потоков БД; при его перегрузке — в текущем потоке"""
+    try:
+        await executors.run("db", _cleanup, conn, cursor, rollback)
+    except ExecutorSaturated:
+        _cleanup(conn, cursor, rollback)
+
+
+# Запросы транзакции регистрации выполняются в пуле "db", вызовы Bitrix24 —
+# в пуле "bitrix": соединение переходит между потоками, но используется
+# последовательно, и event loop не блокируется ни сетью, ни БД.
+def _execute(cursor, query: str, params: tuple) -> int:
+    """Один запрос транзакции регистрации; возвращает lastrowid"""
+    cursor.execute(query, params)
+    return cursor.lastrowid
+
+
+def _commit(conn, cursor, user_id: int) -> str:
+    """Создаёт сессию (refresh-токен) в транзакции регистрации и фиксирует её"""
+    refresh_token = refresh_tokens.issue(cursor, user_id)
+    conn.commit()
+    return refresh_token
+
+
 @router.post("/register/physical")
 async def register_physical_person(data: RegisterPhysicalPersonData):
     """Регистрация физического лица"""
+    conn = cursor = None
     try:
-        conn = connect_to_db()
+        conn = await executors.run("db", connect_to_db)
         cursor = conn.cursor(dictionary=True)
 
-        # Проверка существования пользователя
-        cursor.execute(
-            "SELECT * FROM users WHERE phone = %s OR email = %s",
-            (data.phone, data.email),
-        )
-        if cursor.fetchone():
-            cursor.close()
-            conn.close()
-            raise HTTPException(
-                status_code=400,
-                detail="Пользователь с таким телефоном или email уже существует",
-            )
-
         # Форматируем телефон с "+"
         phone_with_plus = format_phone_with_plus(data.phone)
 
         # Проверка контакта в Bitrix24
-        contact_id = find_bitrix_contact(data.email, phone_with_plus)
+        contact_id = await executors.run("bitrix", find_bitrix_contact, data.email, phone_with_plus)
 
         # Хешируем пароль
-        hashed_password = hash_password(data.password)
+        hashed_password = await executors.run("cpu", hash_password, data.password)
 
         # Создаем пользователя в БД (телефон сохраняем с "+")
-        cursor.execute(
-            """INSERT INTO users (
-                password, user_type, role, first_name, second_name, 
-                last_name, birthdate, phone, email, contact_id, balance
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            (
-                hashed_password,
-                "physical",
-                "Пользователь",
-                data.first_name,
-                data.second_name,
-                data.last_name,
-                data.birthdate,
-                phone_with_plus,  # Сохраняем с "+"
-                data.email,
-                contact_id,  # Может быть None
-                0.0,
-            ),
-        )
-        user_id = cursor.lastrowid
+        try:
+            user_id = await executors.run(
+                "db",
+                _execute,
+                cursor,
+                """INSERT INTO users (
+                    password, user_type, role, first_name, second_name,
+                    last_name, birthdate, phone, email, contact_id, balance
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                (
+                    hashed_password,
+                    "physical",
+                    "Пользователь",
+                    data.first_name,
+                    data.second_name,
+                    data.last_name,
+                    data.birthdate,
+                    phone_with_plus,  # Сохраняем с "+"
+                    data.email,
+                    contact_id,  # Может быть None
+                    0.0,
+                ),
+            )
+        except mysql.connector.IntegrityError as e:
+            _raise_if_duplicate(e, "Пользователь с таким телефоном или email уже существует")
+            raise
 
         # Если контакта нет, создаем в Bitrix24
         if not contact_id:
@@ -79,48 +122,45 @@ async def register_physical_person(data: RegisterPhysicalPersonData):
                 "PHONE": [{"VALUE": phone_with_plus, "VALUE_TYPE": "WORK"}],
                 "EMAIL": [{"VALUE": data.email, "VALUE_TYPE": "WORK"}],
             }
-            contact_id = create_bitrix_contact(contact_data)
+            contact_id = await executors.run("bitrix", create_bitrix_contact, contact_data)
             if not contact_id:
-                conn.rollback()
-                cursor.close()
-                conn.close()
                 raise HTTPException(
                     status_code=500, detail="Ошибка создания контакта в Bitrix24"
                 )
 
             # Обновляем contact_id
-            cursor.execute(
+            await executors.run(
+                "db",
+                _execute,
+                cursor,
                 "UPDATE users SET contact_id = %s WHERE id = %s",
                 (contact_id, user_id),
             )
 
-        conn.commit()
-
-        # Получаем пользователя
-        cursor.execute("SELECT * FROM users WHERE phone = %s", (phone_with_plus,))
-        user = cursor.fetchone()
+        # Сессия (refresh-токен) создаётся в той же транзакции
+        refresh_token = await executors.run("db", _commit, conn, cursor, user_id)
 
-        # Создаем access_token
+        # Ответ формируем из уже известных значений, без повторного SELECT
         token_data = {
-            "user_id": user["id"],
-            "user_type": user["user_type"],
-            "role": user["role"],
-            "first_name": user["first_name"],
-            "second_name": user["second_name"],
-            "last_name": user["last_name"],
-            "contact_id": user["contact_id"],
-            "company_id": user.get("company_id"),
+            "user_id": user_id,
+            "user_type": "physical",
+            "role": "Пользователь",
+            "first_name": data.first_name,
+            "second_name": data.second_name,
+            "last_name": data.last_name,
+            "contact_id": contact_id,
+            "company_id": None,
         }
         access_token = create_access_token(token_data, ACCESS_TOKEN_EXPIRE_MINUTES)
 
         response_data = {
             "message": "Регистрация успешно завершена",
-            "user_type": user["user_type"],
-            "role": user["role"],
-            "first_name": user["first_name"],
-            "second_name": user["second_name"],
-            "last_name": user["last_name"],
-            "balance": float(user["balance"]),
+            "user_type": "physical",
+            "role": "Пользователь",
+            "first_name": data.first_name,
+            "second_name": data.second_name,
+            "last_name": data.last_name,
+            "balance": 0.0,
         }
         response = JSONResponse(content=response_data)
         response.set_cookie(
@@ -131,96 +171,90 @@ async def register_physical_person(data: RegisterPhysicalPersonData):
             samesite="lax",
             max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
         )
-        cursor.close()
-        conn.close()
+        refresh_tokens.set_cookie(response, refresh_token)
+        await _release(conn, cursor, rollback=False)
         return response
 
+    except HTTPException:
+        await _release(conn, cursor)
+        raise
     except mysql.connector.Error as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
+        await _release(conn, cursor)
         raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
     except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
+        await _release(conn, cursor)
         raise HTTPException(status_code=500, detail=f"Непредвиденная ошибка: {str(e)}")
 
 
 @router.post("/register/legal")
 async def register_legal_entity(data: RegisterLegalEntityData):
     """Регистрация юридического лица (руководитель компании)"""
+    conn = cursor = None
     try:
-        conn = connect_to_db()
+        conn = await executors.run("db", connect_to_db)
         cursor = conn.cursor(dictionary=True)
 
-        # Проверка существования
-        cursor.execute(
-            """
-            SELECT u.id FROM users u WHERE u.phone = %s OR u.email = %s
-            UNION
-            SELECT c.id FROM companies c WHERE c.inn = %s
-            """,
-            (data.phone, data.email, data.inn),
-        )
-        if cursor.fetchone():
-            cursor.close()
-            conn.close()
-            raise HTTPException(
-                status_code=400, detail="Пользователь или компания уже существуют"
-            )
-
         # Форматируем телефон с "+"
         phone_with_plus = format_phone_with_plus(data.phone)
 
         # Проверка контакта в Bitrix24
-        contact_id = find_bitrix_contact(data.email, phone_with_plus)
+        contact_id = await executors.run("bitrix", find_bitrix_contact, data.email, phone_with_plus)
 
         # Хешируем пароль
-        hashed_password = hash_password(data.password)
-
-        # Создаем пользователя в БД (телефон сохраняем с "+")
-        cursor.execute(
-            """INSERT INTO users (
-                password, user_type, role, first_name, second_name, 
-                last_name, phone, email, contact_id, company_id, balance
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            (
-                hashed_password,
-                "legal",
-                "Руководитель",
-                data.employee_first_name,
-                data.employee_second_name,
-                data.employee_last_name,
-                phone_with_plus,  # Сохраняем с "+"
-                data.email,
-                contact_id,  # Может быть None
-                None,
-                0.0,
-            ),
-        )
-        user_id = cursor.lastrowid
+        hashed_password = await executors.run("cpu", hash_password, data.password)
 
         # Генерируем токен для компании
         company_token = generate_company_token()
 
-        # Создаем компанию в БД с токеном
-        cursor.execute(
-            """INSERT INTO companies (
-                name, inn, invite_token, phone, email, bitrix_company_id, balance, creator_id
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
-            (
-                data.company_name,
-                data.inn,
-                company_token,  # Токен для приглашения
-                phone_with_plus,  # Сохраняем с "+"
-                data.email,
-                None,  # bitrix_company_id пока None
-                0.0,
-                user_id,
-            ),
-        )
-        company_db_id = cursor.lastrowid
+        try:
+            # Создаем пользователя в БД (телефон сохраняем с "+")
+            user_id = await executors.run(
+                "db",
+                _execute,
+                cursor,
+                """INSERT INTO users (
+                    password, user_type, role, first_name, second_name,
+                    last_name, phone, email, contact_id, company_id, balance
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                (
+                    hashed_password,
+                    "legal",
+                    "Руководитель",
+                    data.employee_first_name,
+                    data.employee_second_name,
+                    data.employee_last_name,
+                    phone_with_plus,  # Сохраняем с "+"
+                    data.email,
+                    contact_id,  # Может быть None
+                    None,
+                    0.0,
+                ),
+            )
+
+            # Создаем компанию в БД с токеном
+            company_db_id = await executors.run(
+                "db",
+                _execute,
+                cursor,
+                """INSERT INTO companies (
+                    name, inn, invite_token, phone, email, bitrix_company_id, balance, creator_id,
+                    employees_count
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                (
+                    data.company_name,
+                    data.inn,
+                    company_token,  # Токен для приглашения
+                    phone_with_plus,  # Сохраняем с "+"
+                    data.email,
+                    None,  # bitrix_company_id пока None
+                    0.0,
+                    user_id,
+                    1,  # Руководитель — первый сотрудник компании
+                ),
+            )
+        except mysql.connector.IntegrityError as e:
+            _raise_if_duplicate(e, "Пользователь или компания уже существуют")
+            raise
 
         # Создаем компанию в Bitrix24
         company_data = {
@@ -228,27 +262,26 @@ async def register_legal_entity(data: RegisterLegalEntityData):
             "PHONE": [{"VALUE": phone_with_plus, "VALUE_TYPE": "WORK"}],
             "EMAIL": [{"VALUE": data.email, "VALUE_TYPE": "WORK"}],
         }
-        company_id = create_bitrix_company(company_data)
+        company_id = await executors.run("bitrix", create_bitrix_company, company_data)
         if not company_id:
-            conn.rollback()
-            cursor.close()
-            conn.close()
             raise HTTPException(
                 status_code=500, detail="Ошибка создания компании в Bitrix24"
             )
 
         # Обновляем bitrix_company_id
-        cursor.execute(
+        await executors.run(
+            "db",
+            _execute,
+            cursor,
             "UPDATE companies SET bitrix_company_id = %s WHERE id = %s",
             (company_id, company_db_id),
         )
 
         # Создаем реквизиты в Bitrix24
-        requisite_id = create_bitrix_requisite(company_id, data.inn, data.company_name)
+        requisite_id = await executors.run(
+            "bitrix", create_bitrix_requisite, company_id, data.inn, data.company_name
+        )
         if not requisite_id:
-            conn.rollback()
-            cursor.close()
-            conn.close()
             raise HTTPException(
                 status_code=500, detail="Ошибка создания реквизитов в Bitrix24"
             )
@@ -263,54 +296,45 @@ async def register_legal_entity(data: RegisterLegalEntityData):
                 "EMAIL": [{"VALUE": data.email, "VALUE_TYPE": "WORK"}],
                 "COMPANY_ID": company_id,
             }
-            contact_id = create_bitrix_contact(contact_data)
+            contact_id = await executors.run("bitrix", create_bitrix_contact, contact_data)
             if not contact_id:
-                conn.rollback()
-                cursor.close()
-                conn.close()
                 raise HTTPException(
                     status_code=500, detail="Ошибка создания контакта в Bitrix24"
                 )
 
-            # Обновляем contact_id
-            cursor.execute(
-                "UPDATE users SET contact_id = %s WHERE id = %s",
-                (contact_id, user_id),
-            )
-
-        # Обновляем company_id в записи пользователя
-        cursor.execute(
-            "UPDATE users SET company_id = %s WHERE id = %s",
-            (company_db_id, user_id),
+        # Обновляем contact_id и company_id в записи пользователя одним запросом
+        await executors.run(
+            "db",
+            _execute,
+            cursor,
+            "UPDATE users SET contact_id = %s, company_id = %s WHERE id = %s",
+            (contact_id, company_db_id, user_id),
         )
 
-        conn.commit()
-
-        # Получаем пользователя
-        cursor.execute("SELECT * FROM users WHERE phone = %s", (phone_with_plus,))
-        user = cursor.fetchone()
+        # Сессия (refresh-токен) создаётся в той же транзакции
+        refresh_token = await executors.run("db", _commit, conn, cursor, user_id)
 
-        # Создаем access_token
+        # Ответ формируем из уже известных значений, без повторного SELECT
         token_data = {
-            "user_id": user["id"],
-            "user_type": user["user_type"],
-            "role": user["role"],
-            "first_name": user["first_name"],
-            "second_name": user["second_name"],
-            "last_name": user["last_name"],
-            "contact_id": user["contact_id"],
-            "company_id": user.get("company_id"),
+            "user_id": user_id,
+            "user_type": "legal",
+            "role": "Руководитель",
+            "first_name": data.employee_first_name,
+            "second_name": data.employee_second_name,
+            "last_name": data.employee_last_name,
+            "contact_id": contact_id,
+            "company_id": company_db_id,
         }
         access_token = create_access_token(token_data, ACCESS_TOKEN_EXPIRE_MINUTES)
 
         response_data = {
             "message": "Регистрация компании успешно завершена",
-            "user_type": user["user_type"],
-            "role": user["role"],
-            "first_name": user["first_name"],
-            "second_name": user["second_name"],
-            "last_name": user["last_name"],
-            "balance": float(user["balance"]),
+            "user_type": "legal",
+            "role": "Руководитель",
+            "first_name": data.employee_first_name,
+            "second_name": data.employee_second_name,
+            "last_name": data.employee_last_name,
+            "balance": 0.0,
             "company_token": company_token,  # Возвращаем токен руководителю
         }
         response = JSONResponse(content=response_data)
@@ -322,52 +346,35 @@ async def register_legal_entity(data: RegisterLegalEntityData):
             samesite="lax",
             max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
         )
-        cursor.close()
-        conn.close()
+        refresh_tokens.set_cookie(response, refresh_token)
+        await _release(conn, cursor, rollback=False)
         return response
 
+    except HTTPException:
+        await _release(conn, cursor)
+        raise
     except mysql.connector.Error as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
+        await _release(conn, cursor)
         raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
     except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
+        await _release(conn, cursor)
         raise HTTPException(status_code=500, detail=f"Непредвиденная ошибка: {str(e)}")
 
 
 @router.post("/register/employee")
 async def register_employee(data: RegisterEmployeeData):
     """Регистрация сотрудника компании по токену приглашения"""
+    conn = cursor = None
     try:
-        conn = connect_to_db()
+        conn = await executors.run("db", connect_to_db)
         cursor = conn.cursor(dictionary=True)
 
-        # Проверка существования пользователя
-        cursor.execute(
-            "SELECT * FROM users WHERE phone = %s OR email = %s",
-            (data.phone, data.email),
-        )
-        if cursor.fetchone():
-            cursor.close()
-            conn.close()
-            raise HTTPException(
-                status_code=400,
-                detail="Пользователь с таким телефоном или email уже существует",
-            )
-
         # Проверяем токен и получаем компанию
-        cursor.execute(
-            "SELECT id, name, bitrix_company_id FROM companies WHERE invite_token = %s",
-            (data.company_token,),
+        company = await executors.run(
+            "db", prepared.fetchone, conn, "company_by_invite_token", (data.company_token,)
         )
-        company = cursor.fetchone()
-        
+
         if not company:
-            cursor.close()
-            conn.close()
             raise HTTPException(
                 status_code=404,
                 detail="Компания с таким токеном не найдена. Проверьте правильность токена",
@@ -377,34 +384,40 @@ async def register_employee(data: RegisterEmployeeData):
         phone_with_plus = format_phone_with_plus(data.phone)
 
         # Проверка контакта в Bitrix24
-        contact_id = find_bitrix_contact(data.email, phone_with_plus)
+        contact_id = await executors.run("bitrix", find_bitrix_contact, data.email, phone_with_plus)
 
         # Хешируем пароль
-        hashed_password = hash_password(data.password)
+        hashed_password = await executors.run("cpu", hash_password, data.password)
 
         # Создаем пользователя в БД как сотрудника
-        cursor.execute(
-            """INSERT INTO users (
-                password, user_type, role, first_name, second_name, 
-                last_name, phone, email, contact_id, company_id, 
-                position, balance
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            (
-                hashed_password,
-                "legal",
-                "Сотрудник",  # Роль - Сотрудник
-                data.first_name,
-                data.second_name,
-                data.last_name,
-                phone_with_plus,
-                data.email,
-                contact_id,  # Может быть None
-                company["id"],  # ID компании из БД
-                data.position,  # Должность (фиктивная)
-                0.0,
-            ),
-        )
-        user_id = cursor.lastrowid
+        try:
+            user_id = await executors.run(
+                "db",
+                _execute,
+                cursor,
+                """INSERT INTO users (
+                    password, user_type, role, first_name, second_name,
+                    last_name, phone, email, contact_id, company_id,
+                    position, balance
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                (
+                    hashed_password,
+                    "legal",
+                    "Сотрудник",  # Роль - Сотрудник
+                    data.first_name,
+                    data.second_name,
+                    data.last_name,
+                    phone_with_plus,
+                    data.email,
+                    contact_id,  # Может быть None
+                    company["id"],  # ID компании из БД
+                    data.position,  # Должность (фиктивная)
+                    0.0,
+                ),
+            )
+        except mysql.connector.IntegrityError as e:
+            _raise_if_duplicate(e, "Пользователь с таким телефоном или email уже существует")
+            raise
 
         # Если контакта нет, создаем в Bitrix24 и привязываем к компании
         if not contact_id:
@@ -416,51 +429,51 @@ async def register_employee(data: RegisterEmployeeData):
                 "EMAIL": [{"VALUE": data.email, "VALUE_TYPE": "WORK"}],
                 "COMPANY_ID": company["bitrix_company_id"],  # Привязываем к компании в Bitrix
             }
-            contact_id = create_bitrix_contact(contact_data)
+            contact_id = await executors.run("bitrix", create_bitrix_contact, contact_data)
             if not contact_id:
-                conn.rollback()
-                cursor.close()
-                conn.close()
                 raise HTTPException(
                     status_code=500, detail="Ошибка создания контакта в Bitrix24"
                 )
 
             # Обновляем contact_id
-            cursor.execute(
+            await executors.run(
+                "db",
+                _execute,
+                cursor,
                 "UPDATE users SET contact_id = %s WHERE id = %s",
                 (contact_id, user_id),
             )
 
-        conn.commit()
+        # Счётчик сотрудников меняется в той же транзакции
+        await executors.run("db", adjust_employees_count, cursor, company["id"], 1)
 
-        # Получаем пользователя
-        cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-        user = cursor.fetchone()
+        # Сессия (refresh-токен) создаётся в той же транзакции
+        refresh_token = await executors.run("db", _commit, conn, cursor, user_id)
 
-        # Создаем access_token
+        # Ответ формируем из уже известных значений, без повторного SELECT
         token_data = {
-            "user_id": user["id"],
-            "user_type": user["user_type"],
-            "role": user["role"],
-            "first_name": user["first_name"],
-            "second_name": user["second_name"],
-            "last_name": user["last_name"],
-            "contact_id": user["contact_id"],
-            "company_id": user.get("company_id"),
-            "position": user.get("position"),
+            "user_id": user_id,
+            "user_type": "legal",
+            "role": "Сотрудник",
+            "first_name": data.first_name,
+            "second_name": data.second_name,
+            "last_name": data.last_name,
+            "contact_id": contact_id,
+            "company_id": company["id"],
+            "position": data.position,
         }
         access_token = create_access_token(token_data, ACCESS_TOKEN_EXPIRE_MINUTES)
 
         response_data = {
             "message": f"Регистрация успешно завершена. Вы присоединились к компании {company['name']}",
-            "user_type": user["user_type"],
-            "role": user["role"],
-            "first_name": user["first_name"],
-            "second_name": user["second_name"],
-            "last_name": user["last_name"],
+            "user_type": "legal",
+            "role": "Сотрудник",
+            "first_name": data.first_name,
+            "second_name": data.second_name,
+            "last_name": data.last_name,
             "position": data.position,
             "company_name": company["name"],
-            "balance": float(user["balance"]),
+            "balance": 0.0,
         }
         response = JSONResponse(content=response_data)
         response.set_cookie(
@@ -471,17 +484,16 @@ async def register_employee(data: RegisterEmployeeData):
             samesite="lax",
             max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
         )
-        cursor.close()
-        conn.close()
+        refresh_tokens.set_cookie(response, refresh_token)
+        await _release(conn, cursor, rollback=False)
         return response
 
+    except HTTPException:
+        await _release(conn, cursor)
+        raise
     except mysql.connector.Error as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
+        await _release(conn, cursor)
         raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
     except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise HTTPException(status_code=500, detail=f"Непредвиденная ошибка: {str(e)}")
\ No newline at end of file
+        await _release(conn, cursor)
+        raise HTTPException(status_code=500, detail=f"Непредвиденная ошибка: {str(e)}")
@@ -1,22 +1,31 @@
+import logging
 import requests
 import re
-from config import BITRIX_DOMAIN, BITRIX_TOKEN
+import mysql.connector
+from fastapi import HTTPException
+from src.utils.bitrix import bitrix_batch, bitrix_get, bitrix_post
+from . import contact_index
+
+logger = logging.getLogger(__name__)
 
 # Вспомогательные функции
 def create_bitrix_contact(data: dict) -> int | None:
     """Создание контакта в Bitrix24"""
-    url = f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/crm.contact.add.json"
-    response = requests.post(url, json={"fields": data})
+    method = "crm.contact.add"
+    response = bitrix_post(method, {"fields": data})
 
     if response.status_code == 200 and response.json().get("result"):
-        return response.json()["result"]
+        contact_id = response.json()["result"]
+        # Новый контакт сразу попадает в локальный индекс
+        _index_safely(lambda: contact_index.record_contact_fields(contact_id, data))
+        return contact_id
     return None
 
 
 def create_bitrix_company(data: dict) -> int | None:
     """Создание компании в Bitrix24"""
-    url = f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/crm.company.add.json"
-    response = requests.post(url, json={"fields": data})
+    method = "crm.company.add"
+    response = bitrix_post(method, {"fields": data})
 
     if response.status_code == 200 and response.json().get("result"):
         return response.json()["result"]
@@ -25,7 +34,7 @@ def create_bitrix_company(data: dict) -> int | None:
     
 def create_bitrix_requisite(company_id: int, inn: str, company_name: str) -> int | None:
     """Создание реквизитов компании в Bitrix24"""
-    url = f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/crm.requisite.add.json"
+    method = "crm.requisite.add"
     data = {
         "fields": {
             "ENTITY_TYPE_ID": "4",  # Тип сущности: компания
@@ -38,16 +47,25 @@ def create_bitrix_requisite(company_id: int, inn: str, company_name: str) -> int
             "RQ_COMPANY_FULL_NAME": company_name,
         }
     }
-    response = requests.post(url, json=data)
+    response = bitrix_post(method, data)
     
     if response.status_code == 200:
         result = response.json()
         if "result" in result:
             return result["result"]
         else:
-            print(f"Ошибка Bitrix24: {result.get('error', 'Неизвестная ошибка')} - {result.get('error_description', '')}")
+            logger.warning(
+                "Bitrix24 не создал реквизиты компании",
+                extra={"fields": {
+                    "error": result.get("error", "Неизвестная ошибка"),
+                    "error_description": result.get("error_description", ""),
+                }},
+            )
     else:
-        print(f"HTTP ошибка: {response.status_code}, {response.text}")
+        logger.warning(
+            "HTTP ошибка при создании реквизитов компании",
+            extra={"fields": {"status": response.status_code, "body": response.text[:500]}},
+        )
     return None
 
 
@@ -60,10 +78,50 @@ def format_phone_with_plus(phone: str) -> str:
     normalized = normalize_phone(phone)
     return f"+{normalized}"
 
+def _matched_contact(contacts: list, email: str, phone_with_plus: str) -> dict | None:
+    for contact in contacts:
+        emails = contact.get("EMAIL", [])
+        phones = contact.get("PHONE", [])
+
+        email_match = any(e.get("VALUE", "").lower() == email.lower() for e in emails)
+        phone_match = any(p.get("VALUE", "") == phone_with_plus for p in phones)
+
+        if email_match or phone_match:
+            return contact
+
+    return None
+
+
+def match_bitrix_contact(contacts: list, email: str, phone_with_plus: str) -> str | None:
+    """Выбирает контакт из результата crm.contact.list по совпадению email или телефона"""
+    contact = _matched_contact(contacts, email, phone_with_plus)
+    return contact.get("ID") if contact else None
+
+
+def _index_safely(action, default=None):
+    """Операции с локальным индексом не должны прерывать регистрацию"""
+    try:
+        return action()
+    except (mysql.connector.Error, HTTPException, OSError):
+        return default
+
+
 def find_bitrix_contact(email: str, phone: str) -> str | None:
-    """Проверяет существование контакта в Bitrix24 по email и телефону"""
+    """
+    Проверяет существование контакта по email и телефону.
+
+    Сначала используется локальный индекс контактов и отрицательный кэш,
+    и только при их промахе — crm.contact.list в Bitrix24.
+    """
     phone_with_plus = format_phone_with_plus(phone)
-    url = f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/crm.contact.list.json"
+
+    contact_id = _index_safely(lambda: contact_index.lookup_contact(email, phone_with_plus))
+    if contact_id:
+        return contact_id
+    if contact_index.is_known_miss(email, phone_with_plus):
+        return None
+
+    method = "crm.contact.list"
     params = {
         "filter[PHONE]": phone_with_plus,
         "filter[EMAIL]": email,
@@ -71,28 +129,75 @@ def find_bitrix_contact(email: str, phone: str) -> str | None:
     }
 
     try:
-        response = requests.get(url, params=params)
+        response = bitrix_get(method, params)
         response.raise_for_status()
         contacts = response.json().get("result", [])
 
-        if not contacts:
+        contact = _matched_contact(contacts, email, phone_with_plus)
+        if not contact:
+            contact_index.remember_miss(email, phone_with_plus)
             return None
-
-        for contact in contacts:
-            contact_id = contact.get("ID")
-            emails = contact.get("EMAIL", [])
-            phones = contact.get("PHONE", [])
-
-            email_match = any(e.get("VALUE", "").lower() == email.lower() for e in emails)
-            phone_match = any(p.get("VALUE", "") == phone_with_plus for p in phones)
-
-            if email_match and phone_match:
-                return contact_id
-
-            elif email_match or phone_match:
-                return contact_id
-
-        return None
+        _index_safely(lambda: contact_index.record_contact_fields(contact["ID"], contact))
+        return contact["ID"]
 
     except requests.RequestException as e:
         return None
+
+
+def find_bitrix_contacts_batch(people: list[tuple[str, str]]) -> list[str | None]:
+    """
+    Пакетный поиск контактов: сначала одним запросом по локальному индексу,
+    затем для оставшихся — по одной команде crm.contact.list на человека
+    внутри вызовов batch. Возвращает contact_id (или None) в порядке people.
+    """
+    found = _index_safely(lambda: contact_index.lookup_contacts(people), [None] * len(people))
+    remaining = [index for index, contact_id in enumerate(found) if not contact_id]
+
+    commands = {}
+    for index in remaining:
+        email, phone = people[index]
+        commands[f"c{index}"] = (
+            "crm.contact.list",
+            {
+                "filter": {"PHONE": format_phone_with_plus(phone), "EMAIL": email},
+                "select": ["ID", "PHONE", "EMAIL"],
+            },
+        )
+    results, _ = bitrix_batch(commands) if commands else ({}, {})
+
+    matched = []
+    for index in remaining:
+        email, phone = people[index]
+        contact = _matched_contact(results.get(f"c{index}") or [], email, format_phone_with_plus(phone))
+        if contact:
+            found[index] = contact["ID"]
+            matched.append((
+                contact["ID"],
+                contact_index.multifield_values(contact.get("EMAIL")),
+                contact_index.multifield_values(contact.get("PHONE")),
+            ))
+    _index_safely(lambda: contact_index.record_contacts(matched))
+    return found
+
+
+def create_bitrix_contacts_batch(contacts: list[dict]) -> list[int | None]:
+    """
+    Пакетное создание контактов через batch.
+    Возвращает ID созданных контактов (None при ошибке) в порядке contacts.
+    """
+    commands = {
+        f"c{index}": ("crm.contact.add", {"fields": data})
+        for index, data in enumerate(contacts)
+    }
+    results, _ = bitrix_batch(commands)
+    created = [results.get(f"c{index}") or None for index in range(len(contacts))]
+    _index_safely(lambda: contact_index.record_contacts([
+        (
+            contact_id,
+            contact_index.multifield_values(data.get("EMAIL")),
+            contact_index.multifield_values(data.get("PHONE")),
+        )
+        for contact_id, data in zip(created, contacts)
+        if contact_id
+    ]))
+    return created
@@ -0,0 +1,216 @@
+"""
+Модуль contact_index.py
+=======================
+
+Локальный индекс контактов Bitrix24 (таблица bitrix_contact_index):
+нормализованный телефон/email -> contact_id.
+
+- Заполняется массовой выгрузкой контактов из Bitrix24:
+      python -m src.auth.utils.contact_index
+- Пополняется при каждом найденном или созданном нами контакте.
+- Промахи кэшируются на CONTACT_MISS_TTL_SECONDS в общем кэше процессов,
+  чтобы повторные попытки регистрации не обращались к Bitrix24.
+
+Ошибки БД при работе с индексом и ошибки общего кэша промахов не прерывают
+регистрацию: вызывающий код в этом случае обращается к Bitrix24 напрямую.
+"""
+
+import re
+from config import CONTACT_MISS_TTL_SECONDS
+from database import connect_to_db
+from src.utils import shared_cache
+from src.utils.bitrix import bitrix_get
+
+# Размер порции upsert при заполнении индекса
+_UPSERT_CHUNK_SIZE = 500
+
+
+def normalize_email(email: str) -> str:
+    return (email or "").strip().lower()
+
+
+def normalize_phone_key(phone: str) -> str:
+    """Ключ телефона в индексе — только цифры"""
+    return re.sub(r"\D", "", phone or "")
+
+
+def _miss_key(email: str, phone: str) -> str:
+    return f"bitrix.contact.miss:{normalize_email(email)}:{normalize_phone_key(phone)}"
+
+
+def is_known_miss(email: str, phone: str) -> bool:
+    """
+    Контакт недавно не был найден в Bitrix24.
+    Если общий кэш недоступен, возвращает False — контакт ищется в Bitrix24.
+    """
+    try:
+        entry = shared_cache.get(_miss_key(email, phone))
+    except OSError:
+        return False
+    return bool(entry and entry.is_fresh)
+
+
+def remember_miss(email: str, phone: str) -> None:
+    """Запоминает промах; ошибка общего кэша не прерывает регистрацию"""
+    try:
+        shared_cache.put_json(_miss_key(email, phone), True, CONTACT_MISS_TTL_SECONDS)
+    except OSError:
+        pass
+
+
+def lookup_contacts(people: list[tuple[str, str]]) -> list[str | None]:
+    """
+    Поиск contact_id по индексу одним запросом для списка (email, phone).
+    Приоритет: контакт, совпавший и по email, и по телефону; затем по email; затем по телефону.
+    """
+    if not people:
+        return []
+    emails = sorted({normalize_email(email) for email, _ in people} - {""})
+    phones = sorted({normalize_phone_key(phone) for _, phone in people} - {""})
+    conditions, params = [], []
+    if emails:
+        conditions.append(f"(kind = 'email' AND value IN ({', '.join(['%s'] * len(emails))}))")
+        params.extend(emails)
+    if phones:
+        conditions.append(f"(kind = 'phone' AND value IN ({', '.join(['%s'] * len(phones))}))")
+        params.extend(phones)
+    if not conditions:
+        return [None] * len(people)
+
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            f"SELECT kind, value, contact_id FROM bitrix_contact_index WHERE {' OR '.join(conditions)}",
+            tuple(params),
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    by_email = {row["value"]: str(row["contact_id"]) for row in rows if row["kind"] == "email"}
+    by_phone = {row["value"]: str(row["contact_id"]) for row in rows if row["kind"] == "phone"}
+    result = []
+    for email, phone in people:
+        email_match = by_email.get(normalize_email(email))
+        phone_match = by_phone.get(normalize_phone_key(phone))
+        if email_match and email_match == phone_match:
+            result.append(email_match)
+        else:
+            result.append(email_match or phone_match)
+    return result
+
+
+def lookup_contact(email: str, phone: str) -> str | None:
+    """Поиск contact_id по индексу для одного человека"""
+    return lookup_contacts([(email, phone)])[0]
+
+
+def _index_rows(contact_id, emails, phones) -> list[tuple]:
+    rows = []
+    for email in emails:
+        if normalize_email(email):
+            rows.append(("email", normalize_email(email), int(contact_id)))
+    for phone in phones:
+        if normalize_phone_key(phone):
+            rows.append(("phone", normalize_phone_key(phone), int(contact_id)))
+    return rows
+
+
+def _upsert(rows: list[tuple]) -> None:
+    if not rows:
+        return
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        for start in range(0, len(rows), _UPSERT_CHUNK_SIZE):
+            cursor.executemany(
+                """INSERT INTO bitrix_contact_index (kind, value, contact_id)
+                   VALUES (%s, %s, %s)
+                   ON DUPLICATE KEY UPDATE contact_id = VALUES(contact_id)""",
+                rows[start:start + _UPSERT_CHUNK_SIZE],
+            )
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def multifield_values(multifield) -> list[str]:
+    """Значения мультиполя Bitrix24 (PHONE/EMAIL)"""
+    return [item.get("VALUE", "") for item in multifield or [] if isinstance(item, dict)]
+
+
+def record_contacts(contacts: list[tuple]) -> None:
+    """
+    Добавляет контакты в индекс и сбрасывает для них отрицательный кэш.
+
+    Args:
+        contacts: список (contact_id, emails, phones)
+    """
+    rows = []
+    for contact_id, emails, phones in contacts:
+        if not contact_id:
+            continue
+        rows.extend(_index_rows(contact_id, emails, phones))
+        for email in emails or [""]:
+            for phone in phones or [""]:
+                shared_cache.delete(_miss_key(email, phone))
+    _upsert(rows)
+
+
+def record_contact(contact_id, emails: list[str], phones: list[str]) -> None:
+    record_contacts([(contact_id, emails, phones)])
+
+
+def record_contact_fields(contact_id, fields: dict) -> None:
+    """Добавляет в индекс контакт по полям crm.contact.add / crm.contact.list"""
+    record_contact(
+        contact_id,
+        multifield_values(fields.get("EMAIL")),
+        multifield_values(fields.get("PHONE")),
+    )
+
+
+def seed_from_bitrix() -> int:
+    """
+    Полная выгрузка контактов из Bitrix24 в индекс.
+
+    Используется постраничный обход по ID без подсчёта общего количества
+    (start=-1), что заметно быстрее обычной пагинации на больших порталах.
+
+    Returns:
+        int: Количество обработанных контактов
+    """
+    last_id = 0
+    total = 0
+    while True:
+        response = bitrix_get(
+            "crm.contact.list",
+            {
+                "filter[>ID]": last_id,
+                "order[ID]": "ASC",
+                "select[]": ["ID", "PHONE", "EMAIL"],
+                "start": -1,
+            },
+        )
+        response.raise_for_status()
+        contacts = response.json().get("result", [])
+        if not contacts:
+            break
+        rows = []
+        for contact in contacts:
+            rows.extend(_index_rows(
+                contact["ID"],
+                multifield_values(contact.get("EMAIL")),
+                multifield_values(contact.get("PHONE")),
+            ))
+        _upsert(rows)
+        total += len(contacts)
+        last_id = int(contacts[-1]["ID"])
+    return total
+
+
+if __name__ == "__main__":
+    print(f"Загружено контактов: {seed_from_bitrix()}")
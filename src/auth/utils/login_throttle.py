@@ -0,0 +1,216 @@
+"""
+Модуль login_throttle.py
+========================
+
+Ограничение попыток входа до обращения к БД и проверки пароля (bcrypt).
+
+Учитываются неудачные попытки в скользящем окне LOGIN_WINDOW_SECONDS:
+- с одного IP (перебор учётных записей с одного адреса): сверх
+  LOGIN_MAX_FAILURES_PER_IP возвращается 429 с Retry-After;
+- для одного логина (подбор пароля с разных адресов): ответ только
+  задерживается, учётная запись не блокируется — иначе злоумышленник мог бы
+  закрыть вход владельцу.
+После LOGIN_DELAY_AFTER_FAILURES неудач ответ задерживается с удвоением
+задержки, но не более LOGIN_MAX_DELAY_SECONDS.
+
+Попытка с IP резервируется в окне атомарно при проверке (параллельные запросы
+не проходят сверх лимита) и снимается после успешного входа.
+
+Окна хранятся в общем кэше процессов (shared_cache.update_json), поэтому
+лимиты действуют на весь хост. Блокировка и чтение файлов кэша выполняются
+в пуле "cpu" (utils.executors), а не в event loop. Ключи — HMAC от IP или логина, разложенные
+по _BUCKETS записям, в каждой не более _MAX_KEYS_PER_BUCKET ключей: число
+и размер файлов кэша не зависят от числа адресов и логинов.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import time
+from dataclasses import dataclass
+from typing import Callable
+from fastapi import HTTPException, Request
+from config import (
+    SECRET_KEY,
+    LOGIN_WINDOW_SECONDS,
+    LOGIN_MAX_FAILURES_PER_IP,
+    LOGIN_DELAY_AFTER_FAILURES,
+    LOGIN_MAX_DELAY_SECONDS,
+    TRUST_FORWARDED_FOR,
+    TRUSTED_PROXIES,
+)
+from src.utils import executors, shared_cache
+
+# Число записей общего кэша, по которым распределяются ключи
+_BUCKETS = 256
+# Максимум ключей в одной записи; сверх него вытесняются давно неактивные
+_MAX_KEYS_PER_BUCKET = 256
+# Неудач на учётную запись хранится не больше, чем нужно для максимальной задержки
+_MAX_ACCOUNT_FAILURES = 32
+
+_proxies = [ipaddress.ip_network(proxy, strict=False) for proxy in TRUSTED_PROXIES]
+
+
+@dataclass
+class LoginAttempt:
+    """Попытка входа, допущенная check()"""
+
+    ip: str
+    login: str
+    started_at: float
+
+
+def _is_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _proxies)
+
+
+def client_ip(request: Request) -> str:
+    """
+    IP клиента. За обратным прокси (TRUSTED_PROXIES или TRUST_FORWARDED_FOR)
+    берётся первый справа адрес X-Forwarded-For, не принадлежащий прокси:
+    левые адреса клиент может подставить сам.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not (TRUST_FORWARDED_FOR or _is_proxy(peer)):
+        return peer
+    hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_proxy(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+def _digest(kind: str, value: str) -> str:
+    # IP и логин не хранятся в открытом виде; HMAC не позволяет подобрать
+    # значения, попадающие в одну запись, и вытеснить чужой счётчик
+    return hmac.new(
+        (SECRET_KEY or "").encode("utf-8"), f"{kind}:{value}".encode("utf-8"), hashlib.sha256
+    ).hexdigest()[:32]
+
+
+def _bucket_key(digest: str) -> str:
+    return f"login.throttle:{int(digest[:8], 16) % _BUCKETS}"
+
+
+def _recent(timestamps, now: float, limit: int) -> list[float]:
+    """Отметки в пределах окна (не больше limit последних)"""
+    recent = [stamp for stamp in timestamps or [] if stamp > now - LOGIN_WINDOW_SECONDS]
+    return recent[-limit:] if limit > 0 else []
+
+
+def _update(kind: str, value: str, now: float, update: Callable[[list[float]], list[float]]) -> list[float]:
+    """Атомарно изменяет окно ключа и возвращает его новое значение"""
+    digest = _digest(kind, value)
+    result = []
+
+    def apply(bucket):
+        nonlocal result
+        windows = {}
+        for key, stamps in (bucket or {}).items():
+            recent = _recent(stamps, now, len(stamps))
+            if recent:
+                windows[key] = recent
+        result = update(windows.pop(digest, []))
+        if result:
+            windows[digest] = result
+        if len(windows) > _MAX_KEYS_PER_BUCKET:
+            newest = sorted(windows, key=lambda key: windows[key][-1], reverse=True)
+            windows = {key: windows[key] for key in newest[:_MAX_KEYS_PER_BUCKET]}
+        return windows
+
+    shared_cache.update_json(_bucket_key(digest), LOGIN_WINDOW_SECONDS, apply)
+    return result
+
+
+def _read(kind: str, value: str, now: float, limit: int) -> list[float]:
+    digest = _digest(kind, value)
+    entry = shared_cache.get(_bucket_key(digest))
+    bucket = entry.json() if entry and entry.is_fresh else {}
+    return _recent(bucket.get(digest), now, limit)
+
+
+def _admit(timestamps: list[float], now: float, limit: int) -> list[float]:
+    """Резервирует попытку в окне, если лимит не исчерпан"""
+    recent = _recent(timestamps, now, limit)
+    if len(recent) < limit:
+        recent.append(now)
+    return recent
+
+
+def _reject(oldest: float, now: float) -> None:
+    retry_after = int(oldest + LOGIN_WINDOW_SECONDS - now) + 1
+    raise HTTPException(
+        status_code=429,
+        detail="Слишком много попыток входа. Попробуйте позже",
+        headers={"Retry-After": str(max(retry_after, 1))},
+    )
+
+
+def _delay(failures: int) -> float:
+    if failures < LOGIN_DELAY_AFTER_FAILURES:
+        return 0.0
+    return min(LOGIN_MAX_DELAY_SECONDS, 2 ** (failures - LOGIN_DELAY_AFTER_FAILURES))
+
+
+async def check(ip: str, login: str) -> LoginAttempt:
+    """
+    Учитывает попытку входа и применяет ограничения.
+
+    Returns:
+        LoginAttempt: передаётся в record_failure / record_success
+
+    Raises:
+        HTTPException: 429, если исчерпан лимит неудач с IP
+    """
+    now = time.time()
+    failures_ip = await executors.run(
+        "cpu", _update, "ip", ip, now, lambda stamps: _admit(stamps, now, LOGIN_MAX_FAILURES_PER_IP)
+    )
+    if not failures_ip or failures_ip[-1] != now:
+        _reject(failures_ip[0], now)
+
+    failures_account = await executors.run("cpu", _read, "account", login.strip().lower(), now, _MAX_ACCOUNT_FAILURES)
+
+    # Задержка растёт с числом неудач по учётной записи и с числом неудач
+    # с IP во второй половине лимита
+    delay = max(
+        _delay(len(failures_account)),
+        _delay(len(failures_ip) - LOGIN_MAX_FAILURES_PER_IP // 2),
+    )
+    if delay:
+        await asyncio.sleep(delay)
+    return LoginAttempt(ip=ip, login=login, started_at=now)
+
+
+async def record_failure(attempt: LoginAttempt) -> None:
+    """Учитывает неудачную попытку для учётной записи (для IP она уже учтена в check)"""
+    now = time.time()
+    await executors.run(
+        "cpu",
+        _update,
+        "account",
+        attempt.login.strip().lower(),
+        now,
+        lambda stamps: _recent(stamps, now, _MAX_ACCOUNT_FAILURES - 1) + [now],
+    )
+
+
+async def record_success(attempt: LoginAttempt) -> None:
+    """Снимает резерв попытки с IP и сбрасывает неудачи учётной записи"""
+    now = time.time()
+
+    def release(stamps: list[float]) -> list[float]:
+        if attempt.started_at in stamps:
+            stamps.remove(attempt.started_at)
+        return stamps
+
+    def apply() -> None:
+        _update("ip", attempt.ip, now, release)
+        _update("account", attempt.login.strip().lower(), now, lambda stamps: [])
+
+    await executors.run("cpu", apply)
@@ -0,0 +1,160 @@
+"""
+Модуль refresh_tokens.py
+========================
+
+Ротируемые refresh-токены (таблица refresh_tokens, migrations/007).
+
+- Токен — случайная строка, в БД хранится только её SHA-256, поиск идёт
+  по уникальному индексу хеша.
+- Каждый обмен (/auth/refresh) помечает токен использованным и выдаёт
+  новый в том же семействе (family_id).
+- Повторное предъявление уже использованного или отозванного токена
+  означает его утечку: отзывается всё семейство, и сессию нужно начинать
+  заново через вход по паролю.
+- Исключение — повтор в течение REFRESH_TOKEN_REUSE_GRACE_SECONDS после
+  обмена (параллельные обновления из нескольких вкладок или повтор запроса
+  после обрыва ответа): выдаётся ещё один токен того же семейства.
+"""
+
+import hashlib
+import os
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from fastapi.responses import Response
+from config import REFRESH_TOKEN_EXPIRE_DAYS, REFRESH_TOKEN_REUSE_GRACE_SECONDS
+from database import connect_to_db
+
+COOKIE_NAME = "refresh_token"
+# Cookie отправляется только на эндпоинты /auth (refresh и logout)
+COOKIE_PATH = "/auth"
+
+
+class RefreshTokenError(Exception):
+    """Refresh-токен не найден, истёк, отозван или использован повторно"""
+
+
+def _hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def issue(cursor, user_id: int, family_id: str | None = None) -> str:
+    """
+    Создаёт refresh-токен в транзакции вызывающего кода.
+
+    Args:
+        cursor: курсор соединения вызывающего кода (commit выполняет он)
+        user_id: ID пользователя
+        family_id: семейство при ротации; None — новая сессия
+    """
+    token = secrets.token_urlsafe(32)
+    cursor.execute(
+        """INSERT INTO refresh_tokens (token_hash, family_id, user_id, expires_at)
+           VALUES (%s, %s, %s, %s)""",
+        (
+            _hash(token),
+            family_id or uuid.uuid4().hex,
+            user_id,
+            datetime.now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        ),
+    )
+    return token
+
+
+def rotate(token: str) -> tuple[int, str]:
+    """
+    Обменивает refresh-токен на новый.
+
+    Returns:
+        tuple: (user_id, новый refresh-токен)
+
+    Raises:
+        RefreshTokenError: Если токен недействителен; при повторном
+            использовании семейство токена отзывается
+    """
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            """SELECT id, family_id, user_id, expires_at, used_at, revoked_at,
+                      used_at >= NOW() - INTERVAL %s SECOND AS reuse_in_grace
+               FROM refresh_tokens WHERE token_hash = %s FOR UPDATE""",
+            (REFRESH_TOKEN_REUSE_GRACE_SECONDS, _hash(token)),
+        )
+        stored = cursor.fetchone()
+        if not stored:
+            raise RefreshTokenError("Сессия не найдена")
+
+        if stored["used_at"] and not stored["revoked_at"] and stored["reuse_in_grace"]:
+            # Токен только что обменян параллельным запросом того же клиента
+            new_token = issue(cursor, stored["user_id"], stored["family_id"])
+            conn.commit()
+            cursor.close()
+            return stored["user_id"], new_token
+
+        if stored["used_at"] or stored["revoked_at"]:
+            cursor.execute(
+                """UPDATE refresh_tokens SET revoked_at = NOW()
+                   WHERE family_id = %s AND revoked_at IS NULL""",
+                (stored["family_id"],),
+            )
+            conn.commit()
+            raise RefreshTokenError("Сессия отозвана")
+
+        if stored["expires_at"] <= datetime.now():
+            raise RefreshTokenError("Сессия истекла")
+
+        cursor.execute(
+            "UPDATE refresh_tokens SET used_at = NOW() WHERE id = %s",
+            (stored["id"],),
+        )
+        new_token = issue(cursor, stored["user_id"], stored["family_id"])
+        conn.commit()
+        cursor.close()
+        return stored["user_id"], new_token
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def revoke(token: str) -> None:
+    """Отзывает семейство токена (выход из системы)"""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """UPDATE refresh_tokens r
+               JOIN refresh_tokens current ON current.family_id = r.family_id
+               SET r.revoked_at = NOW()
+               WHERE current.token_hash = %s AND r.revoked_at IS NULL""",
+            (_hash(token),),
+        )
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def _cookie_options() -> dict:
+    production = os.getenv("ENV") == "production"
+    return {
+        "httponly": True,
+        "secure": production,
+        "samesite": "none" if production else "lax",
+        "path": COOKIE_PATH,
+    }
+
+
+def set_cookie(response: Response, token: str) -> None:
+    response.set_cookie(
+        key=COOKIE_NAME,
+        value=token,
+        max_age=REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60,
+        **_cookie_options(),
+    )
+
+
+def delete_cookie(response: Response) -> None:
+    response.delete_cookie(key=COOKIE_NAME, **_cookie_options())
@@ -6,7 +6,15 @@
 
 Функционал:
 - Получение сообщений (комментариев) по конкретной сделке Bitrix24 (эндпоинт /get-activities)
-- Добавление нового сообщения (комментария) к сделке (эндпоинт /add-activity)
+  с поддержкой инкрементальной загрузки (since_id / since) и условных ответов (ETag / 304)
+- Добавление нового сообщения (комментария) к сделке (эндпоинт /add-activity):
+  сообщение сохраняется в таблице chat_messages и подтверждается сразу,
+  в Bitrix24 его отправляет фоновая синхронизация (deals.utils.chat_sync)
+- Ссылки на вложения ведут на прокси /files/{id} (подписаны для пользователя)
+- Ещё не отправленные сообщения добавляются в конец ветки /get-activities
+  (ID вида "local_<id>", поле SYNC_STATUS); у отправленных сообщений
+  активность Bitrix24 получает поле LOCAL_ID. since_id принимает только
+  числовые ID активностей Bitrix24, остальные значения игнорируются
 
 Каждое сообщение в чате — это комментарий, который сохраняется как активность типа "Комментарий" в Bitrix24, а также может содержать файлы.
 
@@ -15,22 +23,33 @@
 - requests
 - pydantic
 - utils.jwt_handler (get_token, decode_access_token)
-- config (BITRIX_DOMAIN, BITRIX_TOKEN)
+- utils.http_cache (conditional_json_response, make_etag)
+- utils.bitrix (bitrix_get)
+- deals.utils.chat_sync
 
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 from typing import Optional
 import requests
-from utils.jwt_handler import get_token, decode_access_token
-from config import BITRIX_DOMAIN, BITRIX_TOKEN
+import mysql.connector
+from src.utils.jwt_handler import get_token, decode_access_token
+from src.utils.http_cache import conditional_json_response, etag_matches, make_etag, not_modified
+from src.utils.bitrix import bitrix_get
+from src.utils.bitrix_files import get_file_metadata
+from src.files.utils.file_links import file_url as file_url_for
+from src.utils import executors
+from src.deals.utils import chat_sync
 
 router = APIRouter()
 
 
 class DealById(BaseModel):
     deal_id: str
+    # Курсор инкрементальной загрузки: вернуть только активности новее указанных
+    since_id: Optional[str] = None
+    since: Optional[str] = None
 
 
 class AddActivity(BaseModel):
@@ -41,34 +60,117 @@ class AddActivity(BaseModel):
     author_id: Optional[int] = None
 
 
+def _local_id(message: dict) -> str:
+    return f"local_{message['id']}"
+
+
+def _list_activities(params: dict) -> list[dict]:
+    response = bitrix_get("crm.activity.list", params=params)
+    response.raise_for_status()
+    return response.json().get("result", [])
+
+
+def _file_names(file_ids: list) -> dict:
+    """Имена вложений по данным disk.file.get; файлы с ошибкой пропускаются"""
+    names = {}
+    for file_id in file_ids:
+        try:
+            names[file_id] = get_file_metadata(file_id).get("NAME")
+        except requests.HTTPError:
+            pass
+    return names
+
+
+def _pending_activity(message: dict) -> dict:
+    """Неотправленное сообщение в формате активности Bitrix24"""
+    return {
+        "ID": _local_id(message),
+        "SUBJECT": message["subject"],
+        "DESCRIPTION": message["comment"],
+        "TEXT": message["comment"],
+        "CREATED": message["created_at"].isoformat(),
+        "AUTHOR_ID": message["author_id"],
+        "FILES": [
+            {"ID": f"temp_{hash(name)}", "NAME": name, "URL": ""}
+            for name in message["file_names"]
+        ],
+        "SYNC_STATUS": message["status"],
+    }
+
+
 @router.post("/get-activities")
-async def get_activities(deal_data: DealById, token: str = Depends(get_token)):
+async def get_activities(
+    deal_data: DealById, request: Request, token: str = Depends(get_token)
+):
+    """
+    Получение сообщений по сделке.
+    При указании since_id/since возвращаются только более новые активности,
+    а при совпадении If-None-Match — 304 без повторной обработки файлов.
+    """
     try:
-        decode_access_token(token)
+        current_user = decode_access_token(token)
         if not deal_data.deal_id:
             raise HTTPException(status_code=422, detail="deal_id не может быть пустым")
 
-        response = requests.get(
-            f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/crm.activity.list.json",
-            params={
-                "filter[OWNER_TYPE_ID]": 2,
-                "filter[OWNER_ID]": deal_data.deal_id,
-                "select[]": [
-                    "ID",
-                    "SUBJECT",
-                    "COMMUNICATIONS",
-                    "DESCRIPTION",
-                    "FILES",
-                    "CREATED",
-                    "AUTHOR_ID",
-                    "STORAGE_ELEMENT_IDS",
-                ],
-            },
+        params = {
+            "filter[OWNER_TYPE_ID]": 2,
+            "filter[OWNER_ID]": deal_data.deal_id,
+            "order[ID]": "ASC",
+            "select[]": [
+                "ID",
+                "SUBJECT",
+                "COMMUNICATIONS",
+                "DESCRIPTION",
+                "FILES",
+                "CREATED",
+                "AUTHOR_ID",
+                "STORAGE_ELEMENT_IDS",
+            ],
+        }
+        # Инкрементальная загрузка: только активности новее курсора.
+        # Курсор — ID активности Bitrix24; ID неотправленного сообщения
+        # ("local_<id>") курсором не является и игнорируется
+        since_id = deal_data.since_id if deal_data.since_id and deal_data.since_id.isdigit() else None
+        if since_id:
+            params["filter[>ID]"] = since_id
+        if deal_data.since:
+            params["filter[>CREATED]"] = deal_data.since
+
+        activities = await executors.run("bitrix", _list_activities, params)
+
+        # Локальные сообщения: неотправленные и соответствие отправленных активностям
+        local = await executors.run(
+            "db",
+            chat_sync.local_messages,
+            deal_data.deal_id,
+            [str(activity["ID"]) for activity in activities],
         )
-        response.raise_for_status()
-        activities = response.json().get("result", [])
 
+        # ETag считаем по сырому состоянию ветки до обогащения файлов,
+        # чтобы при отсутствии изменений не обращаться к disk.file.get
+        etag = make_etag(
+            {
+                "deal_id": deal_data.deal_id,
+                # Ссылки на вложения подписаны для пользователя
+                "user_id": current_user.get("user_id"),
+                "since_id": since_id,
+                "since": deal_data.since,
+                "activities": activities,
+                "local": [(message["id"], message["status"]) for message in local],
+            }
+        )
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        sent = {message["activity_id"]: message for message in local if message["status"] == "sent"}
+        file_names = await executors.run(
+            "bitrix",
+            _file_names,
+            [file["id"] for activity in activities for file in activity.get("FILES") or [] if file.get("id")],
+        )
         for activity in activities:
+            if str(activity["ID"]) in sent:
+                activity["LOCAL_ID"] = _local_id(sent[str(activity["ID"])])
             if activity.get("COMMUNICATIONS") and activity["COMMUNICATIONS"]:
                 activity["TEXT"] = activity["COMMUNICATIONS"][0].get("VALUE", "")
             else:
@@ -80,22 +182,19 @@ async def get_activities(deal_data: DealById, token: str = Depends(get_token)):
                     file_url = file.get("url", file.get("URL", ""))
                     file_id = file.get("id")
                     if file_id:
-                        try:
-                            file_response = requests.get(
-                                f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/disk.file.get.json",
-                                params={"id": file_id},
-                            )
-                            file_response.raise_for_status()
-                            file_data = file_response.json().get("result", {})
-                            file_name = file_data.get("NAME", file_name)
-                            file_url = file_data.get("DOWNLOAD_URL", file_url)
-                        except requests.HTTPError as e:
-                            pass
+                        file_name = file_names.get(file_id) or file_name
+                        # Скачивание через прокси /files (кэш на диске), а не напрямую из Bitrix24
+                        file_url = file_url_for(request.base_url, file_id, current_user.get("user_id"))
                     file["NAME"] = file_name
                     file["URL"] = file_url
                     if not file.get("ID"):
                         file["ID"] = f"temp_{hash(file_name)}"
-        return activities
+
+        # Неотправленные сообщения — в конце ветки, чтобы пользователь сразу видел своё сообщение
+        activities.extend(_pending_activity(message) for message in local if message["status"] != "sent")
+        return conditional_json_response(request, activities, etag=etag)
+    except HTTPException:
+        raise
     except requests.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Ошибка Bitrix API: {str(e)}")
     except Exception as e:
@@ -104,6 +203,10 @@ async def get_activities(deal_data: DealById, token: str = Depends(get_token)):
 
 @router.post("/add-activity")
 async def add_activity(activity_data: AddActivity, token: str = Depends(get_token)):
+    """
+    Добавление сообщения к сделке. Сообщение сохраняется локально и
+    подтверждается сразу; в Bitrix24 его отправляет фоновая синхронизация.
+    """
     try:
         decoded_token = decode_access_token(token)
         if not activity_data.deal_id:
@@ -113,58 +216,33 @@ async def add_activity(activity_data: AddActivity, token: str = Depends(get_toke
                 status_code=422, detail="Необходимо указать комментарий или файлы"
             )
 
-        files = []
-        if activity_data.files:
-            for file in activity_data.files:
-                files.append(
-                    {
-                        "fileData": [file["name"], file["base64"]],
-                        "fileName": file["name"],
-                    }
-                )
+        if any("name" not in file or "base64" not in file for file in activity_data.files or []):
+            raise HTTPException(status_code=422, detail="Файл должен содержать name и base64")
+        files = [
+            {"name": file["name"], "base64": file["base64"]}
+            for file in activity_data.files or []
+        ]
 
         comment = activity_data.comment or ""
         subject = activity_data.author_name or "Комментарий клиента"
         author_id = activity_data.author_id or decoded_token.get("contact_id", "")
 
-        response = requests.post(
-            f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/crm.activity.add.json",
-            json={
-                "fields": {
-                    "OWNER_TYPE_ID": 2,
-                    "OWNER_ID": activity_data.deal_id,
-                    "TYPE_ID": 4,
-                    "SUBJECT": subject,
-                    "COMMUNICATIONS": [{"VALUE": comment, "ENTITY_TYPE_ID": 2}],
-                    "FILES": files if files else None,
-                    "COMPLETED": "Y",
-                    "AUTHOR_ID": author_id,
-                }
-            },
+        message_id = await executors.run(
+            "db",
+            chat_sync.save_message,
+            activity_data.deal_id,
+            decoded_token.get("user_id"),
+            author_id,
+            subject,
+            comment,
+            files,
         )
-        response.raise_for_status()
-        activity_id = response.json().get("result")
-
-        if files:
-            file_updates = [
-                {
-                    "ID": str(index + 1),
-                    "NAME": f["fileData"][0],
-                    "fileName": f["fileData"][0],
-                }
-                for index, f in enumerate(files)
-            ]
-            update_response = requests.post(
-                f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/crm.activity.update.json",
-                json={
-                    "id": activity_id,
-                    "fields": {"FILES": file_updates},
-                },
-            )
-            update_response.raise_for_status()
+        chat_sync.submit(message_id)
 
-        return {"success": True}
-    except requests.HTTPError as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка Bitrix API: {str(e)}")
+        return {"success": True, "id": f"local_{message_id}", "status": "queued"}
+    except HTTPException:
+        raise
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка сервера: {str(e)}")
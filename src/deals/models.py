@@ -51,6 +51,40 @@ class AppealResponse(BaseModel):
     message: str
 
 
+class AppealAcceptedResponse(BaseModel):
+    """Ответ при приёме обращения в фоновую обработку"""
+
+    job_id: str
+    status: str
+    deal_id: Optional[str] = None
+    title: str
+    stage_name: str
+    message: str
+
+
+class AppealJobStatus(BaseModel):
+    """Состояние фоновой обработки обращения"""
+
+    job_id: str
+    status: Literal["queued", "running", "done", "failed"]
+    deal_id: Optional[str] = None
+    activity_id: Optional[str] = None
+    attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+
+class LastActivity(BaseModel):
+    """Последняя активность сделки (превью сообщения)"""
+
+    id: str
+    created_at: Optional[str] = None
+    author_id: Optional[str] = None
+    subject: Optional[str] = None
+    text: str = ""
+
+
 class DealStatus(BaseModel):
     """Статус сделки"""
 
@@ -60,4 +94,4 @@ class DealStatus(BaseModel):
     stage_name: str
     created_at: str
     opportunity: Optional[str] = "0"
-    last_activity: Optional[str] = None
+    last_activity: Optional[LastActivity] = None
@@ -0,0 +1,156 @@
+"""
+Модуль company_deals.py
+=======================
+
+Лента обращений всей компании для руководителя (эндпоинт /company).
+
+Сделки всех сотрудников запрашиваются одним вызовом crm.deal.list с фильтром
+по массиву contact_id сотрудников (фильтр передаётся в теле POST-запроса,
+поэтому размер компании не ограничен длиной URL). Сортировка и постраничный
+вывод выполняются на стороне Bitrix24, каждая сделка дополняется сотрудником,
+от имени которого она создана.
+"""
+
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Depends, Query
+import mysql.connector
+import requests
+from src.utils.jwt_handler import get_token, decode_access_token
+from src.utils.bitrix import bitrix_post
+from src.utils import executors
+from database import connect_to_db
+from ..utils.deals_utils import get_catalog, get_stages_map, get_last_activities
+
+router = APIRouter()
+
+# Поля сортировки, доступные клиенту
+SORT_FIELDS = {
+    "created_at": "DATE_CREATE",
+    "id": "ID",
+    "opportunity": "OPPORTUNITY",
+}
+
+
+def _company_employees(company_id: int) -> dict[str, dict]:
+    """Сотрудники компании с контактом Bitrix24: contact_id -> сотрудник"""
+    conn = connect_to_db(read_only=True)
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            """SELECT id, first_name, second_name, last_name, position, contact_id
+               FROM users
+               WHERE company_id = %s AND contact_id IS NOT NULL""",
+            (company_id,),
+        )
+        employees = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+    return {
+        str(employee["contact_id"]): {
+            "user_id": employee["id"],
+            "full_name": " ".join(
+                part for part in (
+                    employee["last_name"], employee["first_name"], employee["second_name"]
+                ) if part
+            ),
+            "position": employee["position"],
+        }
+        for employee in employees
+    }
+
+
+def _load_company_deals(
+    employees: dict[str, dict], closed: str, sort: str, order: str, start: int
+) -> dict:
+    deal_filter = {"CONTACT_ID": list(employees)}
+    if closed != "all":
+        deal_filter["CLOSED"] = closed
+
+    response = bitrix_post(
+        "crm.deal.list",
+        {
+            "filter": deal_filter,
+            "order": {SORT_FIELDS[sort]: order.upper(), "ID": order.upper()},
+            "select": [
+                "ID", "TITLE", "STAGE_ID", "OPPORTUNITY", "DATE_CREATE",
+                "CATEGORY_ID", "CONTACT_ID", "CLOSED",
+            ],
+            "start": start,
+        },
+    )
+    response.raise_for_status()
+    data = response.json()
+    deals = data.get("result", [])
+
+    categories = get_catalog()["categories"]
+    category_map = {str(category["id"]): category["name"] for category in categories}
+
+    last_activities = get_last_activities([deal["ID"] for deal in deals])
+
+    result = []
+    for deal in deals:
+        category_id = deal.get("CATEGORY_ID", "0")
+        stages_map = get_stages_map(category_id)
+        result.append({
+            "id": deal["ID"],
+            "title": deal["TITLE"],
+            "category_id": category_id,
+            "category_name": category_map.get(category_id, "Неизвестная воронка"),
+            "stage_id": deal["STAGE_ID"],
+            "stage_name": stages_map.get(deal["STAGE_ID"], deal["STAGE_ID"]),
+            "opportunity": deal.get("OPPORTUNITY", "0"),
+            "closed": deal.get("CLOSED") == "Y",
+            "created_at": deal["DATE_CREATE"],
+            "employee": employees.get(str(deal.get("CONTACT_ID"))),
+            "last_activity": last_activities.get(str(deal["ID"])),
+        })
+
+    return {
+        "deals": result,
+        "total": data.get("total", len(result)),
+        "next_start": data.get("next"),
+    }
+
+
+@router.get("/company")
+async def get_company_deals(
+    closed: Literal["N", "Y", "all"] = Query("N", description="N — открытые, Y — закрытые, all — все"),
+    sort: Literal["created_at", "id", "opportunity"] = Query("created_at"),
+    order: Literal["asc", "desc"] = Query("desc"),
+    start: int = Query(0, ge=0, description="Смещение страницы (next_start предыдущей страницы)"),
+    token: str = Depends(get_token),
+):
+    """Сделки всех сотрудников компании. Доступно только для руководителей"""
+    try:
+        current_user = decode_access_token(token)
+
+        if current_user.get("role") != "Руководитель":
+            raise HTTPException(
+                status_code=403,
+                detail="Только руководитель может просматривать обращения компании"
+            )
+
+        company_id = current_user.get("company_id")
+        if not company_id:
+            raise HTTPException(
+                status_code=404,
+                detail="У вас нет привязанной компании"
+            )
+
+        employees = await executors.run("db", _company_employees, company_id)
+        if not employees:
+            return {"deals": [], "total": 0, "next_start": None}
+
+        return await executors.run(
+            "bitrix", _load_company_deals, employees, closed, sort, order, start
+        )
+
+    except HTTPException:
+        raise
+    except requests.RequestException:
+        raise HTTPException(status_code=500, detail="Bitrix24 request error")
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
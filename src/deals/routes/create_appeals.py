@@ -1,14 +1,72 @@
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+import time
+from fastapi import APIRouter, HTTPException, Depends, Query
 from datetime import datetime
 from typing import List
-from ..models import CreateAppealData, AppealResponse, DealStatus
-from ..utils.deals_utils import get_stages_map, get_status_style, get_deals, get_deal_categories
+from ..models import (
+    CreateAppealData,
+    AppealResponse,
+    AppealAcceptedResponse,
+    AppealJobStatus,
+    DealStatus,
+)
+from ..utils.deals_utils import get_stages_map, get_status_style, get_deals, get_catalog
+from ..utils import appeal_worker
+from src.utils import executors
 from src.utils.jwt_handler import get_token, decode_access_token
+from src.utils.jobs import create_job, get_job
+from src.health.utils.probes import state as health_state
+import mysql.connector
 import requests
-from config import BITRIX_DOMAIN, BITRIX_TOKEN
 
 router = APIRouter()
 
+# Интервал опроса статуса задачи при ожидании (секунды)
+_JOB_POLL_INTERVAL = 0.5
+
+
+def _prepare_appeal(appeal_data: CreateAppealData, user_data: dict) -> tuple[dict, str]:
+    """Проверяет категорию и возвращает payload задачи обращения и название начальной стадии"""
+    contact_id = user_data.get("contact_id")
+    if not contact_id:
+        raise HTTPException(status_code=400, detail="Отсутствует contact_id")
+
+    # Проверяем валидность category_id
+    categories = get_catalog()["categories"]
+    category_ids = [str(category["id"]) for category in categories]
+    if appeal_data.category_id not in category_ids:
+        raise HTTPException(status_code=400, detail="Неверный ID категории")
+
+    # Получаем первую доступную стадию для выбранной категории
+    stages_map = get_stages_map(appeal_data.category_id)
+    if not stages_map:
+        raise HTTPException(status_code=400, detail="Нет доступных стадий для выбранной категории")
+
+    # Берем первую стадию как начальную
+    first_stage_id = list(stages_map.keys())[0]
+
+    payload = {
+        "contact_id": contact_id,
+        "category_id": appeal_data.category_id,
+        "stage_id": first_stage_id,
+        "title": appeal_data.title,
+        "comment": appeal_data.comment,
+        "files": [{"name": file.name, "base64": file.base64} for file in appeal_data.files or []],
+        "deal_id": None,
+    }
+    return payload, stages_map[first_stage_id]
+
+
+def _enqueue(user_data: dict, payload: dict) -> str:
+    job_id = create_job(
+        appeal_worker.JOB_KIND,
+        user_data.get("user_id"),
+        user_data.get("company_id"),
+        payload,
+    )
+    appeal_worker.submit(job_id)
+    return job_id
+
 # ---------- Создание обращения ----------
 
 @router.post("/create", response_model=AppealResponse)
@@ -16,73 +74,110 @@ async def create_appeal(appeal_data: CreateAppealData, token: str = Depends(get_
     """Создание нового обращения с динамическим типом и стадией"""
     try:
         user_data = decode_access_token(token)
-        contact_id = user_data.get("contact_id")
-        if not contact_id:
-            raise HTTPException(status_code=400, detail="Отсутствует contact_id")
-
-        # Проверяем валидность category_id
-        categories = get_deal_categories()
-        category_ids = [str(category["id"]) for category in categories]
-        if appeal_data.category_id not in category_ids:
-            raise HTTPException(status_code=400, detail="Неверный ID категории")
-
-        # Получаем первую доступную стадию для выбранной категории
-        stages_map = get_stages_map(appeal_data.category_id)
-        if not stages_map:
-            raise HTTPException(status_code=400, detail="Нет доступных стадий для выбранной категории")
-        
-        # Берем первую стадию как начальную
-        first_stage_id = list(stages_map.keys())[0]
+        payload, stage_name = await executors.run("bitrix", _prepare_appeal, appeal_data, user_data)
 
         # Создаем сделку
-        deal_fields = {
-            "TITLE": appeal_data.title,
-            "CONTACT_ID": contact_id,
-            "STAGE_ID": first_stage_id,
-            "CATEGORY_ID": appeal_data.category_id,
-            "COMMENTS": appeal_data.comment,
-            "OPPORTUNITY": "0",
-            "CURRENCY_ID": "RUB",
-            "OPENED": "Y",
-        }
-
-        response = requests.post(
-            f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/crm.deal.add.json",
-            json={"fields": deal_fields},
-        )
-        response.raise_for_status()
-        deal_id = str(response.json().get("result"))
-        if not deal_id:
+        try:
+            payload["deal_id"] = await executors.run("bitrix", appeal_worker.create_deal, payload)
+        except appeal_worker.BitrixResultError:
             raise HTTPException(status_code=500, detail="Ошибка создания сделки")
 
-        # Добавляем активность
-        activity_fields = {
-            "OWNER_TYPE_ID": 2,
-            "OWNER_ID": deal_id,
-            "TYPE_ID": 4,
-            "SUBJECT": "Создано обращение",
-            "DESCRIPTION": appeal_data.comment,
-            "COMPLETED": "Y",
-            "AUTHOR_ID": contact_id,
-        }
-
-        if appeal_data.files:
-            activity_fields["FILES"] = [
-                {"fileData": [file.name, file.base64]} for file in appeal_data.files
-            ]
-
-        requests.post(
-            f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/crm.activity.add.json",
-            json={"fields": activity_fields},
-        )
+        # Добавляем активность; если Bitrix24 её не принял, сделка уже создана —
+        # активность с вложениями добавит фоновый обработчик
+        message = "Обращение успешно создано"
+        try:
+            await executors.run("bitrix", appeal_worker.add_activity, payload)
+        except (requests.RequestException, appeal_worker.BitrixResultError):
+            await executors.run("db", _enqueue, user_data, payload)
+            message = "Обращение создано, вложения будут добавлены в ближайшее время"
 
         return AppealResponse(
-            deal_id=deal_id,
-            title=deal_fields["TITLE"],
-            stage_name=stages_map[first_stage_id],
+            deal_id=payload["deal_id"],
+            title=payload["title"],
+            stage_name=stage_name,
             created_at=datetime.now(),
-            message="Обращение успешно создано",
+            message=message,
         )
 
     except requests.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка Bitrix24: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Ошибка Bitrix24: {str(e)}")
+
+
+@router.post("/appeals", response_model=AppealAcceptedResponse, status_code=202)
+async def submit_appeal(appeal_data: CreateAppealData, token: str = Depends(get_token)):
+    """
+    Приём обращения в фоновую обработку.
+    Сделка создаётся сразу (если Bitrix24 доступен), вложения и активность
+    добавляются в фоне; статус — по /appeals/{job_id}.
+    """
+    try:
+        user_data = decode_access_token(token)
+        payload, stage_name = await executors.run("bitrix", _prepare_appeal, appeal_data, user_data)
+
+        # При деградации Bitrix24 не ждём его ответа: сделку создаст обработчик
+        if health_state["dependencies"]["bitrix"]["ok"]:
+            try:
+                payload["deal_id"] = await executors.run("bitrix", appeal_worker.create_deal, payload)
+            except (requests.RequestException, appeal_worker.BitrixResultError):
+                payload["deal_id"] = None
+
+        job_id = await executors.run("db", _enqueue, user_data, payload)
+
+        return AppealAcceptedResponse(
+            job_id=job_id,
+            status="queued",
+            deal_id=payload["deal_id"],
+            title=payload["title"],
+            stage_name=stage_name,
+            message="Обращение принято в обработку",
+        )
+
+    except HTTPException:
+        raise
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Непредвиденная ошибка: {str(e)}")
+
+
+@router.get("/appeals/{job_id}", response_model=AppealJobStatus)
+async def get_appeal_status(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=10, description="Ожидать завершения задачи до N секунд"),
+    token: str = Depends(get_token),
+):
+    """Статус фоновой обработки обращения (с необязательным ожиданием завершения)"""
+    try:
+        user_data = decode_access_token(token)
+        wait_until = time.monotonic() + wait
+
+        while True:
+            job = await executors.run("db", get_job, job_id)
+            if (
+                not job
+                or job["kind"] != appeal_worker.JOB_KIND
+                or job["user_id"] != user_data.get("user_id")
+            ):
+                raise HTTPException(status_code=404, detail="Обращение не найдено")
+            if job["status"] in ("done", "failed") or time.monotonic() >= wait_until:
+                break
+            await asyncio.sleep(_JOB_POLL_INTERVAL)
+
+        result = job["result"] or {}
+        return AppealJobStatus(
+            job_id=job["id"],
+            status=job["status"],
+            deal_id=result.get("deal_id"),
+            activity_id=result.get("activity_id"),
+            attempts=job["attempts"],
+            error=job["error"],
+            created_at=job["created_at"],
+            updated_at=job["updated_at"],
+        )
+
+    except HTTPException:
+        raise
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Непредвиденная ошибка: {str(e)}")
@@ -0,0 +1,206 @@
+"""
+Модуль appeal_worker.py
+=======================
+
+Фоновая обработка обращений (задачи вида "appeal" в таблице jobs).
+
+Задача хранит в payload всё, что нужно для создания обращения в Bitrix24:
+контакт, воронку, стадию, текст и вложения. Обработчик:
+- создаёт сделку, если она ещё не создана (Bitrix24 был недоступен при приёме);
+- добавляет активность с вложениями и проверяет ответ Bitrix24;
+- при ошибке возвращает задачу в очередь с экспоненциальной задержкой,
+  после APPEAL_MAX_ATTEMPTS попыток помечает её как failed.
+
+Созданные deal_id и activity_id сохраняются в payload сразу после вызова
+Bitrix24, поэтому повторная попытка пропускает выполненные шаги. Активность
+помечается ORIGIN_ID сделки: если ответ Bitrix24 или сохранение ID потеряны,
+повторная попытка находит уже созданную активность и не добавляет вторую.
+
+При старте процесса незавершённые задачи (в том числе брошенные завершившимся
+процессом) забираются повторно; раз в SWEEP_INTERVAL_SECONDS фоновый поток
+подбирает задачи, застрявшие в running или queued (например, после ошибки
+БД при смене статуса).
+"""
+
+import queue
+import threading
+import requests
+from config import APPEAL_MAX_ATTEMPTS, APPEAL_WORKER_THREADS
+from src.utils.bitrix import bitrix_get, bitrix_post
+from src.utils.jobs import claim_job, list_unfinished_jobs, update_job, update_job_payload
+from .deals_utils import invalidate_last_activity
+
+JOB_KIND = "appeal"
+# Задача в running без обновлений дольше этого времени считается брошенной
+STALE_JOB_SECONDS = 600
+# Максимальная задержка перед повторной попыткой (секунды)
+MAX_RETRY_DELAY_SECONDS = 300
+# Интервал поиска застрявших задач (секунды)
+SWEEP_INTERVAL_SECONDS = 60
+
+_queue: queue.Queue = queue.Queue()
+_threads: list[threading.Thread] = []
+_stop = threading.Event()
+
+
+class BitrixResultError(Exception):
+    """Bitrix24 ответил ошибкой или пустым результатом"""
+
+
+def bitrix_result(response: requests.Response):
+    response.raise_for_status()
+    data = response.json()
+    if data.get("error") or not data.get("result"):
+        raise BitrixResultError(
+            data.get("error_description") or data.get("error") or "Пустой ответ Bitrix24"
+        )
+    return data["result"]
+
+
+def create_deal(payload: dict) -> str:
+    """Создаёт сделку обращения и возвращает её ID"""
+    fields = {
+        "TITLE": payload["title"],
+        "CONTACT_ID": payload["contact_id"],
+        "STAGE_ID": payload["stage_id"],
+        "CATEGORY_ID": payload["category_id"],
+        "COMMENTS": payload["comment"],
+        "OPPORTUNITY": "0",
+        "CURRENCY_ID": "RUB",
+        "OPENED": "Y",
+    }
+    return str(bitrix_result(bitrix_post("crm.deal.add", {"fields": fields})))
+
+
+def find_activity(deal_id: str, origin_id: str) -> str | None:
+    """ID активности сделки с заданным ORIGIN_ID (метка повторной попытки) или None"""
+    response = bitrix_get(
+        "crm.activity.list",
+        params={
+            "filter[OWNER_TYPE_ID]": 2,
+            "filter[OWNER_ID]": deal_id,
+            "filter[ORIGIN_ID]": origin_id,
+            "select[]": ["ID"],
+        },
+    )
+    response.raise_for_status()
+    activities = response.json().get("result") or []
+    return str(activities[0]["ID"]) if activities else None
+
+
+def _origin_id(payload: dict) -> str:
+    return f"bip-appeal-{payload['deal_id']}"
+
+
+def add_activity(payload: dict) -> str:
+    """Добавляет к сделке активность с вложениями и возвращает её ID"""
+    fields = {
+        "OWNER_TYPE_ID": 2,
+        "OWNER_ID": payload["deal_id"],
+        "TYPE_ID": 4,
+        "SUBJECT": "Создано обращение",
+        "DESCRIPTION": payload["comment"],
+        "COMPLETED": "Y",
+        "AUTHOR_ID": payload["contact_id"],
+        "ORIGIN_ID": _origin_id(payload),
+    }
+    if payload.get("files"):
+        fields["FILES"] = [
+            {"fileData": [file["name"], file["base64"]]} for file in payload["files"]
+        ]
+    activity_id = str(bitrix_result(bitrix_post("crm.activity.add", {"fields": fields})))
+    invalidate_last_activity(payload["deal_id"])
+    return activity_id
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(MAX_RETRY_DELAY_SECONDS, 2 ** attempts)
+
+
+def _schedule(job_id: str, delay: float) -> None:
+    timer = threading.Timer(delay, _queue.put, (job_id,))
+    timer.daemon = True
+    timer.start()
+
+
+def process(job_id: str) -> None:
+    """Одна попытка обработки задачи обращения"""
+    job = claim_job(job_id, STALE_JOB_SECONDS)
+    if not job:
+        # Задачу уже обрабатывает другой процесс
+        return
+    payload = job["payload"]
+    try:
+        if not payload.get("deal_id"):
+            payload["deal_id"] = create_deal(payload)
+            update_job_payload(job_id, payload)
+        if not payload.get("activity_id"):
+            # Предыдущая попытка могла создать активность, но не сохранить её ID
+            activity_id = find_activity(payload["deal_id"], _origin_id(payload)) if job["attempts"] > 1 else None
+            payload["activity_id"] = activity_id or add_activity(payload)
+            update_job_payload(job_id, payload)
+        update_job(job_id, "done", result={"deal_id": payload["deal_id"], "activity_id": payload["activity_id"]})
+    except Exception as e:
+        result = {"deal_id": payload.get("deal_id"), "activity_id": payload.get("activity_id")}
+        if job["attempts"] >= APPEAL_MAX_ATTEMPTS:
+            update_job(job_id, "failed", result=result, error=str(e))
+        else:
+            update_job(job_id, "queued", result=result, error=str(e))
+            _schedule(job_id, _retry_delay(job["attempts"]))
+
+
+def _run() -> None:
+    while True:
+        job_id = _queue.get()
+        if job_id is None:
+            break
+        try:
+            process(job_id)
+        except Exception:
+            # Ошибка БД при смене статуса: задача останется незавершённой
+            # и будет подобрана _sweep
+            pass
+
+
+def _sweep() -> None:
+    # Задача в queued ждёт повторной попытки не дольше MAX_RETRY_DELAY_SECONDS
+    queued_after = STALE_JOB_SECONDS + MAX_RETRY_DELAY_SECONDS
+    while not _stop.wait(SWEEP_INTERVAL_SECONDS):
+        try:
+            for job_id in list_unfinished_jobs(JOB_KIND, STALE_JOB_SECONDS, queued_after):
+                submit(job_id)
+        except Exception:
+            # БД недоступна — повторим на следующем проходе
+            pass
+
+
+def submit(job_id: str) -> None:
+    """Ставит задачу в очередь обработчика текущего процесса"""
+    _queue.put(job_id)
+
+
+def start() -> None:
+    """Запускает обработчики и возвращает в очередь незавершённые задачи"""
+    if _threads:
+        return
+    _stop.clear()
+    for index in range(APPEAL_WORKER_THREADS):
+        thread = threading.Thread(target=_run, name=f"appeal-worker-{index}", daemon=True)
+        thread.start()
+        _threads.append(thread)
+    sweeper = threading.Thread(target=_sweep, name="appeal-worker-sweep", daemon=True)
+    sweeper.start()
+    _threads.append(sweeper)
+    try:
+        for job_id in list_unfinished_jobs(JOB_KIND, STALE_JOB_SECONDS):
+            submit(job_id)
+    except Exception:
+        # БД недоступна при старте — задачи подберёт следующий перезапуск
+        pass
+
+
+def stop() -> None:
+    _stop.set()
+    for _ in range(APPEAL_WORKER_THREADS):
+        _queue.put(None)
+    _threads.clear()
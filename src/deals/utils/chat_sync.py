@@ -0,0 +1,316 @@
+"""
+Модуль chat_sync.py
+===================
+
+Отложенная отправка сообщений чата по сделке в Bitrix24 (таблица
+chat_messages, migrations/009).
+
+/add-activity сохраняет сообщение локально (save_message) и сразу отвечает
+клиенту. Обработчик создаёт активность в Bitrix24, прикрепляет вложения
+и сохраняет ID активности (activity_id), после чего вложения удаляются
+из таблицы. При ошибке сообщение возвращается в очередь с экспоненциальной
+задержкой, после CHAT_SYNC_MAX_ATTEMPTS попыток помечается как failed.
+
+ID активности сохраняется сразу после её создания, поэтому повторная попытка
+не создаёт дубль в Bitrix24. Активность помечается ORIGIN_ID с локальным ID
+сообщения: если ответ Bitrix24 или сохранение ID потеряны, повторная попытка
+находит уже созданную активность по этой метке. При старте процесса неотправленные сообщения
+(в том числе брошенные завершившимся процессом) забираются повторно.
+Раз в SWEEP_INTERVAL_SECONDS фоновый поток подбирает сообщения, застрявшие
+в sending или queued (например, после ошибки БД при смене статуса).
+
+Сообщения, так и не отправленные (failed), показываются в чате
+CHAT_FAILED_RETENTION_DAYS дней с последней попытки.
+"""
+
+import json
+import queue
+import threading
+from config import CHAT_FAILED_RETENTION_DAYS, CHAT_SYNC_MAX_ATTEMPTS, CHAT_SYNC_THREADS
+from database import connect_to_db
+from src.utils.bitrix import bitrix_post
+from .appeal_worker import bitrix_result, find_activity
+from .deals_utils import invalidate_last_activity
+
+# Сообщение в sending без обновлений дольше этого времени считается брошенным
+STALE_MESSAGE_SECONDS = 300
+# Максимальная задержка перед повторной попыткой (секунды)
+MAX_RETRY_DELAY_SECONDS = 300
+# Интервал поиска застрявших сообщений (секунды)
+SWEEP_INTERVAL_SECONDS = 60
+
+_queue: queue.Queue = queue.Queue()
+_threads: list[threading.Thread] = []
+_stop = threading.Event()
+
+
+def save_message(
+    deal_id: str,
+    user_id: int | None,
+    author_id,
+    subject: str,
+    comment: str,
+    files: list[dict],
+) -> int:
+    """Сохраняет сообщение в очередь отправки и возвращает его локальный ID"""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT INTO chat_messages
+                   (deal_id, user_id, author_id, subject, comment, files, file_names)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            (
+                deal_id,
+                user_id,
+                str(author_id) if author_id else None,
+                subject,
+                comment,
+                json.dumps(files, ensure_ascii=False) if files else None,
+                json.dumps([file["name"] for file in files], ensure_ascii=False) if files else None,
+            ),
+        )
+        message_id = cursor.lastrowid
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return message_id
+
+
+def local_messages(deal_id: str, activity_ids: list[str]) -> list[dict]:
+    """
+    Локальные сообщения сделки: ещё не отправленные (queued, sending),
+    failed за последние CHAT_FAILED_RETENTION_DAYS дней и отправленные,
+    активности которых есть в activity_ids
+    """
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        query = """SELECT id, author_id, subject, comment, file_names, status,
+                          activity_id, created_at
+                   FROM chat_messages
+                   WHERE deal_id = %s
+                     AND (status IN ('queued', 'sending')
+                          OR (status = 'failed' AND updated_at >= NOW() - INTERVAL %s DAY)"""
+        params = [deal_id, CHAT_FAILED_RETENTION_DAYS]
+        if activity_ids:
+            query += f" OR activity_id IN ({', '.join(['%s'] * len(activity_ids))})"
+            params.extend(activity_ids)
+        cursor.execute(query + ") ORDER BY id", params)
+        messages = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+    for message in messages:
+        message["file_names"] = json.loads(message["file_names"]) if message["file_names"] else []
+    return messages
+
+
+def _claim(message_id: int) -> dict | None:
+    """Атомарно переводит сообщение в sending и возвращает его"""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            """UPDATE chat_messages
+               SET status = 'sending', attempts = attempts + 1
+               WHERE id = %s
+                 AND (status = 'queued'
+                      OR (status = 'sending' AND updated_at < NOW() - INTERVAL %s SECOND))""",
+            (message_id, STALE_MESSAGE_SECONDS),
+        )
+        claimed = cursor.rowcount == 1
+        conn.commit()
+        message = None
+        if claimed:
+            cursor.execute(
+                """SELECT id, deal_id, author_id, subject, comment, files, activity_id, attempts
+                   FROM chat_messages WHERE id = %s""",
+                (message_id,),
+            )
+            message = cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+    if message:
+        message["files"] = json.loads(message["files"]) if message["files"] else []
+    return message
+
+
+def _update(message_id: int, status: str, error: str | None = None, **fields) -> None:
+    assignments = ["status = %s", "error = %s"] + [f"{name} = %s" for name in fields]
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE chat_messages SET {', '.join(assignments)} WHERE id = %s",
+            (status, error, *fields.values(), message_id),
+        )
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def _save_activity_id(message_id: int, activity_id: str) -> None:
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE chat_messages SET activity_id = %s WHERE id = %s",
+            (activity_id, message_id),
+        )
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def _origin_id(message: dict) -> str:
+    return f"bip-chat-{message['id']}"
+
+
+def _add_activity(message: dict) -> str:
+    files = [
+        {"fileData": [file["name"], file["base64"]], "fileName": file["name"]}
+        for file in message["files"]
+    ]
+    fields = {
+        "OWNER_TYPE_ID": 2,
+        "OWNER_ID": message["deal_id"],
+        "TYPE_ID": 4,
+        "SUBJECT": message["subject"],
+        "COMMUNICATIONS": [{"VALUE": message["comment"], "ENTITY_TYPE_ID": 2}],
+        "FILES": files if files else None,
+        "COMPLETED": "Y",
+        "AUTHOR_ID": message["author_id"] or "",
+        "ORIGIN_ID": _origin_id(message),
+    }
+    return str(bitrix_result(bitrix_post("crm.activity.add", {"fields": fields})))
+
+
+def _name_files(activity_id: str, files: list[dict]) -> None:
+    """Проставляет исходные имена вложениям созданной активности"""
+    file_updates = [
+        {"ID": str(index + 1), "NAME": file["name"], "fileName": file["name"]}
+        for index, file in enumerate(files)
+    ]
+    bitrix_result(bitrix_post("crm.activity.update", {"id": activity_id, "fields": {"FILES": file_updates}}))
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(MAX_RETRY_DELAY_SECONDS, 2 ** attempts)
+
+
+def _schedule(message_id: int, delay: float) -> None:
+    timer = threading.Timer(delay, _queue.put, (message_id,))
+    timer.daemon = True
+    timer.start()
+
+
+def process(message_id: int) -> None:
+    """Одна попытка отправки сообщения в Bitrix24"""
+    message = _claim(message_id)
+    if not message:
+        # Сообщение уже отправляет другой процесс
+        return
+    try:
+        activity_id = message["activity_id"]
+        if not activity_id and message["attempts"] > 1:
+            # Предыдущая попытка могла создать активность, но не сохранить её ID
+            activity_id = find_activity(message["deal_id"], _origin_id(message))
+            if activity_id:
+                _save_activity_id(message_id, activity_id)
+        if not activity_id:
+            activity_id = _add_activity(message)
+            _save_activity_id(message_id, activity_id)
+        if message["files"]:
+            _name_files(activity_id, message["files"])
+        _update(message_id, "sent", files=None)
+        invalidate_last_activity(message["deal_id"])
+    except Exception as e:
+        if message["attempts"] >= CHAT_SYNC_MAX_ATTEMPTS:
+            _update(message_id, "failed", error=str(e))
+        else:
+            _update(message_id, "queued", error=str(e))
+            _schedule(message_id, _retry_delay(message["attempts"]))
+
+
+def _list_unsent(queued_after_seconds: int = 0) -> list[int]:
+    """
+    Неотправленные сообщения: брошенные в sending и в queued без обновлений
+    дольше queued_after_seconds (0 — все сообщения в очереди)
+    """
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT id FROM chat_messages
+               WHERE (status = 'queued' AND updated_at <= NOW() - INTERVAL %s SECOND)
+                  OR (status = 'sending' AND updated_at < NOW() - INTERVAL %s SECOND)
+               ORDER BY id""",
+            (queued_after_seconds, STALE_MESSAGE_SECONDS),
+        )
+        message_ids = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+    finally:
+        conn.close()
+    return message_ids
+
+
+def _run() -> None:
+    while True:
+        message_id = _queue.get()
+        if message_id is None:
+            break
+        try:
+            process(message_id)
+        except Exception:
+            # Ошибка БД при смене статуса: сообщение останется неотправленным
+            # и будет подобрано _sweep
+            pass
+
+
+def _sweep() -> None:
+    # Сообщение в queued ждёт повторной попытки не дольше MAX_RETRY_DELAY_SECONDS
+    queued_after = STALE_MESSAGE_SECONDS + MAX_RETRY_DELAY_SECONDS
+    while not _stop.wait(SWEEP_INTERVAL_SECONDS):
+        try:
+            for message_id in _list_unsent(queued_after):
+                submit(message_id)
+        except Exception:
+            # БД недоступна — повторим на следующем проходе
+            pass
+
+
+def submit(message_id: int) -> None:
+    """Ставит сообщение в очередь отправки текущего процесса"""
+    _queue.put(message_id)
+
+
+def start() -> None:
+    """Запускает обработчики и возвращает в очередь неотправленные сообщения"""
+    if _threads:
+        return
+    _stop.clear()
+    for index in range(CHAT_SYNC_THREADS):
+        thread = threading.Thread(target=_run, name=f"chat-sync-{index}", daemon=True)
+        thread.start()
+        _threads.append(thread)
+    sweeper = threading.Thread(target=_sweep, name="chat-sync-sweep", daemon=True)
+    sweeper.start()
+    _threads.append(sweeper)
+    try:
+        for message_id in _list_unsent():
+            submit(message_id)
+    except Exception:
+        # БД недоступна при старте — сообщения подберёт следующий перезапуск
+        pass
+
+
+def stop() -> None:
+    _stop.set()
+    for _ in range(CHAT_SYNC_THREADS):
+        _queue.put(None)
+    _threads.clear()
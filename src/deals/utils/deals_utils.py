@@ -1,14 +1,19 @@
+import threading
+import time
 import requests
-from config import BITRIX_DOMAIN, BITRIX_TOKEN
+from config import DEALS_CATALOG_TTL_SECONDS, DEAL_LAST_ACTIVITY_TTL_SECONDS
+from src.utils.bitrix import bitrix_get, bitrix_batch
+from src.utils import shared_cache
+from src.utils.http_cache import make_etag, serialize_json
 from typing import List, Dict
 
 # ---------- Работа с категориями и стадиями ----------
 
 def get_deal_categories() -> List[Dict]:
     """Получает все категории (воронки) сделок из Bitrix24 через crm.category.list"""
-    url = f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/crm.category.list.json"
+    method = "crm.category.list"
     params = {"entityTypeId": 2}
-    response = requests.get(url, params=params)
+    response = bitrix_get(method, params)
     response.raise_for_status()
     return response.json().get("result", {}).get("categories", [])
 
@@ -26,18 +31,87 @@ def get_pipelines() -> Dict:
 
 def get_stages_for_category(category_id: str) -> Dict:
     """Получает стадии для конкретной категории"""
-    url = f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/crm.status.list.json"
+    method = "crm.status.list"
     params = {"filter[ENTITY_ID]": f"DEAL_STAGE_{category_id}"}
-    response = requests.get(url, params=params)
+    response = bitrix_get(method, params)
     response.raise_for_status()
     stages = {}
     for stage in response.json().get("result", []):
         stages[stage["STATUS_ID"]] = {"NAME": stage["NAME"]}
     return stages
 
+# ---------- Кэш справочника воронок и стадий ----------
+
+# Справочник хранится в общем кэше процессов: из Bitrix24 его загружает один
+# рабочий процесс, остальные читают готовую версию
+CATALOG_CACHE_KEY = "deals:catalog"
+# Как часто процесс сверяет локальную копию с версией в общем кэше (секунды)
+_CATALOG_CHECK_INTERVAL = 1.0
+
+_catalog: Dict = {}
+_catalog_lock = threading.Lock()
+
+
+def _load_catalog_source() -> Dict:
+    """Загружает воронки и стадии из Bitrix24"""
+    categories = get_deal_categories()
+    pipelines = {}
+    funnels = []
+    for category in categories:
+        category_id = str(category["id"])
+        stages = get_stages_for_category(category_id)
+        pipelines[category_id] = {"NAME": category["name"], "STAGES": stages}
+        funnels.append({
+            "id": category_id,
+            "name": category["name"],
+            "stages": [
+                {"id": stage_id, "name": stage_data.get("NAME", "Неизвестно")}
+                for stage_id, stage_data in stages.items()
+            ],
+        })
+    return {"categories": categories, "pipelines": pipelines, "funnels": funnels}
+
+
+def get_catalog() -> Dict:
+    """
+    Возвращает закэшированный справочник воронок и стадий.
+
+    Содержит categories, pipelines (как get_pipelines), готовое тело ответа
+    /stages (body) и его ETag. Обновляется не чаще раза в DEALS_CATALOG_TTL_SECONDS
+    на весь хост; при недоступности Bitrix24 отдаётся предыдущая версия.
+    """
+    catalog = _catalog.get("current")
+    if catalog and catalog["checked_at"] + _CATALOG_CHECK_INTERVAL > time.monotonic():
+        return catalog
+    with _catalog_lock:
+        entry = shared_cache.get_or_refresh(
+            CATALOG_CACHE_KEY,
+            DEALS_CATALOG_TTL_SECONDS,
+            lambda: serialize_json(_load_catalog_source()),
+        )
+        version = (entry.version, entry.expires_at)
+        catalog = _catalog.get("current")
+        if catalog and catalog["version"] == version:
+            catalog["checked_at"] = time.monotonic()
+            return catalog
+        data = entry.json()
+        # Тело /stages сериализуется детерминированно, поэтому ETag совпадает во всех процессах
+        body = serialize_json(data["funnels"])
+        catalog = {
+            "categories": data["categories"],
+            "pipelines": data["pipelines"],
+            "body": body,
+            "etag": make_etag(body),
+            "version": version,
+            "checked_at": time.monotonic(),
+        }
+        _catalog["current"] = catalog
+        return catalog
+
+
 def get_stages_map(pipeline_id: str) -> Dict[str, str]:
     """Возвращает словарь stage_id -> stage_name для конкретного пайплайна"""
-    pipelines = get_pipelines()
+    pipelines = get_catalog()["pipelines"]
     stages_map = {}
     pipeline = pipelines.get(pipeline_id)
     if not pipeline:
@@ -46,6 +120,81 @@ def get_stages_map(pipeline_id: str) -> Dict[str, str]:
         stages_map[stage_id] = stage_data.get("NAME", "Неизвестно")
     return stages_map
 
+# ---------- Последняя активность сделок ----------
+
+# Длина текста активности в превью
+_ACTIVITY_PREVIEW_LENGTH = 200
+
+
+def _last_activity_key(deal_id) -> str:
+    return f"deal.last_activity:{deal_id}"
+
+
+def _activity_preview(activity: Dict) -> Dict:
+    """Превью активности: время, автор и начало текста (как в ленте чата)"""
+    communications = activity.get("COMMUNICATIONS") or []
+    text = communications[0].get("VALUE", "") if communications else activity.get("DESCRIPTION", "")
+    text = (text or "").strip()
+    if len(text) > _ACTIVITY_PREVIEW_LENGTH:
+        text = text[:_ACTIVITY_PREVIEW_LENGTH].rstrip() + "…"
+    return {
+        "id": activity["ID"],
+        "created_at": activity.get("CREATED"),
+        "author_id": activity.get("AUTHOR_ID"),
+        "subject": activity.get("SUBJECT"),
+        "text": text,
+    }
+
+
+def get_last_activities(deal_ids: List[str]) -> Dict[str, Dict | None]:
+    """
+    Последняя активность каждой сделки страницы.
+
+    Значения берутся из общего кэша процессов; для остальных сделок выполняется
+    один вызов batch с командой crm.activity.list (по убыванию ID) на сделку.
+    При ошибке Bitrix24 сделки без кэша возвращаются без активности.
+    """
+    result, missing = {}, []
+    for deal_id in dict.fromkeys(str(deal_id) for deal_id in deal_ids):
+        entry = shared_cache.get(_last_activity_key(deal_id))
+        if entry and entry.is_fresh:
+            result[deal_id] = entry.json()
+        else:
+            missing.append(deal_id)
+    if not missing:
+        return result
+
+    commands = {
+        f"deal_{deal_id}": (
+            "crm.activity.list",
+            {
+                "filter": {"OWNER_TYPE_ID": 2, "OWNER_ID": deal_id},
+                "order": {"ID": "DESC"},
+                "select": ["ID", "CREATED", "AUTHOR_ID", "SUBJECT", "DESCRIPTION", "COMMUNICATIONS"],
+                "start": -1,
+            },
+        )
+        for deal_id in missing
+    }
+    try:
+        results, errors = bitrix_batch(commands)
+    except requests.RequestException:
+        return result
+    for deal_id in missing:
+        key = f"deal_{deal_id}"
+        if key in errors or key not in results:
+            continue
+        activities = results[key]
+        preview = _activity_preview(activities[0]) if activities else None
+        shared_cache.put_json(_last_activity_key(deal_id), preview, DEAL_LAST_ACTIVITY_TTL_SECONDS)
+        result[deal_id] = preview
+    return result
+
+
+def invalidate_last_activity(deal_id) -> None:
+    """Сбрасывает кэш последней активности после добавления активности к сделке"""
+    shared_cache.delete(_last_activity_key(deal_id))
+
 # ---------- Статусы сделок (цвета/иконки) ----------
 
 def get_status_style(stage_name: str) -> tuple[str, str]:
@@ -78,8 +227,8 @@ def get_deals(contact_id: str, closed_filter: str = None) -> List[Dict]:
     if closed_filter:
         params["filter[CLOSED]"] = closed_filter
 
-    response = requests.get(
-        f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/crm.deal.list.json",
+    response = bitrix_get(
+        "crm.deal.list",
         params=params,
     )
     response.raise_for_status()
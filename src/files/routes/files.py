@@ -0,0 +1,261 @@
+"""
+Модуль files.py
+===============
+
+Прокси вложений Bitrix24 (эндпоинт /files/{file_id}).
+
+- Доступ — по подписанной ссылке, выданной текущему пользователю
+  (utils.file_links), плюс access-токен.
+- Файлы до FILES_CACHE_MAX_FILE_BYTES сохраняются в локальный дисковый кэш
+  (utils.file_cache): повторные загрузки того же файла не обращаются к Bitrix24.
+  Из кэша файл целиком отдаётся через FileResponse (без копирования данных
+  в приложении, если сервер поддерживает передачу файла по пути).
+- Поддерживаются запросы диапазона (Range, If-Range) и условные запросы
+  (If-None-Match → 304). При промахе кэша без Range файл передаётся клиенту
+  по частям одновременно с записью в кэш; запрос диапазона сначала загружает
+  файл в кэш целиком. Если файл в это время загружает другой запрос,
+  диапазон запрашивается у Bitrix24 напрямую, без ожидания.
+- Файлы больше лимита передаются из Bitrix24 по частям без кэширования,
+  заголовок Range пробрасывается в Bitrix24, тело передаётся без распаковки
+  вместе с Content-Encoding.
+- Загрузки из Bitrix24 выполняются в отдельном пуле потоков "files".
+"""
+
+import mimetypes
+import os
+from urllib.parse import quote
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+import requests
+from config import BITRIX_TIMEOUT_SECONDS, FILES_CACHE_MAX_FILE_BYTES
+from src.utils import executors
+from src.utils.bitrix import session
+from src.utils.bitrix_files import get_file_metadata
+from src.utils.http_cache import PRIVATE_REVALIDATE, etag_matches, make_etag, not_modified
+from src.utils.jwt_handler import get_token, decode_access_token
+from ..utils import file_cache, file_links
+
+router = APIRouter()
+
+# Размер части при чтении из Bitrix24 и из кэша
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    """Запрошенный диапазон лежит за пределами файла"""
+
+
+def _byte_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Диапазон из заголовка Range (границы включительно); None — отдать файл целиком.
+    Несколько диапазонов в одном запросе не поддерживаются и игнорируются.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            start, end = max(0, size - length), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if end < start:
+        # Синтаксически неверный диапазон игнорируется
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def _content_disposition(name: str) -> str:
+    return f"attachment; filename*=utf-8''{quote(name)}"
+
+
+def _read_range(file, start: int, end: int):
+    try:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _from_cache(path: str, range_header: str | None, media_type: str, headers: dict) -> Response:
+    # Файл открывается сразу: вытеснение из кэша не прервёт начатую передачу
+    file = open(path, "rb")
+    try:
+        size = os.fstat(file.fileno()).st_size
+        byte_range = _byte_range(range_header, size)
+    except BaseException:
+        file.close()
+        raise
+    if byte_range is None:
+        file.close()
+        return FileResponse(path, media_type=media_type, headers=headers)
+    start, end = byte_range
+    return StreamingResponse(
+        _read_range(file, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers={
+            **headers,
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Content-Length": str(end - start + 1),
+        },
+    )
+
+
+def _open_upstream(url: str, range_header: str | None = None) -> requests.Response:
+    headers = {"Accept-Encoding": "identity"}
+    if range_header:
+        headers["Range"] = range_header
+    response = session.get(url, headers=headers, stream=True, timeout=BITRIX_TIMEOUT_SECONDS)
+    try:
+        response.raise_for_status()
+    except requests.HTTPError:
+        response.close()
+        raise
+    return response
+
+
+def _download(url: str):
+    def write(out) -> None:
+        response = _open_upstream(url)
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                out.write(chunk)
+        finally:
+            response.close()
+    return write
+
+
+def _stream(response: requests.Response):
+    """Передаёт тело ответа Bitrix24 как есть, без распаковки"""
+    try:
+        yield from response.raw.stream(CHUNK_SIZE, decode_content=False)
+    finally:
+        response.close()
+
+
+def _stream_and_cache(response: requests.Response, key: str):
+    """Передаёт файл клиенту и одновременно записывает его в кэш"""
+    fd, part_path = file_cache.create_part()
+    complete = False
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                out.write(chunk)
+                yield chunk
+        complete = True
+    finally:
+        response.close()
+        if complete:
+            file_cache.commit(part_path, key)
+        else:
+            # Клиент прервал загрузку или Bitrix24 оборвал соединение
+            os.unlink(part_path)
+
+
+async def _from_bitrix(
+    url: str, key: str, cacheable: bool, range_header: str | None, media_type: str, headers: dict
+) -> Response:
+    upstream = await executors.run(
+        "files", _open_upstream, url, None if cacheable else range_header
+    )
+    if cacheable:
+        # В кэш и клиенту идёт распакованное содержимое: длина сжатого ответа
+        # Bitrix24 с ним не совпадает
+        if upstream.headers.get("Content-Length") and not upstream.headers.get("Content-Encoding"):
+            headers["Content-Length"] = upstream.headers["Content-Length"]
+        return StreamingResponse(
+            _stream_and_cache(upstream, key), media_type=media_type, headers=headers
+        )
+    for name in ("Content-Length", "Content-Range", "Content-Encoding"):
+        if upstream.headers.get(name):
+            headers[name] = upstream.headers[name]
+    return StreamingResponse(
+        _stream(upstream),
+        status_code=upstream.status_code,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+@router.get("/{file_id}")
+async def get_file(
+    file_id: int,
+    request: Request,
+    sig: str = Query(..., description="Подпись ссылки из ветки чата"),
+    token: str = Depends(get_token),
+):
+    """Скачивание вложения Bitrix24 по подписанной ссылке"""
+    try:
+        current_user = decode_access_token(token)
+        if not file_links.verify(file_id, current_user.get("user_id"), sig):
+            raise HTTPException(status_code=403, detail="Нет доступа к файлу")
+
+        metadata = await executors.run("bitrix", get_file_metadata, file_id)
+        url = metadata.get("DOWNLOAD_URL")
+        if not url:
+            raise HTTPException(status_code=404, detail="Файл не найден")
+
+        # Версия файла: изменённый в Bitrix24 файл получает новый ключ и ETag
+        key = f"{file_id}:{metadata.get('UPDATE_TIME', '')}:{metadata.get('SIZE', '')}"
+        etag = make_etag(key)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        name = metadata.get("NAME") or f"file_{file_id}"
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        headers = {
+            "ETag": etag,
+            "Cache-Control": PRIVATE_REVALIDATE,
+            "Accept-Ranges": "bytes",
+            "Content-Disposition": _content_disposition(name),
+        }
+
+        range_header = request.headers.get("range")
+        # If-Range с другой версией файла: диапазон устарел, отдаём файл целиком
+        if request.headers.get("if-range", etag) != etag:
+            range_header = None
+
+        size = int(metadata.get("SIZE") or 0)
+        cacheable = 0 < size <= FILES_CACHE_MAX_FILE_BYTES
+
+        path = file_cache.lookup(key)
+        if path is None and cacheable and range_header:
+            path = await executors.run("files", file_cache.fill, key, _download(url), False)
+            if path is None:
+                # Файл уже загружает другой запрос: поток пула не ждёт его,
+                # диапазон передаётся из Bitrix24 без кэширования
+                cacheable = False
+        if path is not None:
+            try:
+                return _from_cache(path, range_header, media_type, headers)
+            except FileNotFoundError:
+                # Файл вытеснен из кэша между проверкой и открытием
+                pass
+        return await _from_bitrix(url, key, cacheable, range_header, media_type, headers)
+
+    except RangeNotSatisfiable:
+        raise HTTPException(
+            status_code=416,
+            detail="Запрошенный диапазон недоступен",
+            headers={"Content-Range": f"bytes */{metadata.get('SIZE', 0)}"},
+        )
+    except HTTPException:
+        raise
+    except requests.RequestException:
+        raise HTTPException(status_code=500, detail="Bitrix24 request error")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
@@ -0,0 +1,128 @@
+"""
+Модуль file_cache.py
+====================
+
+Локальный дисковый кэш вложений Bitrix24 с вытеснением по давности
+использования (LRU) и ограничением общего размера FILES_CACHE_MAX_BYTES.
+
+- Файл кэша адресуется ключом версии файла (ID и время изменения в Bitrix24),
+  поэтому изменённый в Bitrix24 файл попадает в кэш как новая запись.
+- Загрузка пишется во временный файл в том же каталоге и атомарно
+  переименовывается после получения всех данных: недокачанный файл
+  никогда не отдаётся.
+- Обращение к записи обновляет её mtime; при превышении лимита удаляются
+  записи с самым старым mtime. Вытеснение выполняется под flock, поэтому
+  рабочие процессы хоста не удаляют файлы одновременно.
+- fill загружает файл в кэш один раз: параллельные загрузки того же файла
+  (в том числе из других процессов) не выполняются. С blocking=False fill
+  не ждёт чужую загрузку, а сразу возвращает None.
+"""
+
+import fcntl
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Callable
+from config import FILES_CACHE_DIR, FILES_CACHE_MAX_BYTES
+
+_PART_PREFIX = ".part-"
+_LOCK_NAME = ".lock"
+# Число lock-файлов для загрузок (ключи распределяются по ним по хешу)
+_FILL_LOCK_STRIPES = 64
+
+
+def _path(key: str) -> str:
+    return os.path.join(FILES_CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+
+def lookup(key: str) -> str | None:
+    """Путь к файлу в кэше или None; отмечает запись как недавно использованную"""
+    path = _path(key)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def create_part() -> tuple[int, str]:
+    """Временный файл для загрузки: (дескриптор, путь)"""
+    os.makedirs(FILES_CACHE_DIR, exist_ok=True)
+    return tempfile.mkstemp(dir=FILES_CACHE_DIR, prefix=_PART_PREFIX)
+
+
+def commit(part_path: str, key: str) -> None:
+    """Помещает полностью загруженный файл в кэш и освобождает место при необходимости"""
+    os.replace(part_path, _path(key))
+    evict()
+
+
+def fill(key: str, download: Callable[[BinaryIO], None], blocking: bool = True) -> str | None:
+    """
+    Загружает файл в кэш, если его там нет, и возвращает путь к нему.
+
+    Args:
+        key: ключ версии файла
+        download: записывает содержимое файла в переданный поток
+        blocking: False — не ждать загрузку, уже идущую под тем же lock-файлом,
+            и вернуть None
+    """
+    os.makedirs(FILES_CACHE_DIR, exist_ok=True)
+    stripe = int(hashlib.sha1(key.encode("utf-8")).hexdigest(), 16) % _FILL_LOCK_STRIPES
+    lock_fd = os.open(
+        os.path.join(FILES_CACHE_DIR, f".fill-{stripe}.lock"), os.O_CREAT | os.O_RDWR, 0o600
+    )
+    try:
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            return lookup(key)
+        path = lookup(key)
+        if path is not None:
+            return path
+        fd, part_path = create_part()
+        try:
+            with os.fdopen(fd, "wb") as out:
+                download(out)
+        except BaseException:
+            os.unlink(part_path)
+            raise
+        commit(part_path, key)
+        return _path(key)
+    finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+
+
+def evict() -> None:
+    """Удаляет давно не использованные записи, пока кэш не уложится в лимит"""
+    lock_fd = os.open(os.path.join(FILES_CACHE_DIR, _LOCK_NAME), os.O_CREAT | os.O_RDWR, 0o600)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        entries, total = [], 0
+        with os.scandir(FILES_CACHE_DIR) as scan:
+            for entry in scan:
+                # Временные файлы активных загрузок не учитываются и не удаляются
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= FILES_CACHE_MAX_BYTES:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                # Открытые на чтение файлы остаются доступны до закрытия
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= FILES_CACHE_MAX_BYTES:
+                break
+    finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
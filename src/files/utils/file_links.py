@@ -0,0 +1,34 @@
+"""
+Модуль file_links.py
+====================
+
+Ссылки на вложения через прокси /files/{file_id}.
+
+Ссылка подписывается HMAC от ID файла и ID пользователя, которому она выдана
+(например, в ветке чата по его сделке). Прокси отдаёт файл только по
+подписи, выданной текущему пользователю, поэтому перебором ID нельзя
+получить чужие файлы портала.
+"""
+
+import hashlib
+import hmac
+from config import SECRET_KEY
+
+
+def sign(file_id, user_id) -> str:
+    message = f"file:{file_id}:{user_id}".encode("utf-8")
+    return hmac.new(SECRET_KEY.encode("utf-8"), message, hashlib.sha256).hexdigest()[:32]
+
+
+def verify(file_id, user_id, signature: str) -> bool:
+    return hmac.compare_digest(sign(file_id, user_id), signature or "")
+
+
+def file_url(base_url: str, file_id, user_id) -> str:
+    """
+    Подписанная абсолютная ссылка на файл для пользователя.
+
+    Args:
+        base_url: базовый URL приложения (request.base_url)
+    """
+    return f"{str(base_url).rstrip('/')}/files/{file_id}?sig={sign(file_id, user_id)}"
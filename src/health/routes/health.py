@@ -0,0 +1,54 @@
+"""
+Модуль health.py
+================
+
+Эндпоинты проверки состояния для балансировщика нагрузки.
+
+- /health/live  — процесс жив и обслуживает event loop
+- /health/ready — прогрев завершён и база данных доступна; состояние
+  зависимостей берётся из результатов фоновых проверок
+- /health/metrics — метрики процесса (подготовленные SQL-запросы,
+  ограничение одновременных запросов, пулы потоков)
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from src.utils import prepared, load_shedding, executors
+from ..utils.probes import state, is_ready
+
+router = APIRouter()
+
+
+@router.get("/live")
+async def live():
+    """Проверка жизнеспособности процесса"""
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+async def ready():
+    """Проверка готовности процесса принимать трафик"""
+    if is_ready():
+        status_code, status = 200, "ready"
+    elif not state["warmed_up"]:
+        status_code, status = 503, "warming_up"
+    else:
+        status_code, status = 503, "degraded"
+    return JSONResponse(
+        status_code=status_code,
+        content={
+            "status": status,
+            "dependencies": state["dependencies"],
+            "replicas": state["replicas"],
+        },
+    )
+
+
+@router.get("/metrics")
+async def metrics():
+    """Метрики текущего рабочего процесса"""
+    return {
+        "statements": prepared.metrics(),
+        "concurrency": load_shedding.metrics(),
+        "executors": executors.metrics(),
+    }
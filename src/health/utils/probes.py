@@ -0,0 +1,109 @@
+"""
+Модуль probes.py
+================
+
+Прогрев рабочего процесса и фоновые проверки зависимостей.
+
+Функционал:
+- Прогрев при старте: пул соединений к БД, keep-alive соединение к Bitrix24,
+  справочник воронок и стадий
+- Периодические проверки БД и Bitrix24 с сохранением результата в памяти,
+  чтобы /health/ready отвечал без обращения к зависимостям
+- Проверка доступности и отставания реплик БД, по которой database.py
+  выбирает реплики для чтения
+- Периодическая очистка общего кэша (utils.shared_cache.sweep)
+"""
+
+import asyncio
+import time
+from fastapi.concurrency import run_in_threadpool
+from config import HEALTH_PROBE_INTERVAL_SECONDS, SHARED_CACHE_SWEEP_INTERVAL_SECONDS
+from database import connect_to_db, init_pool, check_replicas
+from src.utils import bitrix, shared_cache
+from src.deals.utils.deals_utils import get_catalog
+
+# Состояние процесса: warmed_up выставляется после завершения прогрева
+state = {
+    "warmed_up": False,
+    "started_at": time.time(),
+    "dependencies": {
+        "database": {"ok": False, "checked_at": None, "error": None},
+        "bitrix": {"ok": False, "checked_at": None, "error": None},
+    },
+    # Реплики не влияют на готовность: при их недоступности чтение идёт с основного сервера
+    "replicas": [],
+}
+
+
+def _record(name: str, ok: bool, error: Exception | None = None) -> None:
+    state["dependencies"][name] = {
+        "ok": ok,
+        "checked_at": time.time(),
+        "error": str(error) if error else None,
+    }
+
+
+def _probe_database() -> None:
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def _check(name: str, probe) -> None:
+    try:
+        probe()
+        _record(name, True)
+    except Exception as e:
+        _record(name, False, e)
+
+
+def _warm_database() -> None:
+    # Пул открывает все соединения сразу
+    init_pool()
+    _probe_database()
+
+
+def _warm_bitrix() -> None:
+    # Устанавливаем TLS-сессию и загружаем справочник воронок
+    bitrix.warm_up()
+    get_catalog()
+
+
+def warm_up() -> None:
+    """Прогрев процесса; ошибки зависимостей фиксируются, но не прерывают прогрев"""
+    _check("database", _warm_database)
+    _check("bitrix", _warm_bitrix)
+    state["replicas"] = check_replicas()
+    state["warmed_up"] = True
+
+
+def run_probes() -> None:
+    """Однократная проверка всех зависимостей"""
+    _check("database", _probe_database)
+    _check("bitrix", bitrix.warm_up)
+    state["replicas"] = check_replicas()
+
+
+async def probe_loop() -> None:
+    """Прогрев, затем периодические проверки зависимостей в фоне"""
+    await run_in_threadpool(warm_up)
+    swept_at = time.monotonic()
+    while True:
+        await asyncio.sleep(HEALTH_PROBE_INTERVAL_SECONDS)
+        await run_in_threadpool(run_probes)
+        if time.monotonic() - swept_at >= SHARED_CACHE_SWEEP_INTERVAL_SECONDS:
+            swept_at = time.monotonic()
+            try:
+                await run_in_threadpool(shared_cache.sweep)
+            except OSError:
+                pass
+
+
+def is_ready() -> bool:
+    """Процесс готов, когда прогрев завершён и база данных доступна"""
+    return state["warmed_up"] and state["dependencies"]["database"]["ok"]
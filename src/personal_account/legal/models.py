@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr, validator
 from typing import Optional, Literal
+import re
 
 
 class AddEmployeeData(BaseModel):
@@ -17,4 +18,27 @@ class AddEmployeeData(BaseModel):
     def validate_department_id(cls, v, values):
         if "role" in values and values["role"] == "Сотрудник" and v is None:
             raise ValueError("Для роли 'Сотрудник' необходимо указать department_id")
-        return v
\ No newline at end of file
+        return v
+
+class ImportEmployeeRow(BaseModel):
+    """Строка массового импорта сотрудников компании"""
+    first_name: str
+    second_name: str = ""
+    last_name: str
+    position: str
+    phone: str
+    email: EmailStr
+    password: str
+
+    @validator("phone")
+    def validate_phone(cls, v):
+        digits_only = re.sub(r"\D", "", v)
+        if len(digits_only) < 10:
+            raise ValueError("Некорректный формат номера телефона")
+        return '+' + digits_only
+
+    @validator("password")
+    def validate_password(cls, v):
+        if not v:
+            raise ValueError("Пароль не может быть пустым")
+        return v
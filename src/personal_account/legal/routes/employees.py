@@ -3,20 +3,126 @@
 ============================
 
 Модуль для получения списка сотрудников компании.
+
+Список отдаётся постранично (курсор по role_rank, created_at, id) с поиском
+по префиксу имени, телефона или email и фильтрами по роли и должности.
+Порядок обслуживается индексом idx_users_company_rank (migrations/002).
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+import base64
+import json
+import re
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from src.utils.jwt_handler import get_token, decode_access_token
+from src.utils.http_cache import conditional_json_response
+from src.utils import executors
 from database import connect_to_db
 import mysql.connector
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+# created_at у записей без даты создания (migrations/002)
+EPOCH = datetime(1970, 1, 1)
+
+
+def _encode_cursor(employee: dict) -> str:
+    created_at = (employee["created_at"] or EPOCH).isoformat()
+    raw = json.dumps([employee["role_rank"], created_at, employee["id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor_value: str) -> tuple:
+    try:
+        role_rank, created_at, employee_id = json.loads(base64.urlsafe_b64decode(cursor_value))
+        return int(role_rank), datetime.fromisoformat(created_at), int(employee_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def _like_prefix(value: str) -> str:
+    """Префикс для LIKE с экранированием спецсимволов"""
+    return re.sub(r"([\\%_])", r"\\\1", value) + "%"
+
+
+def _search_condition(q: str) -> tuple[str, list]:
+    """Условие поиска по префиксу: email, телефон или фамилия/имя"""
+    q = q.strip()
+    if "@" in q:
+        return "email LIKE %s", [_like_prefix(q)]
+    digits = re.sub(r"\D", "", q)
+    if digits and re.fullmatch(r"[\d\s()+-]+", q):
+        return "phone LIKE %s", [_like_prefix("+" + digits)]
+    prefix = _like_prefix(q)
+    return "(last_name LIKE %s OR first_name LIKE %s)", [prefix, prefix]
+
+
+def _load_employees(
+    company_id: int,
+    conditions: list[str],
+    params: list,
+    page_conditions: list[str],
+    page_params: list,
+    limit: int,
+    first_page: bool,
+) -> tuple[list[dict], Optional[int]]:
+    """Страница сотрудников (на одну запись больше — для следующего курсора) и общее количество"""
+    # Подключаемся к БД (чтение допускает отставание реплики)
+    conn = connect_to_db(read_only=True)
+    try:
+        db_cursor = conn.cursor(dictionary=True)
+
+        db_cursor.execute(
+            f"""SELECT id, first_name, second_name, last_name,
+                       phone, email, role, role_rank, position, balance, created_at
+                FROM users
+                WHERE {" AND ".join(page_conditions)}
+                ORDER BY role_rank, created_at DESC, id DESC
+                LIMIT %s""",
+            (*page_params, limit + 1),
+        )
+        employees = db_cursor.fetchall()
+
+        # Общее количество считаем только для первой страницы; без фильтров
+        # берём поддерживаемый счётчик companies.employees_count
+        total_count = None
+        if first_page and len(conditions) == 1:
+            db_cursor.execute(
+                "SELECT employees_count FROM companies WHERE id = %s",
+                (company_id,),
+            )
+            company = db_cursor.fetchone()
+            total_count = company["employees_count"] if company else 0
+        elif first_page:
+            db_cursor.execute(
+                f"SELECT COUNT(*) AS total_count FROM users WHERE {' AND '.join(conditions)}",
+                tuple(params),
+            )
+            total_count = db_cursor.fetchone()["total_count"]
+
+        db_cursor.close()
+        return employees, total_count
+    finally:
+        conn.close()
+
 
 @router.get("/company/employees")
-async def get_company_employees(token: str = Depends(get_token)):
+async def get_company_employees(
+    request: Request,
+    token: str = Depends(get_token),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    q: Optional[str] = Query(None, min_length=1),
+    role: Optional[str] = None,
+    position: Optional[str] = None,
+):
     """
-    Получение списка всех сотрудников компании.
+    Получение списка сотрудников компании (постранично).
     Доступно только для руководителей.
     """
     try:
@@ -37,30 +143,48 @@ async def get_company_employees(token: str = Depends(get_token)):
                 detail="У вас нет привязанной компании"
             )
         
-        # Подключаемся к БД
-        conn = connect_to_db()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Получаем всех сотрудников компании
-        cursor.execute(
-            """SELECT id, first_name, second_name, last_name, 
-                      phone, email, role, position, balance, created_at
-               FROM users
-               WHERE company_id = %s
-               ORDER BY 
-                   CASE role 
-                       WHEN 'Руководитель' THEN 1
-                       WHEN 'Сотрудник' THEN 2
-                       ELSE 3
-                   END,
-                   created_at DESC""",
-            (company_id,)
+        # Фильтры страницы (без курсора — для подсчёта общего количества)
+        conditions = ["company_id = %s"]
+        params = [company_id]
+        if role:
+            conditions.append("role = %s")
+            params.append(role)
+        if position:
+            conditions.append("position = %s")
+            params.append(position)
+        if q:
+            condition, condition_params = _search_condition(q)
+            conditions.append(condition)
+            params.extend(condition_params)
+
+        page_conditions = list(conditions)
+        page_params = list(params)
+        if cursor:
+            role_rank, created_at, employee_id = _decode_cursor(cursor)
+            page_conditions.append(
+                "(role_rank > %s OR (role_rank = %s AND "
+                "(created_at < %s OR (created_at = %s AND id < %s))))"
+            )
+            page_params.extend([role_rank, role_rank, created_at, created_at, employee_id])
+
+        # Страница сотрудников компании
+        employees, total_count = await executors.run(
+            "db",
+            _load_employees,
+            company_id,
+            conditions,
+            params,
+            page_conditions,
+            page_params,
+            limit,
+            not cursor,
         )
-        employees = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
+
+        next_cursor = None
+        if len(employees) > limit:
+            employees = employees[:limit]
+            next_cursor = _encode_cursor(employees[-1])
+
         # Форматируем данные
         formatted_employees = []
         for emp in employees:
@@ -78,11 +202,20 @@ async def get_company_employees(token: str = Depends(get_token)):
                 "created_at": emp["created_at"].isoformat() if emp["created_at"] else None
             })
         
-        return {
-            "employees": formatted_employees,
-            "total_count": len(formatted_employees)
-        }
+        # Список меняется редко: браузер может держать его до 30 секунд,
+        # а затем перепроверяет по ETag
+        return conditional_json_response(
+            request,
+            {
+                "employees": formatted_employees,
+                "total_count": total_count,
+                "next_cursor": next_cursor,
+            },
+            cache_control="private, max-age=30",
+        )
         
+    except HTTPException:
+        raise
     except mysql.connector.Error as e:
         raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
     except Exception as e:
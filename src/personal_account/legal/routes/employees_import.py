@@ -0,0 +1,186 @@
+"""
+Модуль employees_import.py
+==========================
+
+Массовая регистрация сотрудников компании руководителем.
+
+Файл (JSON или CSV) проверяется целиком при загрузке, после чего импорт
+выполняет обработчик задач процесса (utils.employee_import).
+
+Статус задачи и построчный отчёт доступны по /company/employees/import/{job_id}.
+Задача, не обновлявшаяся дольше STALE_IMPORT_SECONDS (процесс завершился
+во время импорта), помечается как failed при запросе статуса.
+"""
+
+import csv
+import io
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import ValidationError
+from src.utils.jwt_handler import get_token, decode_access_token
+from src.utils import executors
+from src.utils.jobs import create_job, fail_stale_jobs, get_job
+from database import connect_to_db
+import mysql.connector
+from ..models import ImportEmployeeRow
+from ..utils import employee_import
+from ..utils.employee_import import JOB_KIND, STALE_IMPORT_SECONDS
+
+router = APIRouter()
+
+# Максимальное число строк в одном файле импорта
+MAX_IMPORT_ROWS = 1000
+
+
+def _parse_rows(body: bytes, content_type: str) -> list[dict]:
+    """Разбор тела запроса: CSV (text/csv) с заголовком или JSON {"employees": [...]}"""
+    if "csv" in content_type:
+        text = body.decode("utf-8-sig")
+        return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+    data = json.loads(body or b"{}")
+    rows = data.get("employees") if isinstance(data, dict) else data
+    if not isinstance(rows, list):
+        raise ValueError("Ожидается список сотрудников")
+    return rows
+
+
+def _validate_rows(raw_rows: list[dict]) -> tuple[list[tuple[int, ImportEmployeeRow]], dict[int, dict]]:
+    """Проверка всех строк до начала импорта, включая дубликаты внутри файла"""
+    valid, report = [], {}
+    seen_phones, seen_emails = set(), set()
+    for row_number, raw in enumerate(raw_rows, start=1):
+        try:
+            row = ImportEmployeeRow(**raw)
+        except (ValidationError, TypeError) as e:
+            report[row_number] = {"row": row_number, "status": "error", "error": str(e)}
+            continue
+        email = row.email.lower()
+        if row.phone in seen_phones or email in seen_emails:
+            report[row_number] = {
+                "row": row_number,
+                "status": "error",
+                "error": "Телефон или email повторяется в файле",
+            }
+            continue
+        seen_phones.add(row.phone)
+        seen_emails.add(email)
+        valid.append((row_number, row))
+    return valid, report
+
+
+def _load_company(company_id: int) -> dict | None:
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            "SELECT id, name, bitrix_company_id FROM companies WHERE id = %s",
+            (company_id,),
+        )
+        company = cursor.fetchone()
+        cursor.close()
+        return company
+    finally:
+        conn.close()
+
+
+def _load_job(job_id: str) -> dict | None:
+    """Задача импорта; зависшие задачи предварительно помечаются как failed"""
+    job = get_job(job_id)
+    if job and job["kind"] == JOB_KIND and job["status"] in ("queued", "running"):
+        # Процесс, выполнявший импорт, мог завершиться, не обновив задачу
+        if fail_stale_jobs(JOB_KIND, STALE_IMPORT_SECONDS, "Импорт прерван перезапуском сервиса"):
+            job = get_job(job_id)
+    return job
+
+
+@router.post("/company/employees/import", status_code=202)
+async def import_company_employees(
+    request: Request, token: str = Depends(get_token)
+):
+    """
+    Массовый импорт сотрудников компании из JSON или CSV.
+    Доступно только для руководителей. Возвращает идентификатор задачи.
+    """
+    try:
+        current_user = decode_access_token(token)
+
+        if current_user.get("role") != "Руководитель":
+            raise HTTPException(
+                status_code=403,
+                detail="Только руководитель может импортировать сотрудников"
+            )
+
+        company_id = current_user.get("company_id")
+        if not company_id:
+            raise HTTPException(
+                status_code=404,
+                detail="У вас нет привязанной компании"
+            )
+
+        try:
+            raw_rows = _parse_rows(await request.body(), request.headers.get("content-type", ""))
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(status_code=400, detail=f"Некорректный файл импорта: {str(e)}")
+        if not raw_rows:
+            raise HTTPException(status_code=400, detail="Файл импорта не содержит строк")
+        if len(raw_rows) > MAX_IMPORT_ROWS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Слишком много строк: максимум {MAX_IMPORT_ROWS}",
+            )
+
+        rows, report = _validate_rows(raw_rows)
+
+        company = await executors.run("db", _load_company, company_id)
+        if not company:
+            raise HTTPException(status_code=404, detail="Компания не найдена")
+
+        job_id = await executors.run("db", create_job, JOB_KIND, current_user.get("user_id"), company_id)
+        employee_import.submit(job_id, company, rows, report)
+
+        return {
+            "job_id": job_id,
+            "status": "queued",
+            "total_rows": len(raw_rows),
+            "invalid_rows": len(report),
+        }
+
+    except HTTPException:
+        raise
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Непредвиденная ошибка: {str(e)}")
+
+
+@router.get("/company/employees/import/{job_id}")
+async def get_import_status(job_id: str, token: str = Depends(get_token)):
+    """Статус задачи импорта и построчный отчёт"""
+    try:
+        current_user = decode_access_token(token)
+
+        if current_user.get("role") != "Руководитель":
+            raise HTTPException(
+                status_code=403,
+                detail="Только руководитель может просматривать импорт сотрудников"
+            )
+
+        job = await executors.run("db", _load_job, job_id)
+        if not job or job["kind"] != JOB_KIND or job["company_id"] != current_user.get("company_id"):
+            raise HTTPException(status_code=404, detail="Задача импорта не найдена")
+
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "error": job["error"],
+            "report": job["result"],
+            "created_at": job["created_at"].isoformat() if job["created_at"] else None,
+            "updated_at": job["updated_at"].isoformat() if job["updated_at"] else None,
+        }
+
+    except HTTPException:
+        raise
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Непредвиденная ошибка: {str(e)}")
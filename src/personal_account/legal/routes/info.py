@@ -5,16 +5,40 @@
 Модуль для получения информации о компании.
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from src.utils.jwt_handler import get_token, decode_access_token
+from src.utils.http_cache import conditional_json_response
+from src.utils import executors
 from database import connect_to_db
 import mysql.connector
 
 router = APIRouter()
 
 
+def _load_company(company_id: int) -> dict | None:
+    """Строка компании; None, если компания не найдена"""
+    # Подключаемся к БД (чтение допускает отставание реплики)
+    conn = connect_to_db(read_only=True)
+    try:
+        cursor = conn.cursor(dictionary=True)
+
+        # Получаем данные компании (счётчик сотрудников хранится в строке компании)
+        cursor.execute(
+            """SELECT id, name, inn, invite_token, phone, email, balance,
+                      employees_count, created_at
+               FROM companies 
+               WHERE id = %s""",
+            (company_id,)
+        )
+        company = cursor.fetchone()
+        cursor.close()
+        return company
+    finally:
+        conn.close()
+
+
 @router.get("/company/info")
-async def get_company_info(token: str = Depends(get_token)):
+async def get_company_info(request: Request, token: str = Depends(get_token)):
     """
     Получение информации о компании.
     Токен видят только руководители.
@@ -38,37 +62,13 @@ async def get_company_info(token: str = Depends(get_token)):
                 detail="У вас нет привязанной компании"
             )
         
-        # Подключаемся к БД
-        conn = connect_to_db()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Получаем данные компании
-        cursor.execute(
-            """SELECT id, name, inn, invite_token, phone, email, balance, created_at
-               FROM companies 
-               WHERE id = %s""",
-            (company_id,)
-        )
-        company = cursor.fetchone()
-        
+        company = await executors.run("db", _load_company, company_id)
         if not company:
-            cursor.close()
-            conn.close()
             raise HTTPException(
                 status_code=404,
                 detail="Компания не найдена"
             )
         
-        # Получаем количество сотрудников
-        cursor.execute(
-            "SELECT COUNT(*) as employees_count FROM users WHERE company_id = %s",
-            (company_id,)
-        )
-        employees_count = cursor.fetchone()["employees_count"]
-        
-        cursor.close()
-        conn.close()
-        
         # Формируем ответ
         response_data = {
             "id": company["id"],
@@ -77,7 +77,7 @@ async def get_company_info(token: str = Depends(get_token)):
             "phone": company["phone"],
             "email": company["email"],
             "balance": float(company["balance"]),
-            "employees_count": employees_count,
+            "employees_count": company["employees_count"],
             "created_at": company["created_at"].isoformat() if company["created_at"] else None,
         }
         
@@ -86,8 +86,11 @@ async def get_company_info(token: str = Depends(get_token)):
             response_data["invite_token"] = company["invite_token"]
             response_data["token_message"] = "Передайте этот токен сотрудникам для регистрации"
         
-        return response_data
+        # ETag по содержимому: при неизменных данных клиент получает 304 без тела
+        return conditional_json_response(request, response_data)
         
+    except HTTPException:
+        raise
     except mysql.connector.Error as e:
         raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
     except Exception as e:
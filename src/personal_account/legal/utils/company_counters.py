@@ -0,0 +1,63 @@
+"""
+Модуль company_counters.py
+==========================
+
+Поддержка счётчика companies.employees_count.
+
+Счётчик изменяется в той же транзакции, что и добавление/удаление сотрудника
+(adjust_employees_count), поэтому страница компании читает его одним запросом
+по первичному ключу вместо COUNT(*) по users.
+
+Сверка с фактическим количеством (например, после ручных правок в БД):
+    python -m src.personal_account.legal.utils.company_counters [company_id]
+"""
+
+import sys
+from database import connect_to_db
+
+
+def adjust_employees_count(cursor, company_id: int, delta: int) -> None:
+    """Изменяет счётчик сотрудников; вызывается внутри транзакции вызывающего кода"""
+    if not company_id or not delta:
+        return
+    cursor.execute(
+        "UPDATE companies SET employees_count = employees_count + %s WHERE id = %s",
+        (delta, company_id),
+    )
+
+
+def reconcile_employees_count(company_id: int | None = None) -> int:
+    """
+    Пересчитывает employees_count по таблице users.
+
+    Returns:
+        int: Количество компаний, у которых счётчик был исправлен
+    """
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        query = """UPDATE companies c
+                   LEFT JOIN (
+                       SELECT company_id, COUNT(*) AS actual
+                       FROM users
+                       WHERE company_id IS NOT NULL
+                       GROUP BY company_id
+                   ) u ON u.company_id = c.id
+                   SET c.employees_count = COALESCE(u.actual, 0)
+                   WHERE c.employees_count <> COALESCE(u.actual, 0)"""
+        params = ()
+        if company_id is not None:
+            query += " AND c.id = %s"
+            params = (company_id,)
+        cursor.execute(query, params)
+        fixed = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        return fixed
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    target = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    print(f"Исправлено счётчиков: {reconcile_employees_count(target)}")
@@ -0,0 +1,272 @@
+"""
+Модуль employee_import.py
+=========================
+
+Фоновая часть массового импорта сотрудников (задачи вида "employee_import"
+в таблице jobs, принимаются в routes/employees_import.py).
+
+Импорт выполняют потоки-обработчики процесса, а не фоновая задача запроса:
+загрузка файла не удерживает слот ограничения нагрузки на время импорта.
+- дубликаты проверяются одним запросом по всем телефонам и email;
+- пароли хешируются в общем пуле "cpu" (utils.executors);
+- контакты Bitrix24 ищутся и создаются пакетными вызовами batch;
+- пользователи добавляются многострочными INSERT в одной транзакции.
+
+Строки файла (с паролями) передаются обработчику в памяти и в БД не
+сохраняются, поэтому задача, прерванная завершением процесса, не повторяется:
+через STALE_IMPORT_SECONDS она помечается как failed (см. get_import_status).
+Созданные контакты Bitrix24 сохраняются в payload задачи до вставки в БД,
+и повторная загрузка файла той же компанией использует их вместо создания новых.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from config import EMPLOYEE_IMPORT_THREADS
+from database import connect_to_db
+from src.auth.utils.auth_utils import find_bitrix_contacts_batch, create_bitrix_contacts_batch
+from src.auth.utils.password_handler import hash_password
+from src.utils import executors
+from src.utils.executors import ExecutorSaturated
+from src.utils.jobs import claim_job, list_job_payloads, update_job, update_job_payload
+from ..models import ImportEmployeeRow
+from .company_counters import adjust_employees_count
+
+JOB_KIND = "employee_import"
+# Задача в queued или running без обновлений дольше этого времени считается брошенной
+STALE_IMPORT_SECONDS = 1800
+# Число строк в одном многострочном INSERT
+INSERT_CHUNK_SIZE = 200
+# Пауза перед повторной постановкой в перегруженный пул "cpu" (секунды)
+_CPU_RETRY_SECONDS = 0.05
+
+_queue: queue.Queue = queue.Queue()
+_threads: list[threading.Thread] = []
+
+
+def _contact_data(row: ImportEmployeeRow, bitrix_company_id) -> dict:
+    return {
+        "NAME": row.first_name,
+        "SECOND_NAME": row.second_name,
+        "LAST_NAME": row.last_name,
+        "PHONE": [{"VALUE": row.phone, "VALUE_TYPE": "WORK"}],
+        "EMAIL": [{"VALUE": row.email, "VALUE_TYPE": "WORK"}],
+        "COMPANY_ID": bitrix_company_id,
+    }
+
+
+def _summary(report: dict[int, dict]) -> dict:
+    rows = [report[row_number] for row_number in sorted(report)]
+    created = sum(1 for row in rows if row["status"] == "created")
+    return {
+        "total": len(rows),
+        "created": created,
+        "failed": len(rows) - created,
+        "rows": rows,
+    }
+
+
+def _previous_contacts(company_id: int) -> dict[str, str]:
+    """Контакты Bitrix24, созданные незавершёнными импортами компании: телефон -> contact_id"""
+    contacts = {}
+    for payload in list_job_payloads(JOB_KIND, company_id, "failed"):
+        for phone, contact_id in (payload.get("contacts") or {}).items():
+            contacts.setdefault(phone, contact_id)
+    return contacts
+
+
+def _interrupted(report: dict[int, dict], rows: list, contacts: dict[int, str], error: str) -> None:
+    """Дополняет отчёт строками, обработка которых прервана ошибкой"""
+    for row_number, row in rows:
+        if row_number in report:
+            continue
+        report[row_number] = {
+            "row": row_number,
+            "status": "error",
+            "error": f"Импорт прерван: {error}",
+            "email": row.email,
+            "phone": row.phone,
+            "contact_id": contacts.get(row_number),
+        }
+
+
+def _hash_passwords(passwords: list[str]) -> list[str]:
+    """
+    Хеширование в общем пуле "cpu" порциями по числу его потоков: импорт
+    не создаёт своих потоков и не вытесняет хеширование при входе.
+    """
+    cpu = executors.executors["cpu"]
+    hashed = []
+    for start in range(0, len(passwords), cpu.workers):
+        futures = [_submit_cpu(hash_password, password) for password in passwords[start:start + cpu.workers]]
+        hashed.extend(future.result() for future in futures)
+    return hashed
+
+
+def _submit_cpu(fn, *args) -> Future:
+    while True:
+        try:
+            return executors.executors["cpu"].submit(fn, *args)
+        except ExecutorSaturated:
+            # Пул занят запросами — ждём свободного места в очереди
+            time.sleep(_CPU_RETRY_SECONDS)
+
+
+def run_employee_import(job_id: str, company: dict, rows: list, report: dict) -> None:
+    """Импорт: проверка дубликатов в БД, Bitrix24, вставка"""
+    if not claim_job(job_id):
+        return
+    conn = None
+    pending, contact_ids = [], []
+    try:
+        conn = connect_to_db()
+        cursor = conn.cursor(dictionary=True)
+
+        # Дубликаты в БД — одним запросом по всем телефонам и email
+        if rows:
+            phones = [row.phone for _, row in rows]
+            emails = [row.email for _, row in rows]
+            cursor.execute(
+                f"""SELECT phone, email FROM users
+                    WHERE phone IN ({", ".join(["%s"] * len(phones))})
+                       OR email IN ({", ".join(["%s"] * len(emails))})""",
+                (*phones, *emails),
+            )
+            existing = cursor.fetchall()
+            taken_phones = {user["phone"] for user in existing}
+            taken_emails = {(user["email"] or "").lower() for user in existing}
+        else:
+            taken_phones, taken_emails = set(), set()
+
+        for row_number, row in rows:
+            if row.phone in taken_phones or row.email.lower() in taken_emails:
+                report[row_number] = {
+                    "row": row_number,
+                    "status": "error",
+                    "error": "Пользователь с таким телефоном или email уже существует",
+                }
+            else:
+                pending.append((row_number, row))
+
+        if pending:
+            # bcrypt освобождает GIL, поэтому хеширование в потоках идёт параллельно
+            hashed_passwords = _hash_passwords([row.password for _, row in pending])
+
+            # Контакты Bitrix24: пакетный поиск, затем пакетное создание недостающих
+            contact_ids = find_bitrix_contacts_batch([(row.email, row.phone) for _, row in pending])
+            previous = _previous_contacts(company["id"])
+            for index, (_, row) in enumerate(pending):
+                if not contact_ids[index] and row.phone in previous:
+                    contact_ids[index] = previous[row.phone]
+            missing = [index for index, contact_id in enumerate(contact_ids) if not contact_id]
+            if missing:
+                created_ids = create_bitrix_contacts_batch(
+                    [_contact_data(pending[index][1], company["bitrix_company_id"]) for index in missing]
+                )
+                for index, contact_id in zip(missing, created_ids):
+                    contact_ids[index] = contact_id
+            # Контакты сохраняются до транзакции: при её ошибке повторный импорт
+            # использует их, а не создаёт дубли в Bitrix24
+            update_job_payload(job_id, {
+                "contacts": {
+                    row.phone: contact_id
+                    for (_, row), contact_id in zip(pending, contact_ids)
+                    if contact_id
+                },
+            })
+
+            insert_values = []
+            inserted_rows = []
+            for (row_number, row), hashed_password, contact_id in zip(pending, hashed_passwords, contact_ids):
+                if not contact_id:
+                    report[row_number] = {
+                        "row": row_number,
+                        "status": "error",
+                        "error": "Ошибка создания контакта в Bitrix24",
+                    }
+                    continue
+                insert_values.append((
+                    hashed_password,
+                    "legal",
+                    "Сотрудник",
+                    row.first_name,
+                    row.second_name,
+                    row.last_name,
+                    row.phone,
+                    row.email,
+                    contact_id,
+                    company["id"],
+                    row.position,
+                    0.0,
+                ))
+                inserted_rows.append((row_number, row, contact_id))
+
+            # executemany для INSERT ... VALUES отправляет многострочные INSERT;
+            # все порции вставляются в одной транзакции
+            for start in range(0, len(insert_values), INSERT_CHUNK_SIZE):
+                cursor.executemany(
+                    """INSERT INTO users (
+                        password, user_type, role, first_name, second_name,
+                        last_name, phone, email, contact_id, company_id,
+                        position, balance
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                    insert_values[start:start + INSERT_CHUNK_SIZE],
+                )
+            adjust_employees_count(cursor, company["id"], len(insert_values))
+            conn.commit()
+
+            for row_number, row, contact_id in inserted_rows:
+                report[row_number] = {
+                    "row": row_number,
+                    "status": "created",
+                    "email": row.email,
+                    "phone": row.phone,
+                    "contact_id": contact_id,
+                }
+
+        cursor.close()
+        update_job(job_id, "done", result=_summary(report))
+
+    except Exception as e:
+        if conn is not None:
+            conn.rollback()
+        contacts = dict(zip([row_number for row_number, _ in pending], contact_ids))
+        _interrupted(report, rows, contacts, str(e))
+        update_job(job_id, "failed", result=_summary(report), error=str(e))
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def _run() -> None:
+    while True:
+        item = _queue.get()
+        if item is None:
+            break
+        try:
+            run_employee_import(*item)
+        except Exception:
+            # Ошибка БД при смене статуса: задача будет помечена как failed
+            # по истечении STALE_IMPORT_SECONDS
+            pass
+
+
+def submit(job_id: str, company: dict, rows: list, report: dict) -> None:
+    """Ставит импорт в очередь обработчика текущего процесса"""
+    _queue.put((job_id, company, rows, report))
+
+
+def start() -> None:
+    if _threads:
+        return
+    for index in range(EMPLOYEE_IMPORT_THREADS):
+        thread = threading.Thread(target=_run, name=f"employee-import-{index}", daemon=True)
+        thread.start()
+        _threads.append(thread)
+
+
+def stop() -> None:
+    for _ in _threads:
+        _queue.put(None)
+    _threads.clear()
@@ -1,10 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date, datetime, timedelta
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from src.utils.jwt_handler import get_token, decode_access_token
 from database import connect_to_db
+from src.utils import executors, prepared
+from ..utils.export import csv_stream, xlsx_stream
 import mysql.connector
 
 router = APIRouter()
 
+# Число строк, читаемых с сервера БД и кодируемых за один шаг выгрузки
+EXPORT_BATCH_SIZE = 2000
+EXPORT_HEADER = ["ID", "Сумма", "Тип операции", "Дата"]
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+def _load_transactions(user_id: int) -> list[dict]:
+    # Подключаемся к базе данных (чтение допускает отставание реплики)
+    conn = connect_to_db(read_only=True)
+    try:
+        # Получаем транзакции пользователя
+        return prepared.fetchall(conn, "transactions_by_user", (user_id,))
+    finally:
+        conn.close()
+
+
 @router.get("/get-transactions")
 async def get_transactions(token: str = Depends(get_token)):
     """Получение информации о текущих транзакциях пользователя"""
@@ -16,20 +39,9 @@ async def get_transactions(token: str = Depends(get_token)):
         if not user_id:
             raise HTTPException(status_code=401, detail="Невалидный токен")
 
-        # Подключаемся к базе данных
-        conn = connect_to_db()
-        cursor = conn.cursor(dictionary=True)
-
-        # Получаем транзакции пользователя
-        cursor.execute(
-            "SELECT id, amount, transaction_type, created_at FROM transactions WHERE user_id = %s",
-            (user_id,),
-        )
-        transactions = cursor.fetchall()
+        transactions = await executors.run("db", _load_transactions, user_id)
 
         if not transactions:
-            cursor.close()
-            conn.close()
             return {"transactions": []}
 
         # Формируем ответ
@@ -45,9 +57,89 @@ async def get_transactions(token: str = Depends(get_token)):
             ]
         }
 
+        return response_data
+
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
+
+
+def _export_batches(conn, cursor):
+    """Порции строк из небуферизованного курсора; соединение закрывается по завершении"""
+    try:
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            yield [
+                (tx_id, float(amount), transaction_type, created_at.isoformat())
+                for tx_id, amount, transaction_type, created_at in rows
+            ]
         cursor.close()
+    finally:
+        # Отдельное соединение: при обрыве выгрузки закрывается вместе
+        # с непрочитанным результатом, не возвращаясь в пул
         conn.close()
-        return response_data
 
+
+@router.get("/export")
+async def export_transactions(
+    format: Literal["csv", "xlsx"] = Query("csv"),
+    date_from: date | None = Query(None, description="Начало периода (включительно)"),
+    date_to: date | None = Query(None, description="Конец периода (включительно)"),
+    transaction_type: str | None = Query(None, alias="type"),
+    token: str = Depends(get_token),
+):
+    """
+    Выгрузка истории транзакций пользователя в CSV или XLSX.
+    Файл формируется и отдаётся частями по мере чтения строк из БД.
+    """
+    conn = None
+    try:
+        token_data = decode_access_token(token)
+        user_id = token_data.get("user_id")
+
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Невалидный токен")
+        if date_from and date_to and date_from > date_to:
+            raise HTTPException(status_code=400, detail="Начало периода позже его конца")
+
+        conditions = ["user_id = %s"]
+        params = [user_id]
+        if date_from:
+            conditions.append("created_at >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append("created_at < %s")
+            params.append(date_to + timedelta(days=1))
+        if transaction_type:
+            conditions.append("transaction_type = %s")
+            params.append(transaction_type)
+
+        # Небуферизованный курсор: строки читаются с сервера по мере выгрузки
+        conn = connect_to_db(pooled=False, read_only=True)
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(
+            f"""SELECT id, amount, transaction_type, created_at FROM transactions
+                WHERE {" AND ".join(conditions)}
+                ORDER BY created_at, id""",
+            tuple(params),
+        )
+
+        batches = _export_batches(conn, cursor)
+        if format == "xlsx":
+            body = xlsx_stream(EXPORT_HEADER, batches, sheet_name="Транзакции")
+        else:
+            body = csv_stream(EXPORT_HEADER, batches)
+        filename = f"transactions_{datetime.now():%Y%m%d}.{format}"
+        return StreamingResponse(
+            body,
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    except HTTPException:
+        raise
     except mysql.connector.Error as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
\ No newline at end of file
+        if conn is not None:
+            conn.close()
+        raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
@@ -0,0 +1,175 @@
+"""
+Модуль export.py
+================
+
+Потоковая выгрузка строк в CSV и XLSX.
+
+Оба кодировщика принимают итератор порций строк и отдают файл частями,
+поэтому память не зависит от количества строк:
+- CSV пишется с BOM и разделителем ";" (открывается в Excel с русской локалью);
+- XLSX собирается как zip-архив, записываемый в несеквенциальный поток
+  (zipfile использует дескрипторы данных), листы содержат inline-строки
+  без общей таблицы строк. При превышении лимита строк Excel выгрузка
+  продолжается на следующем листе.
+"""
+
+import csv
+import io
+import zipfile
+from typing import Iterable, Iterator, Sequence
+from xml.sax.saxutils import escape
+
+# Лимит строк на лист Excel (с учётом строки заголовка)
+XLSX_MAX_ROWS = 1_048_576
+
+
+def csv_stream(header: Sequence[str], batches: Iterable[Sequence[Sequence]]) -> Iterator[bytes]:
+    """CSV по порциям строк: одна порция — один фрагмент ответа"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _Sink:
+    """Приёмник zip-архива без seek/tell: накопленные байты забирает генератор"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _column(index: int) -> str:
+    name = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(65 + remainder) + name
+    return name
+
+
+def _cell(ref: str, value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    return f'<c r="{ref}" t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+
+
+def _row(number: int, values: Sequence) -> str:
+    cells = "".join(_cell(f"{_column(index)}{number}", value) for index, value in enumerate(values))
+    return f'<row r="{number}">{cells}</row>'
+
+
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = "</sheetData></worksheet>"
+
+
+def _workbook_parts(sheet_count: int, sheet_name: str) -> dict[str, str]:
+    """Служебные части книги; пишутся в конце, когда известно число листов"""
+    names = [sheet_name if index == 1 else f"{sheet_name} {index}" for index in range(1, sheet_count + 1)]
+    sheets = "".join(
+        f'<sheet name="{escape(name)}" sheetId="{index}" r:id="rId{index}"/>'
+        for index, name in enumerate(names, start=1)
+    )
+    sheet_rels = "".join(
+        f'<Relationship Id="rId{index}" '
+        f'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{index}.xml"/>'
+        for index in range(1, sheet_count + 1)
+    )
+    sheet_types = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{index}.xml" '
+        f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for index in range(1, sheet_count + 1)
+    )
+    return {
+        "xl/workbook.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f"<sheets>{sheets}</sheets></workbook>"
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f"{sheet_rels}</Relationships>"
+        ),
+        "_rels/.rels": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>'
+        ),
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            f"{sheet_types}</Types>"
+        ),
+    }
+
+
+def xlsx_stream(
+    header: Sequence[str],
+    batches: Iterable[Sequence[Sequence]],
+    sheet_name: str = "Лист",
+) -> Iterator[bytes]:
+    """XLSX по порциям строк: архив отдаётся по мере сжатия листов"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        sheet_count = 0
+        sheet = None
+        row_number = XLSX_MAX_ROWS
+        for rows in batches:
+            for values in rows:
+                if row_number >= XLSX_MAX_ROWS:
+                    if sheet is not None:
+                        sheet.write(_SHEET_TAIL.encode("utf-8"))
+                        sheet.close()
+                    sheet_count += 1
+                    sheet = archive.open(f"xl/worksheets/sheet{sheet_count}.xml", "w", force_zip64=True)
+                    sheet.write((_SHEET_HEAD + _row(1, header)).encode("utf-8"))
+                    row_number = 1
+                row_number += 1
+                sheet.write(_row(row_number, values).encode("utf-8"))
+            yield sink.drain()
+
+        if sheet is None:
+            # Пустая выгрузка — лист только с заголовком
+            sheet_count = 1
+            sheet = archive.open("xl/worksheets/sheet1.xml", "w")
+            sheet.write((_SHEET_HEAD + _row(1, header)).encode("utf-8"))
+        sheet.write(_SHEET_TAIL.encode("utf-8"))
+        sheet.close()
+
+        for name, content in _workbook_parts(sheet_count, sheet_name).items():
+            archive.writestr(name, content)
+    yield sink.drain()
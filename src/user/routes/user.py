@@ -1,39 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from src.utils.jwt_handler import get_token, decode_access_token
+from src.utils.http_cache import conditional_json_response
 from database import connect_to_db
+from src.utils import executors, prepared
 import mysql.connector
 
 router = APIRouter()
 
 
-@router.get("/get-info")
-async def get_user(token: str = Depends(get_token)):
-    """Получение информации о текущем пользователе"""
+def _load_profile(user_id: int) -> dict | None:
+    """Профиль пользователя с данными компании; None, если пользователь не найден"""
+    # Подключаемся к базе данных; профиль читается сразу после регистрации
+    # и входа, поэтому запрос идёт на основной сервер, а не на реплику
+    conn = connect_to_db()
     try:
-        # Декодируем токен
-        token_data = decode_access_token(token)
-        user_id = token_data.get("user_id")
-
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Невалидный токен")
-
-        # Подключаемся к базе данных
-        conn = connect_to_db()
         cursor = conn.cursor(dictionary=True)
 
         # Получаем актуальные данные пользователя из БД
-        cursor.execute(
-            "SELECT id, user_type, role, first_name, second_name, last_name, "
-            "phone, email, contact_id, company_id, balance, created_at "
-            "FROM users WHERE id = %s",
-            (user_id,),
-        )
-        user = cursor.fetchone()
+        user = prepared.fetchone(conn, "user_by_id", (user_id,))
 
         if not user:
             cursor.close()
-            conn.close()
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
+            return None
 
         # Получаем информацию о компании (если юр. лицо)
         company_info = None
@@ -43,41 +31,62 @@ async def get_user(token: str = Depends(get_token)):
                 (user["company_id"],),
             )
             company_info = cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+
+    # Формируем базовый ответ
+    response_data = {
+        "id": user["id"],
+        "user_type": user["user_type"],
+        "role": user["role"],
+        "first_name": user["first_name"],
+        "second_name": user["second_name"],
+        "last_name": user["last_name"],
+        "phone": user["phone"],
+        "email": user["email"],
+        "contact_id": user["contact_id"],
+        "balance": float(user["balance"]),
+        "created_at": (
+            user["created_at"].isoformat() if user["created_at"] else None
+        ),
+    }
+
 
-        # Формируем базовый ответ
-        response_data = {
-            "id": user["id"],
-            "user_type": user["user_type"],
-            "role": user["role"],
-            "first_name": user["first_name"],
-            "second_name": user["second_name"],
-            "last_name": user["last_name"],
-            "phone": user["phone"],
-            "email": user["email"],
-            "contact_id": user["contact_id"],
-            "balance": float(user["balance"]),
-            "created_at": (
-                user["created_at"].isoformat() if user["created_at"] else None
-            ),
+    if user["user_type"] == "legal":
+        response_data["company_id"] = user["company_id"]
+
+    if company_info:
+        response_data["company"] = {
+            "id": company_info["id"],
+            "name": company_info["name"],
+            "inn": company_info["inn"],
+            "balance": float(company_info["balance"]),
         }
 
+    return response_data
 
-        if user["user_type"] == "legal":
-            response_data["company_id"] = user["company_id"]
 
-        if company_info:
-            response_data["company"] = {
-                "id": company_info["id"],
-                "name": company_info["name"],
-                "inn": company_info["inn"],
-                "balance": float(company_info["balance"]),
-            }
+@router.get("/get-info")
+async def get_user(request: Request, token: str = Depends(get_token)):
+    """Получение информации о текущем пользователе"""
+    try:
+        # Декодируем токен
+        token_data = decode_access_token(token)
+        user_id = token_data.get("user_id")
 
-        cursor.close()
-        conn.close()
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Невалидный токен")
+
+        response_data = await executors.run("db", _load_profile, user_id)
+        if response_data is None:
+            raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-        return response_data
+        # ETag по содержимому: при неизменных данных клиент получает 304 без тела
+        return conditional_json_response(request, response_data)
 
+    except HTTPException:
+        raise
     except mysql.connector.Error as e:
         raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
     except Exception as e:
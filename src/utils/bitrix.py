@@ -0,0 +1,148 @@
+"""
+Модуль bitrix.py
+================
+
+Этот модуль предоставляет общий HTTP-клиент для REST API Bitrix24.
+
+Функционал:
+- Общая requests.Session с пулом keep-alive соединений на процесс,
+  чтобы TLS-сессия к порталу устанавливалась один раз, а не на каждый вызов
+- Формирование URL метода вебхука
+- Пакетные вызовы через метод batch (до 50 команд за один запрос)
+- Таймаут каждого вызова из оставшегося бюджета запроса (utils.deadline)
+- Хеджирование идемпотентных чтений из BITRIX_HEDGED_METHODS (utils.hedging)
+- Учёт вызовов в сводке внешних вызовов запроса (utils.logs)
+- Прогрев соединения при старте приложения
+
+Зависимости:
+- requests
+- config (BITRIX_DOMAIN, BITRIX_TOKEN, BITRIX_POOL_SIZE, BITRIX_TIMEOUT_SECONDS)
+"""
+
+import logging
+import time
+import requests
+from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
+from config import (
+    BITRIX_DOMAIN,
+    BITRIX_TOKEN,
+    BITRIX_POOL_SIZE,
+    BITRIX_TIMEOUT_SECONDS,
+    BITRIX_HEDGING_ENABLED,
+    BITRIX_HEDGED_METHODS,
+)
+from src.utils import deadline, hedging, logs
+
+logger = logging.getLogger(__name__)
+
+session = requests.Session()
+session.mount(
+    "https://",
+    HTTPAdapter(pool_connections=1, pool_maxsize=BITRIX_POOL_SIZE),
+)
+
+
+def bitrix_url(method: str) -> str:
+    """URL REST-метода Bitrix24 через входящий вебхук"""
+    return f"https://{BITRIX_DOMAIN}/rest/1/{BITRIX_TOKEN}/{method}.json"
+
+
+def _request(http_method: str, method: str, hedge: bool = False, **kwargs) -> requests.Response:
+    def attempt() -> requests.Response:
+        # Таймаут считается при запуске попытки: вторая попытка хеджирования
+        # получает только оставшуюся часть бюджета запроса
+        timeout = deadline.timeout(BITRIX_TIMEOUT_SECONDS)
+        return session.request(http_method, bitrix_url(method), timeout=timeout, **kwargs)
+
+    started = time.perf_counter()
+    status = None
+    try:
+        if hedge:
+            response = hedging.hedged_call(method, attempt, on_discard=requests.Response.close)
+        else:
+            response = attempt()
+        status = response.status_code
+        return response
+    except requests.Timeout:
+        current = deadline.current()
+        if current is not None and current.expired:
+            deadline.mark_exceeded()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        logs.record_upstream("bitrix", elapsed, status is not None and status < 400)
+        logger.debug(
+            "Вызов Bitrix24",
+            extra={"fields": {"method": method, "status": status, "duration_ms": round(elapsed * 1000, 1)}},
+        )
+
+
+def bitrix_get(method: str, params: dict | None = None) -> requests.Response:
+    """GET-вызов REST-метода Bitrix24 (с хеджированием для идемпотентных методов)"""
+    hedge = BITRIX_HEDGING_ENABLED and method in BITRIX_HEDGED_METHODS
+    return _request("GET", method, hedge=hedge, params=params)
+
+
+def bitrix_post(method: str, payload: dict | None = None) -> requests.Response:
+    """POST-вызов REST-метода Bitrix24 с JSON-телом"""
+    return _request("POST", method, json=payload)
+
+
+# Максимальное число команд в одном вызове batch
+BATCH_LIMIT = 50
+
+
+def _flatten_params(value, prefix: str, out: list) -> None:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten_params(item, f"{prefix}[{key}]" if prefix else str(key), out)
+    elif isinstance(value, (list, tuple)):
+        for index, item in enumerate(value):
+            _flatten_params(item, f"{prefix}[{index}]", out)
+    elif value is not None:
+        out.append((prefix, value))
+
+
+def build_query(params: dict) -> str:
+    """Кодирует вложенные параметры в формат запроса Bitrix24 (fields[PHONE][0][VALUE]=...)"""
+    pairs = []
+    _flatten_params(params, "", pairs)
+    return urlencode(pairs)
+
+
+def bitrix_batch(commands: dict[str, tuple[str, dict]]) -> tuple[dict, dict]:
+    """
+    Выполняет команды через метод batch порциями по BATCH_LIMIT.
+
+    Args:
+        commands: ключ команды -> (метод, параметры)
+
+    Returns:
+        tuple: (результаты по ключам, ошибки по ключам)
+    """
+    results, errors = {}, {}
+    keys = list(commands)
+    for start in range(0, len(keys), BATCH_LIMIT):
+        chunk = keys[start:start + BATCH_LIMIT]
+        response = bitrix_post(
+            "batch",
+            {
+                "halt": 0,
+                "cmd": {
+                    key: f"{commands[key][0]}?{build_query(commands[key][1])}"
+                    for key in chunk
+                },
+            },
+        )
+        response.raise_for_status()
+        batch_result = response.json().get("result", {})
+        results.update(batch_result.get("result") or {})
+        errors.update(batch_result.get("result_error") or {})
+    return results, errors
+
+
+def warm_up() -> None:
+    """Устанавливает keep-alive соединение с порталом (лёгкий вызов server.time)"""
+    response = bitrix_get("server.time")
+    response.raise_for_status()
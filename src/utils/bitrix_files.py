@@ -0,0 +1,31 @@
+"""
+Модуль bitrix_files.py
+======================
+
+Метаданные файлов диска Bitrix24 (disk.file.get) с кэшированием
+в общем для рабочих процессов кэше.
+"""
+
+from config import FILE_METADATA_TTL_SECONDS
+from src.utils import shared_cache
+from src.utils.bitrix import bitrix_get
+
+
+def _load_file_metadata(file_id) -> dict:
+    response = bitrix_get("disk.file.get", {"id": file_id})
+    response.raise_for_status()
+    return response.json().get("result", {})
+
+
+def get_file_metadata(file_id) -> dict:
+    """
+    Возвращает метаданные файла (NAME, DOWNLOAD_URL, SIZE, ...).
+
+    Raises:
+        requests.RequestException: При ошибке Bitrix24 и отсутствии записи в кэше
+    """
+    return shared_cache.get_json_or_refresh(
+        f"disk.file:{file_id}",
+        FILE_METADATA_TTL_SECONDS,
+        lambda: _load_file_metadata(file_id),
+    )
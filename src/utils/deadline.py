@@ -0,0 +1,88 @@
+"""
+Модуль deadline.py
+==================
+
+Сквозной бюджет времени на обработку запроса.
+
+Middleware (main.py) открывает бюджет в начале запроса по таблице
+REQUEST_DEADLINES; вызовы Bitrix24 и SQL-запросы берут свой таймаут из
+оставшегося времени через contextvar. Если бюджет исчерпан, запрос
+завершается ответом 504.
+"""
+
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from config import REQUEST_DEADLINE_DEFAULT_SECONDS, REQUEST_DEADLINES
+
+
+class DeadlineExceeded(Exception):
+    """Бюджет времени запроса исчерпан"""
+
+
+@dataclass
+class Deadline:
+    expires_at: float
+    exceeded: bool = False
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+_current: ContextVar[Deadline | None] = ContextVar("request_deadline", default=None)
+
+
+def deadline_for_path(path: str) -> float:
+    """Бюджет маршрута по самому длинному совпавшему префиксу"""
+    matches = [prefix for prefix in REQUEST_DEADLINES if path.startswith(prefix)]
+    if not matches:
+        return REQUEST_DEADLINE_DEFAULT_SECONDS
+    return REQUEST_DEADLINES[max(matches, key=len)]
+
+
+def start(seconds: float):
+    """Открывает бюджет для текущего контекста; возвращает токен для reset"""
+    return _current.set(Deadline(expires_at=time.monotonic() + seconds))
+
+
+def reset(token) -> None:
+    _current.reset(token)
+
+
+def clear() -> None:
+    """Снимает бюджет (фоновые задачи не ограничены временем исходного запроса)"""
+    _current.set(None)
+
+
+def current() -> Deadline | None:
+    return _current.get()
+
+
+def mark_exceeded() -> None:
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.exceeded = True
+
+
+def remaining() -> float | None:
+    """
+    Оставшееся время бюджета в секундах; None, если бюджета нет.
+
+    Raises:
+        DeadlineExceeded: Если бюджет уже исчерпан
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return None
+    left = deadline.expires_at - time.monotonic()
+    if left <= 0:
+        deadline.exceeded = True
+        raise DeadlineExceeded("Превышено время обработки запроса")
+    return left
+
+
+def timeout(cap: float) -> float:
+    """Таймаут внешнего вызова: оставшийся бюджет, но не больше cap"""
+    left = remaining()
+    return cap if left is None else min(left, cap)
@@ -0,0 +1,135 @@
+"""
+Модуль executors.py
+===================
+
+Раздельные пулы потоков для блокирующей работы обработчиков запросов.
+
+Обработчики не выполняют блокирующие вызовы в event loop и не делят общий
+пул потоков: у каждого класса зависимостей свой пул (EXECUTOR_LIMITS):
+- "db"     — запросы к MySQL;
+- "bitrix" — вызовы REST API Bitrix24;
+- "cpu"    — хеширование паролей (bcrypt) и окна попыток входа в общем
+  кэше (блокировка файла);
+- "files"  — передача вложений из Bitrix24 (долгие загрузки не занимают
+  потоки "bitrix").
+
+Очередь каждого пула ограничена: если заняты все потоки и места в очереди,
+задача сразу отклоняется ответом 503. Так зависший Bitrix24 занимает только
+потоки своего пула, а запросы к БД продолжают обслуживаться.
+
+Задача выполняется в копии контекста вызывающего кода, поэтому бюджет
+времени запроса (utils.deadline) и контекст логирования сохраняются.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, TypeVar
+from fastapi import HTTPException
+from config import EXECUTOR_LIMITS
+from .hedging import LatencyTracker
+
+T = TypeVar("T")
+
+
+class ExecutorSaturated(HTTPException):
+    """Все потоки и очередь пула заняты"""
+
+    def __init__(self, name: str):
+        super().__init__(
+            status_code=503,
+            detail="Сервис перегружен. Повторите запрос позже",
+            headers={"Retry-After": "1"},
+        )
+        self.name = name
+
+
+class BoundedExecutor:
+    """Пул потоков с ограниченной очередью и метриками ожидания"""
+
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-executor")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._waits = LatencyTracker()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, fn: Callable[..., T], *args, **kwargs) -> Future:
+        """
+        Ставит задачу в пул.
+
+        Raises:
+            ExecutorSaturated: Если нет свободного потока и места в очереди
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ExecutorSaturated(self.name)
+        context = contextvars.copy_context()
+        enqueued_at = time.monotonic()
+        with self._lock:
+            self.queued += 1
+
+        def task():
+            self._waits.record(time.monotonic() - enqueued_at)
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+            try:
+                return context.run(fn, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                self._slots.release()
+
+        try:
+            return self._executor.submit(task)
+        except BaseException:
+            with self._lock:
+                self.queued -= 1
+            self._slots.release()
+            raise
+
+    def metrics(self) -> dict:
+        wait_p50 = self._waits.percentile(50)
+        wait_p95 = self._waits.percentile(95)
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_p50_ms": None if wait_p50 is None else round(wait_p50 * 1000, 1),
+                "wait_p95_ms": None if wait_p95 is None else round(wait_p95 * 1000, 1),
+            }
+
+
+executors = {
+    name: BoundedExecutor(name, workers, queue_size)
+    for name, (workers, queue_size) in EXECUTOR_LIMITS.items()
+}
+
+
+async def run(name: str, fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Выполняет блокирующую функцию в пуле name и ожидает результат.
+
+    Raises:
+        ExecutorSaturated: Если пул перегружен (ответ 503)
+    """
+    return await asyncio.wrap_future(executors[name].submit(fn, *args, **kwargs))
+
+
+def metrics() -> dict:
+    return {name: executor.metrics() for name, executor in executors.items()}
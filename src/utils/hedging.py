@@ -0,0 +1,172 @@
+"""
+Модуль hedging.py
+=================
+
+Хеджирование идемпотентных вызовов для снижения хвостовых задержек.
+
+Если первая попытка не ответила за адаптивную задержку (заданный перцентиль
+недавних задержек этого же метода, включая ошибки и таймауты), отправляется
+вторая с таймаутом по оставшемуся бюджету запроса. Используется первый
+успешный ответ; ответ другой попытки — только если первая завершилась
+ошибкой. Проигравшая попытка отменяется, если ещё не началась, иначе её
+ответ закрывается и отбрасывается.
+
+Число дополнительных попыток ограничено бюджетом: каждый вызов пополняет его
+на BITRIX_HEDGE_BUDGET_RATIO, каждая дополнительная попытка расходует единицу.
+Так добавочная нагрузка на портал не превышает заданной доли запросов.
+"""
+
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, TypeVar
+from config import (
+    BITRIX_POOL_SIZE,
+    BITRIX_HEDGE_PERCENTILE,
+    BITRIX_HEDGE_MIN_DELAY_SECONDS,
+    BITRIX_HEDGE_BUDGET_RATIO,
+    BITRIX_HEDGE_BUDGET_BURST,
+)
+
+T = TypeVar("T")
+
+# Число последних замеров на метод и минимум замеров для расчёта задержки
+_WINDOW = 500
+_MIN_SAMPLES = 20
+
+_executor = ThreadPoolExecutor(max_workers=BITRIX_POOL_SIZE, thread_name_prefix="hedge")
+
+
+class LatencyTracker:
+    """Скользящее окно задержек одного метода"""
+
+    def __init__(self, window: int = _WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """Перцентиль q (0–100); None, пока замеров недостаточно"""
+        with self._lock:
+            if len(self._samples) < _MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1)
+        return ordered[max(index, 0)]
+
+
+class HedgeBudget:
+    """Бюджет дополнительных попыток (token bucket, пополняемый вызовами)"""
+
+    def __init__(self, ratio: float, burst: float):
+        self._ratio = ratio
+        self._burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def on_call(self) -> None:
+        with self._lock:
+            self._tokens = min(self._burst, self._tokens + self._ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+budget = HedgeBudget(BITRIX_HEDGE_BUDGET_RATIO, BITRIX_HEDGE_BUDGET_BURST)
+_trackers: dict[str, LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def _tracker(key: str) -> LatencyTracker:
+    with _trackers_lock:
+        return _trackers.setdefault(key, LatencyTracker())
+
+
+def hedge_delay(key: str) -> float | None:
+    """Задержка перед второй попыткой; None, пока по методу мало замеров"""
+    value = _tracker(key).percentile(BITRIX_HEDGE_PERCENTILE)
+    return None if value is None else max(value, BITRIX_HEDGE_MIN_DELAY_SECONDS)
+
+
+def _timed(tracker: LatencyTracker, attempt: Callable[[], T]) -> T:
+    started = time.monotonic()
+    try:
+        return attempt()
+    finally:
+        # Ошибки и таймауты учитываются наравне с ответами: иначе медленные
+        # отказы не попадают в перцентиль и задержка хеджирования занижается
+        tracker.record(time.monotonic() - started)
+
+
+def _submit(tracker: LatencyTracker, attempt: Callable[[], T]) -> Future:
+    # Попытка видит contextvars вызывающего (в т.ч. бюджет времени запроса)
+    context = contextvars.copy_context()
+    return _executor.submit(context.run, _timed, tracker, attempt)
+
+
+def _discard(future: Future, on_discard: Callable[[T], None] | None) -> None:
+    """Отменяет проигравшую попытку или освобождает её результат по завершении"""
+    if future.cancel() or on_discard is None:
+        return
+
+    def release(done: Future) -> None:
+        if not done.cancelled() and done.exception() is None:
+            on_discard(done.result())
+
+    future.add_done_callback(release)
+
+
+def hedged_call(
+    key: str,
+    attempt: Callable[[], T],
+    on_discard: Callable[[T], None] | None = None,
+) -> T:
+    """
+    Выполняет идемпотентный вызов с хеджированием.
+
+    attempt вызывается заново для каждой попытки, поэтому таймаут, рассчитанный
+    в нём по бюджету запроса, у второй попытки учитывает уже прошедшее время.
+
+    Args:
+        key: ключ статистики задержек (например, имя метода Bitrix24)
+        attempt: функция одной попытки
+        on_discard: освобождение результата проигравшей попытки (например, закрытие ответа)
+
+    Returns:
+        Результат попытки, первой завершившейся успешно; ошибка — только если
+        неудачны все попытки
+    """
+    tracker = _tracker(key)
+    budget.on_call()
+    delay = hedge_delay(key)
+    if delay is None:
+        return _timed(tracker, attempt)
+
+    first = _submit(tracker, attempt)
+    done, _ = wait([first], timeout=delay)
+    if done or not budget.try_spend():
+        return first.result()
+
+    pending = {first, _submit(tracker, attempt)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for loser in pending:
+                    _discard(loser, on_discard)
+                for other in done - {future}:
+                    _discard(other, on_discard)
+                return future.result()
+            error = error or future.exception()
+    raise error
@@ -0,0 +1,90 @@
+"""
+Модуль http_cache.py
+====================
+
+Этот модуль предоставляет утилиты для условных HTTP-ответов.
+
+Функционал:
+- Вычисление сильного ETag по содержимому ответа
+- Проверка заголовка If-None-Match
+- Формирование ответов 304 Not Modified и JSON-ответов с валидаторами кэша
+"""
+
+import hashlib
+import json
+from fastapi import Request
+from fastapi.responses import Response
+
+# Cache-Control для персональных данных: браузер хранит ответ, но всегда перепроверяет
+PRIVATE_REVALIDATE = "private, no-cache"
+
+
+def serialize_json(content) -> bytes:
+    """Сериализация содержимого в JSON так же, как это делает JSONResponse"""
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        default=str,
+    ).encode("utf-8")
+
+
+def make_etag(payload) -> str:
+    """Сильный ETag по байтам или по JSON-представлению объекта"""
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        data = bytes(payload)
+    else:
+        data = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Проверяет, совпадает ли ETag с одним из значений If-None-Match"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Для If-None-Match используется слабое сравнение (RFC 9110)
+    candidates = [value.strip().removeprefix("W/") for value in header.split(",")]
+    return etag in candidates
+
+
+def not_modified(etag: str, cache_control: str = PRIVATE_REVALIDATE) -> Response:
+    """Ответ 304 Not Modified с валидаторами кэша"""
+    return Response(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
+
+
+def conditional_body_response(
+    request: Request,
+    body: bytes,
+    etag: str | None = None,
+    cache_control: str = PRIVATE_REVALIDATE,
+    media_type: str = "application/json",
+) -> Response:
+    """Отдаёт готовое тело ответа или 304, если клиент уже имеет эту версию"""
+    etag = etag or make_etag(body)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    return Response(
+        content=bytes(body),
+        media_type=media_type,
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
+
+
+def conditional_json_response(
+    request: Request,
+    content,
+    etag: str | None = None,
+    cache_control: str = PRIVATE_REVALIDATE,
+) -> Response:
+    """JSON-ответ с ETag и Cache-Control либо 304 при совпадении If-None-Match"""
+    if etag and etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    return conditional_body_response(request, serialize_json(content), etag, cache_control)
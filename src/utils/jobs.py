@@ -0,0 +1,203 @@
+"""
+Модуль jobs.py
+==============
+
+Учёт фоновых задач в таблице jobs (migrations/001_jobs.sql).
+
+Состояние задачи хранится в MySQL, поэтому статус можно запросить
+у любого рабочего процесса, а не только у того, что выполняет задачу.
+"""
+
+import json
+import uuid
+from database import connect_to_db
+
+
+def create_job(kind: str, user_id: int | None = None, company_id: int | None = None, payload=None) -> str:
+    """Создаёт задачу в статусе queued и возвращает её идентификатор"""
+    job_id = uuid.uuid4().hex
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT INTO jobs (id, kind, status, user_id, company_id, payload)
+               VALUES (%s, %s, 'queued', %s, %s, %s)""",
+            (
+                job_id,
+                kind,
+                user_id,
+                company_id,
+                json.dumps(payload, ensure_ascii=False) if payload is not None else None,
+            ),
+        )
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return job_id
+
+
+def update_job(job_id: str, status: str, result=None, error: str | None = None) -> None:
+    """Обновляет статус задачи и, при наличии, её результат"""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """UPDATE jobs
+               SET status = %s,
+                   result = COALESCE(%s, result),
+                   error = %s,
+                   attempts = attempts + IF(%s = 'running', 1, 0)
+               WHERE id = %s""",
+            (
+                status,
+                json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                error,
+                status,
+                job_id,
+            ),
+        )
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def get_job(job_id: str) -> dict | None:
+    """Возвращает задачу без полезной нагрузки или None"""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            """SELECT id, kind, status, user_id, company_id, result, attempts, error,
+                      created_at, updated_at
+               FROM jobs WHERE id = %s""",
+            (job_id,),
+        )
+        job = cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+    if job and isinstance(job["result"], (str, bytes)):
+        job["result"] = json.loads(job["result"])
+    return job
+
+
+def update_job_payload(job_id: str, payload) -> None:
+    """Сохраняет полезную нагрузку задачи (например, промежуточный результат шага)"""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE jobs SET payload = %s WHERE id = %s",
+            (json.dumps(payload, ensure_ascii=False), job_id),
+        )
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def claim_job(job_id: str, stale_seconds: int | None = None) -> dict | None:
+    """
+    Атомарно переводит задачу в running и возвращает её вместе с полезной нагрузкой.
+
+    Задачу в статусе queued может забрать только один процесс. Если задан
+    stale_seconds, забирается и задача в running, не обновлявшаяся дольше этого
+    времени (процесс-исполнитель завершился, не доведя её до конца).
+
+    Returns:
+        dict | None: Задача или None, если её уже забрал другой процесс
+    """
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            """UPDATE jobs
+               SET status = 'running', attempts = attempts + 1
+               WHERE id = %s
+                 AND (status = 'queued'
+                      OR (%s IS NOT NULL AND status = 'running'
+                          AND updated_at < NOW() - INTERVAL %s SECOND))""",
+            (job_id, stale_seconds, stale_seconds or 0),
+        )
+        claimed = cursor.rowcount == 1
+        conn.commit()
+        job = None
+        if claimed:
+            cursor.execute(
+                "SELECT id, kind, user_id, company_id, payload, attempts FROM jobs WHERE id = %s",
+                (job_id,),
+            )
+            job = cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+    if job and job["payload"]:
+        job["payload"] = json.loads(job["payload"])
+    return job
+
+
+def list_unfinished_jobs(kind: str, stale_seconds: int, queued_after_seconds: int = 0) -> list[str]:
+    """
+    Задачи вида kind, зависшие в running дольше stale_seconds, и задачи
+    в очереди без обновлений дольше queued_after_seconds (0 — все в очереди)
+    """
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT id FROM jobs
+               WHERE kind = %s
+                 AND ((status = 'queued' AND updated_at <= NOW() - INTERVAL %s SECOND)
+                      OR (status = 'running' AND updated_at < NOW() - INTERVAL %s SECOND))
+               ORDER BY created_at""",
+            (kind, queued_after_seconds, stale_seconds),
+        )
+        job_ids = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+    finally:
+        conn.close()
+    return job_ids
+
+
+def list_job_payloads(kind: str, company_id: int, status: str) -> list:
+    """Полезная нагрузка задач вида kind компании в статусе status (новые первыми)"""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT payload FROM jobs
+               WHERE kind = %s AND company_id = %s AND status = %s AND payload IS NOT NULL
+               ORDER BY created_at DESC""",
+            (kind, company_id, status),
+        )
+        payloads = [json.loads(row[0]) for row in cursor.fetchall()]
+        cursor.close()
+    finally:
+        conn.close()
+    return payloads
+
+
+def fail_stale_jobs(kind: str, stale_seconds: int, error: str) -> int:
+    """
+    Помечает как failed задачи вида kind в queued или running, не обновлявшиеся
+    дольше stale_seconds (процесс-исполнитель завершился). Возвращает их число.
+    """
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """UPDATE jobs
+               SET status = 'failed', error = %s
+               WHERE kind = %s
+                 AND status IN ('queued', 'running')
+                 AND updated_at < NOW() - INTERVAL %s SECOND""",
+            (error, kind, stale_seconds),
+        )
+        count = cursor.rowcount
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return count
@@ -6,14 +6,18 @@
 
 Функционал:
 - Создание JWT-токена
+- Формирование данных токена из записи пользователя
 - Декодирование JWT-токена
 - Извлечение токена из cookies
+- Проверка отзыва токена по jti (utils.token_revocation, без обращения к БД)
 """
 
 from fastapi import Request, HTTPException
 import jwt
+import uuid
 from datetime import datetime, timedelta, timezone
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from src.utils import token_revocation
 
 def create_access_token(data: dict, expires_delta: int = None):
     """Создание JWT-токена"""
@@ -21,19 +25,36 @@ def create_access_token(data: dict, expires_delta: int = None):
     expire = datetime.now(timezone.utc) + timedelta(
         minutes=expires_delta or ACCESS_TOKEN_EXPIRE_MINUTES
     )
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def user_token_claims(user: dict) -> dict:
+    """Данные access-токена по записи пользователя из таблицы users"""
+    return {
+        "sub": user["email"],
+        "user_id": user["id"],
+        "user_type": user["user_type"],
+        "role": user["role"],
+        "first_name": user["first_name"],
+        "second_name": user["second_name"],
+        "last_name": user["last_name"],
+        "contact_id": user["contact_id"],
+        "company_id": user.get("company_id"),
+        "department_id": user.get("department_id"),
+    }
+
 def decode_access_token(token: str):
     """Декодирование JWT-токена"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Токен истёк")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Невалидный токен")
+    if payload.get("jti") and token_revocation.is_revoked(payload["jti"]):
+        raise HTTPException(status_code=401, detail="Токен отозван")
+    return payload
 
 def get_token(request: Request):
     """Получение JWT-токена из cookies"""
@@ -0,0 +1,129 @@
+"""
+Модуль load_shedding.py
+=======================
+
+Ограничение числа одновременно обрабатываемых запросов по группам маршрутов.
+
+Группа маршрута определяется по самому длинному совпавшему префиксу пути
+(CONCURRENCY_ROUTE_GROUPS), лимиты группы — в CONCURRENCY_LIMITS: число
+запросов в обработке и длина очереди ожидания. Запрос, для которого нет места
+в очереди или который не дождался слота за CONCURRENCY_QUEUE_TIMEOUT_SECONDS,
+сразу получает 503 с Retry-After. Так замедление Bitrix24 занимает только
+слоты своей группы и не мешает маршрутам, работающим с БД.
+
+Лимиты действуют в пределах рабочего процесса. Маршруты без группы
+(в том числе /health) не ограничиваются.
+"""
+
+import asyncio
+import json
+import math
+from config import (
+    CONCURRENCY_LIMITS,
+    CONCURRENCY_QUEUE_TIMEOUT_SECONDS,
+    CONCURRENCY_ROUTE_GROUPS,
+)
+
+
+class _Limiter:
+    def __init__(self, limit: int, queue_size: int):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self, timeout: float) -> bool:
+        """Занимает слот; False — нет места в очереди или истекло ожидание"""
+        if self._semaphore.locked() and self.waiting >= self.queue_size:
+            self.rejected += 1
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+_limiters: dict[str, _Limiter] = {}
+
+
+def group_for_path(path: str) -> str | None:
+    """Группа маршрута по самому длинному совпавшему префиксу"""
+    matches = [prefix for prefix in CONCURRENCY_ROUTE_GROUPS if path.startswith(prefix)]
+    if not matches:
+        return None
+    return CONCURRENCY_ROUTE_GROUPS[max(matches, key=len)]
+
+
+def _limiter(group: str) -> _Limiter:
+    limiter = _limiters.get(group)
+    if limiter is None:
+        limit, queue_size = CONCURRENCY_LIMITS[group]
+        limiter = _limiters[group] = _Limiter(limit, queue_size)
+    return limiter
+
+
+def metrics() -> dict:
+    """Состояние групп текущего процесса"""
+    return {
+        group: {
+            "limit": limiter.limit,
+            "queue_size": limiter.queue_size,
+            "in_flight": limiter.in_flight,
+            "waiting": limiter.waiting,
+            "rejected": limiter.rejected,
+        }
+        for group, limiter in _limiters.items()
+    }
+
+
+async def _reject(send) -> None:
+    body = json.dumps(
+        {"detail": "Сервис перегружен. Повторите запрос позже"}, ensure_ascii=False
+    ).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(CONCURRENCY_QUEUE_TIMEOUT_SECONDS))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class LoadSheddingMiddleware:
+    """
+    ASGI-middleware: слот занят до полного завершения ответа, поэтому
+    потоковые выгрузки учитываются всё время передачи данных.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        group = group_for_path(scope["path"]) if scope["type"] == "http" else None
+        if group is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        limiter = _limiter(group)
+        if not await limiter.acquire(CONCURRENCY_QUEUE_TIMEOUT_SECONDS):
+            await _reject(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -0,0 +1,140 @@
+"""
+Модуль logs.py
+==============
+
+Структурированное логирование в JSON без блокировки обработки запроса.
+
+- Записи форматируются в JSON и кладутся в очередь (QueueHandler); запись
+  в stdout выполняет отдельный поток (QueueListener), поэтому код запроса
+  не ждёт ввода-вывода.
+- Каждая запись дополняется request_id и маршрутом текущего запроса
+  (contextvar, заполняется middleware в main.py).
+- Внешние вызовы (Bitrix24) учитываются в сводке запроса: число вызовов,
+  суммарное время и число ошибок попадают в запись access-лога.
+- Записи уровня DEBUG проходят с вероятностью LOG_DEBUG_SAMPLE_RATE,
+  чтобы частые события не забивали лог.
+
+Дополнительные поля записи передаются через extra={"fields": {...}}.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from config import LOG_LEVEL, LOG_DEBUG_SAMPLE_RATE
+
+
+@dataclass
+class RequestContext:
+    request_id: str
+    route: str
+    # Сводка внешних вызовов: сервис -> {"calls", "errors", "seconds"}
+    upstream: dict = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+_request: ContextVar[RequestContext | None] = ContextVar("log_request", default=None)
+_listener: logging.handlers.QueueListener | None = None
+
+
+def bind_request(request_id: str, route: str):
+    """Открывает контекст логирования запроса; возвращает токен для reset"""
+    return _request.set(RequestContext(request_id=request_id, route=route))
+
+
+def reset_request(token) -> None:
+    _request.reset(token)
+
+
+def current_request() -> RequestContext | None:
+    return _request.get()
+
+
+def record_upstream(service: str, seconds: float, ok: bool) -> None:
+    """Учитывает внешний вызов в сводке текущего запроса"""
+    context = _request.get()
+    if context is None:
+        return
+    # Вызовы одного запроса могут идти из нескольких потоков (хеджирование)
+    with context.lock:
+        summary = context.upstream.setdefault(service, {"calls": 0, "errors": 0, "seconds": 0.0})
+        summary["calls"] += 1
+        summary["errors"] += 0 if ok else 1
+        summary["seconds"] = round(summary["seconds"] + seconds, 4)
+
+
+class _ContextFilter(logging.Filter):
+    """Добавляет к записи контекст запроса и прореживает DEBUG-записи"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG and random.random() >= LOG_DEBUG_SAMPLE_RATE:
+            return False
+        context = _request.get()
+        record.request_id = context.request_id if context else None
+        record.route = context.route if context else None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+            entry["route"] = record.route
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # В очередь уходит готовая строка: исключение и аргументы уже
+        # отформатированы в потоке запроса, поток записи только выводит её
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = self.format(record)
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+
+def setup() -> None:
+    """Настраивает корневой логгер процесса (идемпотентно)"""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(_ContextFilter())
+    handler.setFormatter(JsonFormatter())
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter("%(message)s"))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+
+
+def stop() -> None:
+    """Дописывает накопленные записи и останавливает поток вывода"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
@@ -0,0 +1,165 @@
+"""
+Модуль prepared.py
+==================
+
+Реестр часто выполняемых SQL-запросов, подготавливаемых на сервере.
+
+Каждый запрос из STATEMENTS подготавливается (COM_STMT_PREPARE) один раз
+на соединение пула и далее выполняется по идентификатору с параметрами
+в двоичном протоколе: сервер не разбирает и не планирует текст заново,
+а текст запроса не передаётся при каждом вызове.
+
+Пул не сбрасывает сессию при возврате соединения (это удалило бы
+подготовленные запросы), вместо этого database.connect_to_db откатывает
+незавершённую транзакцию при выдаче соединения.
+
+Метрики по каждому запросу (metrics()): число выполнений и подготовок,
+суммарное время выполнения и подготовки, оценка сэкономленного времени
+разбора и байт текста запроса.
+"""
+
+import threading
+import time
+import mysql.connector
+from mysql.connector import errorcode
+
+STATEMENTS = {
+    # Вход: поиск пользователя по email или телефону
+    "user_by_login": "SELECT * FROM users WHERE email = %s OR phone = %s",
+    # Данные access-токена при обмене refresh-токена
+    "user_for_token": "SELECT * FROM users WHERE id = %s",
+    # Профиль пользователя (/user/get-info и /personal_account/physical/get-info)
+    "user_by_id": (
+        "SELECT id, user_type, role, first_name, second_name, last_name, "
+        "phone, email, contact_id, company_id, balance, created_at "
+        "FROM users WHERE id = %s"
+    ),
+    # Регистрация сотрудника по токену приглашения
+    "company_by_invite_token": (
+        "SELECT id, name, bitrix_company_id FROM companies WHERE invite_token = %s"
+    ),
+    # История транзакций пользователя
+    "transactions_by_user": (
+        "SELECT id, amount, transaction_type, created_at FROM transactions WHERE user_id = %s"
+    ),
+}
+
+# Ошибки, после которых подготовленный запрос нужно подготовить заново
+_STALE_STATEMENT_ERRORS = {errorcode.ER_UNKNOWN_STMT_HANDLER, errorcode.ER_NEED_REPREPARE}
+
+
+class _Stats:
+    __slots__ = ("executions", "prepares", "execute_seconds", "prepare_seconds", "reused", "text_bytes")
+
+    def __init__(self):
+        self.executions = 0
+        self.prepares = 0
+        self.execute_seconds = 0.0
+        self.prepare_seconds = 0.0
+        self.reused = 0
+        self.text_bytes = 0
+
+
+_stats = {name: _Stats() for name in STATEMENTS}
+_stats_lock = threading.Lock()
+
+
+def _raw_connection(conn):
+    # Подготовленные запросы живут на физическом соединении, а не на обёртке пула
+    return getattr(conn, "_cnx", conn)
+
+
+def _statement_cache(conn) -> dict:
+    """Курсоры подготовленных запросов соединения; сбрасываются при переподключении"""
+    raw = _raw_connection(conn)
+    cache = getattr(raw, "_bip_prepared", None)
+    if cache is None or cache.get("_connection_id") != raw.connection_id:
+        cache = {"_connection_id": raw.connection_id}
+        raw._bip_prepared = cache
+    return cache
+
+
+def _drop(conn, name: str) -> None:
+    cursor = _statement_cache(conn).pop(name, None)
+    if cursor is not None:
+        try:
+            cursor.close()
+        except mysql.connector.Error:
+            pass
+
+
+def _execute(conn, name: str, params: tuple) -> list[dict]:
+    sql = STATEMENTS[name]
+    cache = _statement_cache(conn)
+    cursor = cache.get(name)
+    prepare_seconds = 0.0
+    if cursor is None:
+        cursor = conn.cursor(prepared=True)
+        started = time.perf_counter()
+        # Курсор готовит запрос при первом execute, поэтому первое
+        # выполнение целиком учитывается как подготовка
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        prepare_seconds = time.perf_counter() - started
+        cache[name] = cursor
+        execute_seconds = 0.0
+    else:
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        execute_seconds = time.perf_counter() - started
+
+    columns = cursor.column_names
+    with _stats_lock:
+        stats = _stats[name]
+        stats.executions += 1
+        if prepare_seconds:
+            stats.prepares += 1
+            stats.prepare_seconds += prepare_seconds
+        else:
+            stats.reused += 1
+            stats.execute_seconds += execute_seconds
+            stats.text_bytes += len(sql.encode("utf-8"))
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def fetchall(conn, name: str, params: tuple = ()) -> list[dict]:
+    """Выполняет запрос реестра на соединении и возвращает строки как словари"""
+    try:
+        return _execute(conn, name, params)
+    except mysql.connector.Error as e:
+        if e.errno not in _STALE_STATEMENT_ERRORS:
+            _drop(conn, name)
+            raise
+        # Сервер забыл подготовленный запрос — готовим заново
+        _drop(conn, name)
+        return _execute(conn, name, params)
+
+
+def fetchone(conn, name: str, params: tuple = ()) -> dict | None:
+    rows = fetchall(conn, name, params)
+    return rows[0] if rows else None
+
+
+def metrics() -> dict:
+    """
+    Метрики по запросам реестра.
+
+    saved_parse_seconds — оценка: среднее время первого выполнения (с подготовкой)
+    минус среднее время повторного, умноженное на число повторных выполнений.
+    saved_text_bytes — байты текста запроса, не переданные при повторных выполнениях.
+    """
+    result = {}
+    with _stats_lock:
+        for name, stats in _stats.items():
+            avg_prepare = stats.prepare_seconds / stats.prepares if stats.prepares else 0.0
+            avg_execute = stats.execute_seconds / stats.reused if stats.reused else 0.0
+            result[name] = {
+                "executions": stats.executions,
+                "prepares": stats.prepares,
+                "avg_first_execution_ms": round(avg_prepare * 1000, 3),
+                "avg_execution_ms": round(avg_execute * 1000, 3),
+                "saved_parse_seconds": round(max(0.0, avg_prepare - avg_execute) * stats.reused, 6),
+                "saved_text_bytes": stats.text_bytes,
+            }
+    return result
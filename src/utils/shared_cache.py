@@ -0,0 +1,346 @@
+"""
+Модуль shared_cache.py
+======================
+
+Общий для всех рабочих процессов uvicorn на хосте кэш справочных данных Bitrix24.
+
+Устройство:
+- Каждая запись — отдельный файл в SHARED_CACHE_DIR (по умолчанию /dev/shm, т.е.
+  в оперативной памяти) с заголовком: версия, срок жизни, длина данных.
+- Запись выполняется во временный файл и атомарно подменяется через os.replace,
+  поэтому чтение не требует блокировок: читатель видит либо старую, либо новую
+  версию целиком.
+- Небольшие записи (меньше _MMAP_MIN_BYTES) читаются обычным чтением файла.
+  Крупные читаются через mmap: данные возвращаются как memoryview без
+  копирования, а отображение переиспользуется, пока версия на диске не
+  изменилась. Число отображений ограничено (_MAX_MAPPINGS, вытеснение LRU),
+  поэтому процесс не накапливает открытые дескрипторы.
+- Обновление устаревшей записи выполняет только один процесс (flock на lock-файле),
+  остальные в это время отдают предыдущую версию.
+- Небольшие счётчики (update_json) изменяются под тем же flock, поэтому
+  чтение-изменение-запись атомарно для всех процессов хоста.
+- sweep (вызывается фоновыми проверками) удаляет записи, истёкшие более
+  SHARED_CACHE_STALE_GRACE_SECONDS назад, их lock-файлы и брошенные
+  временные файлы.
+
+Зависимости:
+- fcntl, mmap (Linux)
+- config (SHARED_CACHE_DIR)
+"""
+
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable
+from config import SHARED_CACHE_DIR, SHARED_CACHE_STALE_GRACE_SECONDS
+
+_MAGIC = b"BIPCACHE"
+# magic, версия, момент истечения (unix time), длина данных
+_HEADER = struct.Struct("<8sQdI")
+
+# Записи меньше этого размера читаются без mmap
+_MMAP_MIN_BYTES = 64 * 1024
+# Максимальное число одновременно открытых отображений в процессе
+_MAX_MAPPINGS = 64
+# Временные файлы записи старше этого возраста считаются брошенными (секунды)
+_TMP_MAX_AGE_SECONDS = 3600
+
+# Отображения файлов в память текущего процесса (LRU): path -> (inode, mtime_ns, mmap)
+_mappings: OrderedDict[str, tuple[int, int, mmap.mmap]] = OrderedDict()
+_mappings_lock = threading.Lock()
+
+
+@dataclass
+class SharedEntry:
+    """Запись общего кэша"""
+
+    version: int
+    expires_at: float
+    data: memoryview
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.expires_at > time.time()
+
+    def json(self):
+        """Десериализация данных записи из JSON"""
+        return json.loads(self.data.tobytes())
+
+
+def _path(key: str) -> str:
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(SHARED_CACHE_DIR, digest)
+
+
+def _close_mapping(mapped: mmap.mmap) -> None:
+    try:
+        mapped.close()
+    except BufferError:
+        # На отображение ещё ссылаются выданные memoryview — оно закроется
+        # сборщиком мусора, когда они освободятся
+        pass
+
+
+def _drop_mapping(path: str) -> None:
+    with _mappings_lock:
+        cached = _mappings.pop(path, None)
+    if cached:
+        _close_mapping(cached[2])
+
+
+def _map(path: str, stat: os.stat_result) -> mmap.mmap | None:
+    """Возвращает отображение актуальной версии файла, переоткрывая его после подмены"""
+    with _mappings_lock:
+        cached = _mappings.get(path)
+        if cached and cached[0] == stat.st_ino and cached[1] == stat.st_mtime_ns:
+            _mappings.move_to_end(path)
+            return cached[2]
+        try:
+            with open(path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        evicted = [cached[2]] if cached else []
+        _mappings[path] = (stat.st_ino, stat.st_mtime_ns, mapped)
+        _mappings.move_to_end(path)
+        while len(_mappings) > _MAX_MAPPINGS:
+            evicted.append(_mappings.popitem(last=False)[1][2])
+    for old in evicted:
+        _close_mapping(old)
+    return mapped
+
+
+def _read(path: str):
+    """Содержимое файла записи (bytes или mmap); None, если файла нет"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if stat.st_size >= _MMAP_MIN_BYTES:
+        return _map(path, stat)
+    _drop_mapping(path)
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def get(key: str) -> SharedEntry | None:
+    """Чтение записи без блокировок; None, если записи нет"""
+    content = _read(_path(key))
+    if content is None or len(content) < _HEADER.size:
+        return None
+    magic, version, expires_at, length = _HEADER.unpack_from(content, 0)
+    if magic != _MAGIC or len(content) < _HEADER.size + length:
+        return None
+    data = memoryview(content)[_HEADER.size:_HEADER.size + length]
+    return SharedEntry(version=version, expires_at=expires_at, data=data)
+
+
+@contextmanager
+def _locked(key: str, blocking: bool = True):
+    """
+    flock на lock-файле записи. Отдаёт True, если блокировка захвачена
+    (при blocking=False — False, если её держит другой процесс).
+
+    sweep может удалить lock-файл; после захвата проверяется, что файл
+    на диске тот же, иначе блокировка берётся заново на новом файле.
+    """
+    os.makedirs(SHARED_CACHE_DIR, exist_ok=True)
+    lock_path = _path(key) + ".lock"
+    while True:
+        lock_fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(lock_fd)
+            yield False
+            return
+        try:
+            same_file = os.stat(lock_path).st_ino == os.fstat(lock_fd).st_ino
+        except FileNotFoundError:
+            same_file = False
+        if same_file:
+            break
+        os.close(lock_fd)
+    try:
+        yield True
+    finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+
+
+def put(key: str, data: bytes, ttl: float) -> int:
+    """Атомарная запись новой версии; возвращает номер версии"""
+    os.makedirs(SHARED_CACHE_DIR, exist_ok=True)
+    path = _path(key)
+    current = get(key)
+    version = current.version + 1 if current else 1
+    header = _HEADER.pack(_MAGIC, version, time.time() + ttl, len(data))
+    fd, tmp_path = tempfile.mkstemp(dir=SHARED_CACHE_DIR, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return version
+
+
+def delete(key: str) -> None:
+    """Удаление записи"""
+    path = _path(key)
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    _drop_mapping(path)
+
+
+def put_json(key: str, value, ttl: float) -> int:
+    """put для JSON-сериализуемых значений"""
+    return put(key, json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"), ttl)
+
+
+def get_or_refresh(key: str, ttl: float, loader: Callable[[], bytes]) -> SharedEntry:
+    """
+    Возвращает свежую запись, при необходимости обновляя её через loader.
+
+    Обновление выполняет только процесс, захвативший lock-файл записи. Остальные
+    процессы возвращают устаревшую версию, а при её отсутствии ждут обновления.
+    Если loader завершился ошибкой, но устаревшая версия есть — возвращается она.
+    """
+    entry = get(key)
+    if entry and entry.is_fresh:
+        return entry
+
+    if entry is not None:
+        # Другой процесс уже обновляет запись — отдаём предыдущую версию
+        with _locked(key, blocking=False) as acquired:
+            if acquired:
+                return _refresh(key, ttl, loader, entry)
+        return entry
+    with _locked(key):
+        return _refresh(key, ttl, loader, entry)
+
+
+def _refresh(key: str, ttl: float, loader: Callable[[], bytes], stale: SharedEntry | None) -> SharedEntry:
+    """Обновление записи под блокировкой (см. get_or_refresh)"""
+    # Пока ждали блокировку, запись мог обновить другой процесс
+    entry = get(key)
+    if entry and entry.is_fresh:
+        return entry
+    try:
+        data = loader()
+    except Exception:
+        if entry is not None:
+            return entry
+        if stale is not None:
+            return stale
+        raise
+    put(key, data, ttl)
+    return get(key)
+
+
+def get_json_or_refresh(key: str, ttl: float, loader: Callable[[], object]):
+    """get_or_refresh для JSON-сериализуемых значений"""
+    entry = get_or_refresh(
+        key,
+        ttl,
+        lambda: json.dumps(loader(), ensure_ascii=False, default=str).encode("utf-8"),
+    )
+    return entry.json()
+
+
+def update_json(key: str, ttl: float, update: Callable[[object], object]):
+    """
+    Атомарно изменяет JSON-запись между процессами: update получает текущее
+    значение (None, если записи нет или она устарела) и возвращает новое.
+    """
+    with _locked(key):
+        entry = get(key)
+        value = update(entry.json() if entry and entry.is_fresh else None)
+        put_json(key, value, ttl)
+        return value
+
+
+def _expires_at(path: str) -> float | None:
+    """Момент истечения записи по заголовку файла; None — файл не является записью"""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < _HEADER.size:
+        return None
+    magic, _, expires_at, _ = _HEADER.unpack(header)
+    return expires_at if magic == _MAGIC else None
+
+
+def sweep() -> int:
+    """
+    Удаляет записи, истёкшие более SHARED_CACHE_STALE_GRACE_SECONDS назад,
+    lock-файлы без записей и брошенные временные файлы. Возвращает число
+    удалённых файлов.
+    """
+    try:
+        names = os.listdir(SHARED_CACHE_DIR)
+    except FileNotFoundError:
+        return 0
+    now = time.time()
+    present = set(names)
+    removed = 0
+    for name in names:
+        path = os.path.join(SHARED_CACHE_DIR, name)
+        try:
+            if name.startswith(".tmp-"):
+                if now - os.stat(path).st_mtime > _TMP_MAX_AGE_SECONDS:
+                    os.unlink(path)
+                    removed += 1
+            elif name.endswith(".lock"):
+                if name[:-len(".lock")] not in present:
+                    removed += _unlink_lock(path)
+            else:
+                expires_at = _expires_at(path)
+                if expires_at is not None and expires_at + SHARED_CACHE_STALE_GRACE_SECONDS < now:
+                    os.unlink(path)
+                    _drop_mapping(path)
+                    removed += 1 + _unlink_lock(path + ".lock")
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def _unlink_lock(lock_path: str) -> int:
+    """Удаляет lock-файл, если его никто не держит"""
+    try:
+        lock_fd = os.open(lock_path, os.O_RDWR)
+    except FileNotFoundError:
+        return 0
+    try:
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        # Ожидающие этот файл процессы после захвата увидят подмену и
+        # откроют новый lock-файл (см. _locked)
+        os.unlink(lock_path)
+        return 1
+    except FileNotFoundError:
+        return 0
+    finally:
+        os.close(lock_fd)
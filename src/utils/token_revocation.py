@@ -0,0 +1,150 @@
+"""
+Модуль token_revocation.py
+==========================
+
+Отзыв access-токенов по jti (таблица revoked_tokens, migrations/008).
+
+Каждый рабочий процесс держит в памяти множество отозванных jti и
+подгружает новые записи фоновым потоком каждые TOKEN_REVOCATION_REFRESH_SECONDS
+запросом по первичному ключу (id > последнего загруженного). Проверка
+токена (is_revoked) — поиск в множестве без обращения к БД.
+
+id выделяется при вставке, а видимой запись становится при commit, поэтому
+запись с меньшим id может появиться после уже прочитанной записи с большим.
+Каждая подгрузка повторно читает последние _OVERLAP_ROWS id до отметки,
+чтобы такие записи не терялись до полной перестройки.
+
+Токен, отозванный в текущем процессе, попадает в множество сразу; в остальных
+процессах — не позже чем через интервал обновления. Раз в
+TOKEN_REVOCATION_REBUILD_SECONDS множество перечитывается целиком, чтобы
+отбросить истёкшие токены.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from config import TOKEN_REVOCATION_REFRESH_SECONDS, TOKEN_REVOCATION_REBUILD_SECONDS
+from database import connect_to_db
+
+# Число записей, читаемых за один запрос при подгрузке
+_BATCH_SIZE = 5000
+# Сколько последних id перечитывается при каждой подгрузке
+_OVERLAP_ROWS = 500
+
+_revoked: set[str] = set()
+_last_id = 0
+_loaded_at = 0.0
+_load_lock = threading.Lock()
+_thread: threading.Thread | None = None
+_stop = threading.Event()
+
+
+def is_revoked(jti: str) -> bool:
+    """Проверка отзыва токена (без обращения к БД)"""
+    return jti in _revoked
+
+
+def _load(after_id: int, target: set[str]) -> int:
+    """Подгружает действующие отзывы с id > after_id; возвращает последний id"""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute(
+                """SELECT id, jti FROM revoked_tokens
+                   WHERE id > %s AND expires_at > UTC_TIMESTAMP()
+                   ORDER BY id LIMIT %s""",
+                (after_id, _BATCH_SIZE),
+            )
+            rows = cursor.fetchall()
+            for row_id, jti in rows:
+                target.add(jti)
+            if rows:
+                after_id = rows[-1][0]
+            if len(rows) < _BATCH_SIZE:
+                break
+        cursor.close()
+    finally:
+        conn.close()
+    return after_id
+
+
+def refresh() -> None:
+    """Инкрементальная подгрузка; периодически — полная перестройка множества"""
+    global _revoked, _last_id, _loaded_at
+    with _load_lock:
+        if time.monotonic() - _loaded_at >= TOKEN_REVOCATION_REBUILD_SECONDS:
+            rebuilt: set[str] = set()
+            last_id = _load(0, rebuilt)
+            # Отзывы этого процесса, сделанные во время перестройки, уже в БД
+            # (id меньше last_id) либо будут подгружены следующим обновлением
+            _revoked, _last_id, _loaded_at = rebuilt, last_id, time.monotonic()
+        else:
+            _last_id = max(_last_id, _load(max(0, _last_id - _OVERLAP_ROWS), _revoked))
+
+
+def revoke(jti: str, expires_at: int | None) -> None:
+    """Отзывает токен до истечения его срока действия (exp)"""
+    expires = (
+        datetime.fromtimestamp(expires_at, tz=timezone.utc).replace(tzinfo=None)
+        if expires_at else datetime.utcnow()
+    )
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT IGNORE INTO revoked_tokens (jti, expires_at) VALUES (%s, %s)",
+            (jti, expires),
+        )
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    _revoked.add(jti)
+
+
+def purge_expired() -> int:
+    """Удаляет истёкшие записи из таблицы; возвращает их число"""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM revoked_tokens WHERE expires_at < UTC_TIMESTAMP()")
+        deleted = cursor.rowcount
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return deleted
+
+
+def _run() -> None:
+    while not _stop.wait(TOKEN_REVOCATION_REFRESH_SECONDS):
+        try:
+            refresh()
+        except Exception:
+            # БД недоступна — используем загруженное множество до следующей попытки
+            pass
+
+
+def start() -> None:
+    """Первичная загрузка и запуск фонового обновления в текущем процессе"""
+    global _thread
+    if _thread is not None:
+        return
+    try:
+        refresh()
+    except Exception:
+        pass
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="token-revocation", daemon=True)
+    _thread.start()
+
+
+def stop() -> None:
+    global _thread
+    _stop.set()
+    _thread = None
+
+
+if __name__ == "__main__":
+    print(f"Удалено истёкших записей: {purge_expired()}")